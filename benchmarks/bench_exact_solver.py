@@ -0,0 +1,60 @@
+"""
+Benchmark for the branch-and-bound scheduler on random small instances.
+Prints node counts and solve times per instance size; instances stopped by the
+time limit are flagged, their result is not proven optimal.
+
+Run from the project root:
+    python -m benchmarks.bench_exact_solver
+or directly:
+    python benchmarks/bench_exact_solver.py
+"""
+
+import os
+import random
+import sys
+
+# Allow running the file directly: make the project root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.schedule_problem import ScheduleJob, ScheduleProblem
+from services.scheduling_service import branch_and_bound
+
+
+def random_problem(n_orders: int, n_machines: int, seed: int) -> ScheduleProblem:
+    """Random instance: every order runs on 1..n_machines machines, deadlines within a week."""
+    rng = random.Random(seed)
+    jobs = []
+    for i in range(n_orders):
+        machines = rng.sample(range(1, n_machines + 1), rng.randint(1, n_machines))
+        jobs.append(ScheduleJob(
+            order_id=i + 1,
+            weight=float(rng.choice([1, 2, 3])),
+            due=rng.uniform(4, 7 * 24),
+            durations={m: rng.uniform(1, 12) for m in machines}
+        ))
+    return ScheduleProblem(jobs=jobs)
+
+
+def greedy(problem: ScheduleProblem):
+    """Baseline used as first upper bound: every job on its first machine."""
+    sequences = {}
+    for j, job in enumerate(problem.jobs):
+        sequences.setdefault(next(iter(job.durations)), []).append(j)
+    return sequences
+
+
+def run(sizes=(6, 8, 10, 12, 15), n_machines=3, instances=3, time_limit=60.0):
+    print(f"{'ORDERS':<8} {'MACHINES':<9} {'SEED':<5} {'GREEDY':>10} {'OPTIMAL':>10} {'NODES':>10} {'TIME (s)':>9}")
+    print("-" * 66)
+    for n in sizes:
+        for seed in range(instances):
+            problem = random_problem(n, n_machines, seed)
+            initial = greedy(problem)
+            result = branch_and_bound(problem, initial, time_limit)
+            flag = "" if result.optimal else " (time limit, not proven optimal)"
+            print(f"{n:<8} {n_machines:<9} {seed:<5} {problem.cost(initial):>10.1f} {result.cost:>10.1f} "
+                  f"{result.nodes:>10} {result.seconds:>9.2f}{flag}")
+
+
+if __name__ == "__main__":
+    run()
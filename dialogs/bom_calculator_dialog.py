@@ -2,8 +2,8 @@ from PyQt6 import uic
 from PyQt6.QtWidgets import QDialog, QTableWidgetItem
 
 from models.product import ProductRepository
-from models.bom import BOMRepository
 from models.material import MaterialRepository
+from services.mrp_service import MRPService
 
 class BOMCalculatorDialog(QDialog):
     def __init__(self):
@@ -27,22 +27,18 @@ class BOMCalculatorDialog(QDialog):
         product_id = self.cbProductSelect.currentData() # get selected product id
         quantity = self.sbQuantity.value() # get desired quantity to produce
 
-        # Fetch BOM entries for this product
-        product_bom = BOMRepository.get_bom_by_product_id(product_id)
-
-        # Calculate total materials needed
-        materials_needed = {}
-        for b in product_bom:
-            materials_needed[b.material_id] = b.quantity_needed * quantity
+        # Calculate total materials needed through all BOM levels (sub-assembly stock netted as in MRP)
+        materials_needed = MRPService.explode_product(product_id, quantity)
+        materials = {m.id: m for m in MaterialRepository.get_all_materials()}
 
         # clear previous results
         self.twResults.setRowCount(0)
         
         # Populate the results table with calculated materials
         for mat_id, qty in materials_needed.items():
-            material = MaterialRepository.get_material_by_id(mat_id)
+            material = materials.get(mat_id)
             if material:
                 row = self.twResults.rowCount()
                 self.twResults.insertRow(row)
                 self.twResults.setItem(row, 0, QTableWidgetItem(f"{material.name} ({material.unit})"))
-                self.twResults.setItem(row, 1, QTableWidgetItem(str(qty)))
\ No newline at end of file
+                self.twResults.setItem(row, 1, QTableWidgetItem(str(float(qty))))
\ No newline at end of file
@@ -4,9 +4,10 @@ from PyQt6.QtWidgets import QDialog, QTableWidgetItem
 
 from models.material import Material, MaterialRepository
 from models.product import Product, ProductRepository
-from models.bom import BOM, BOMRepository
+from models.bom import BOM
 from models.machine import Machine, MachineRecipe, MachineRepository, MachineRecipeRepository
 from models.order import ProductionOrder
+from services.mrp_service import MRPService
 
 # ----------- MaterialView Add/Edit -------------
 class MaterialDialog(QDialog):
@@ -367,18 +368,16 @@ class OrderDetailsDialog(QDialog):
         )
         self.val_created_date.setText(getattr(order, "created_date", "-"))
 
-        # Calculate required materials
-        bom_items = BOMRepository.get_bom_by_product_id(order.product_id)
-        self.tableMaterials.setRowCount(len(bom_items))
+        # Calculate required materials (all BOM levels, sub-assembly stock netted as in MRP)
+        required = MRPService.explode_product(order.product_id, order.quantity)
+        materials = {m.id: m for m in MaterialRepository.get_all_materials()}
+        self.tableMaterials.setRowCount(len(required))
 
-        for row, bom in enumerate(bom_items):
-            material = MaterialRepository.get_material_by_id(bom.material_id)
+        for row, (material_id, required_qty) in enumerate(required.items()):
+            material = materials.get(material_id)
             if not material:
                 continue
 
-            # Calculating materials
-            required_qty = bom.quantity_needed * order.quantity
-
             self.tableMaterials.setItem(row, 0, QTableWidgetItem(material.name))
             self.tableMaterials.setItem(row, 1, QTableWidgetItem(str(required_qty)))
             self.tableMaterials.setItem(row, 2, QTableWidgetItem(material.unit))
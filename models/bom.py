@@ -11,12 +11,23 @@ class BOM():
     
     def __str__(self) -> str:
         return f"BOM(ID: {self.id}, Product ID: {self.product_id}, Material ID: {self.material_id}, Quantity: {self.quantity_needed})"
+
+
+@dataclass
+class BOMComponent():
+    id: int
+    parent_product_id: int  # FK to products - product that is assembled
+    component_product_id: int  # FK to products - sub-assembly built into the parent
+    quantity_needed: float  # component units per parent unit
+    
+    def __str__(self) -> str:
+        return f"BOMComponent(ID: {self.id}, Parent Product ID: {self.parent_product_id}, Component Product ID: {self.component_product_id}, Quantity: {self.quantity_needed})"
     
     
 class BOMRepository:
     @staticmethod
     def init_table():
-        """Creates the bom table if it doesn't exist."""
+        """Creates the bom and bom_components tables if they don't exist."""
         with database.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -30,6 +41,18 @@ class BOMRepository:
                     UNIQUE(product_id, material_id)
                 );
             """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS bom_components (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    parent_product_id INTEGER NOT NULL,
+                    component_product_id INTEGER NOT NULL,
+                    quantity_needed REAL NOT NULL CHECK(quantity_needed > 0),
+                    FOREIGN KEY (parent_product_id) REFERENCES products(id) ON DELETE CASCADE,
+                    FOREIGN KEY (component_product_id) REFERENCES products(id) ON DELETE CASCADE,
+                    UNIQUE(parent_product_id, component_product_id),
+                    CHECK(parent_product_id != component_product_id)
+                );
+            """)
             conn.commit()
     
     @staticmethod
@@ -103,6 +126,67 @@ class BOMRepository:
             rows = cursor.fetchall()
             return [BOM(id=row[0], product_id=row[1], material_id=row[2], quantity_needed=row[3]) for row in rows]
     
+    @staticmethod
+    def add_component(component: BOMComponent):
+        """Adds a sub-assembly to a product's BOM. Returns the component with its new ID.
+        Raises BOMCycleError if the link would make a product (indirectly) contain itself."""
+        from services.multilevel_bom import BOMCycleError, MultiLevelBOM
+        
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            structure = MultiLevelBOM(BOMRepository.get_all_components())
+            if structure.would_create_cycle(component.parent_product_id, component.component_product_id):
+                raise BOMCycleError(f"Product {component.component_product_id} already contains product "
+                                    f"{component.parent_product_id} - the link would create a cycle")
+            cursor.execute("""
+                INSERT INTO bom_components (parent_product_id, component_product_id, quantity_needed)
+                VALUES (?, ?, ?)
+            """, (component.parent_product_id, component.component_product_id, component.quantity_needed))
+            conn.commit()
+            component.id = cursor.lastrowid
+        return component
+    
+    @staticmethod
+    def get_components_by_product_id(product_id: int) -> List[BOMComponent]:
+        """Fetches the sub-assemblies of a product."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, parent_product_id, component_product_id, quantity_needed
+                FROM bom_components WHERE parent_product_id = ?
+            """, (product_id,))
+            rows = cursor.fetchall()
+            return [BOMComponent(id=row[0], parent_product_id=row[1], component_product_id=row[2], quantity_needed=row[3]) for row in rows]
+    
+    @staticmethod
+    def get_all_components() -> List[BOMComponent]:
+        """Returns all sub-assembly links from the database."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, parent_product_id, component_product_id, quantity_needed FROM bom_components ORDER BY id")
+            rows = cursor.fetchall()
+            return [BOMComponent(id=row[0], parent_product_id=row[1], component_product_id=row[2], quantity_needed=row[3]) for row in rows]
+    
+    @staticmethod
+    def delete_component(component: BOMComponent):
+        """Deletes a sub-assembly link from the database."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM bom_components WHERE id = ?", (component.id,))
+            conn.commit()
+    
+    @staticmethod
+    def get_bom_stamp() -> tuple:
+        """Cheap checksum of the bom table (row count, last ID, weighted sums) to detect changes."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COUNT(*), COALESCE(MAX(id), 0), TOTAL(quantity_needed),
+                       TOTAL(id * quantity_needed), TOTAL(id * (product_id * 1000003 + material_id))
+                FROM bom
+            """)
+            return tuple(cursor.fetchone())
+    
     @staticmethod
     def print_all_bom():
         """Prints all BOM entries in a formatted way. Just for demo purposes."""
@@ -0,0 +1,154 @@
+from . import database
+from dataclasses import dataclass
+from typing import List
+
+@dataclass
+class MachineShift():
+    id: int
+    machine_id: int  # FK to machines
+    weekday: int  # 0 = Monday ... 6 = Sunday
+    start_time: str  # Time string in format 'HH:MM'
+    end_time: str  # Time string in format 'HH:MM' - if not after start_time, the shift ends the next day
+
+    def __str__(self) -> str:
+        return f"MachineShift(ID: {self.id}, Machine ID: {self.machine_id}, Weekday: {self.weekday}, {self.start_time}-{self.end_time})"
+
+
+@dataclass
+class MachineDowntime():
+    id: int
+    machine_id: int  # FK to machines, None = whole plant (e.g. public holiday)
+    start_time: str  # DateTime string in format 'YYYY-MM-DD HH:MM:SS'
+    end_time: str  # DateTime string in format 'YYYY-MM-DD HH:MM:SS'
+    reason: str = ""  # e.g. holiday, maintenance
+
+    def __str__(self) -> str:
+        machine_info = f"Machine ID: {self.machine_id}" if self.machine_id else "All machines"
+        return f"MachineDowntime(ID: {self.id}, {machine_info}, {self.start_time} -> {self.end_time}, Reason: '{self.reason}')"
+
+
+class CalendarRepository:
+    """Machine working calendars: weekly shifts plus downtime windows.
+    A machine without any shifts is treated as running 24/7."""
+
+    @staticmethod
+    def init_table():
+        """Creates the machine_shifts and machine_downtimes tables if they don't exist."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS machine_shifts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    machine_id INTEGER NOT NULL,
+                    weekday INTEGER NOT NULL CHECK(weekday BETWEEN 0 AND 6),
+                    start_time TEXT NOT NULL,
+                    end_time TEXT NOT NULL,
+                    FOREIGN KEY (machine_id) REFERENCES machines(id) ON DELETE CASCADE
+                );
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS machine_downtimes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    machine_id INTEGER,
+                    start_time DATETIME NOT NULL,
+                    end_time DATETIME NOT NULL,
+                    reason TEXT DEFAULT '',
+                    FOREIGN KEY (machine_id) REFERENCES machines(id) ON DELETE CASCADE,
+                    CHECK(end_time > start_time)
+                );
+            """)
+            conn.commit()
+
+    @staticmethod
+    def add_shift(shift: MachineShift):
+        """Adds a new shift to the database. Returns the shift with its new ID."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO machine_shifts (machine_id, weekday, start_time, end_time)
+                VALUES (?, ?, ?, ?)
+            """, (shift.machine_id, shift.weekday, shift.start_time, shift.end_time))
+            conn.commit()
+            shift.id = cursor.lastrowid
+        return shift
+
+    @staticmethod
+    def get_shifts_by_machine_id(machine_id: int) -> List[MachineShift]:
+        """Fetches all shifts of a specific machine, ordered by weekday and start time."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, machine_id, weekday, start_time, end_time
+                FROM machine_shifts WHERE machine_id = ?
+                ORDER BY weekday, start_time
+            """, (machine_id,))
+            rows = cursor.fetchall()
+            return [MachineShift(id=row[0], machine_id=row[1], weekday=row[2], start_time=row[3], end_time=row[4]) for row in rows]
+
+    @staticmethod
+    def get_all_shifts() -> List[MachineShift]:
+        """Returns all shifts from the database."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, machine_id, weekday, start_time, end_time
+                FROM machine_shifts
+                ORDER BY machine_id, weekday, start_time
+            """)
+            rows = cursor.fetchall()
+            return [MachineShift(id=row[0], machine_id=row[1], weekday=row[2], start_time=row[3], end_time=row[4]) for row in rows]
+
+    @staticmethod
+    def delete_shift(shift: MachineShift):
+        """Deletes a shift from the database."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM machine_shifts WHERE id = ?", (shift.id,))
+            conn.commit()
+
+    @staticmethod
+    def add_downtime(downtime: MachineDowntime):
+        """Adds a new downtime window to the database. Returns the downtime with its new ID."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO machine_downtimes (machine_id, start_time, end_time, reason)
+                VALUES (?, ?, ?, ?)
+            """, (downtime.machine_id, downtime.start_time, downtime.end_time, downtime.reason))
+            conn.commit()
+            downtime.id = cursor.lastrowid
+        return downtime
+
+    @staticmethod
+    def get_downtimes_by_machine_id(machine_id: int) -> List[MachineDowntime]:
+        """Fetches downtimes affecting a machine, including plant-wide ones."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, machine_id, start_time, end_time, reason
+                FROM machine_downtimes WHERE machine_id = ? OR machine_id IS NULL
+                ORDER BY start_time
+            """, (machine_id,))
+            rows = cursor.fetchall()
+            return [MachineDowntime(id=row[0], machine_id=row[1], start_time=row[2], end_time=row[3], reason=row[4]) for row in rows]
+
+    @staticmethod
+    def get_all_downtimes() -> List[MachineDowntime]:
+        """Returns all downtime windows from the database, ordered by start time."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, machine_id, start_time, end_time, reason
+                FROM machine_downtimes
+                ORDER BY start_time
+            """)
+            rows = cursor.fetchall()
+            return [MachineDowntime(id=row[0], machine_id=row[1], start_time=row[2], end_time=row[3], reason=row[4]) for row in rows]
+
+    @staticmethod
+    def delete_downtime(downtime: MachineDowntime):
+        """Deletes a downtime window from the database."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM machine_downtimes WHERE id = ?", (downtime.id,))
+            conn.commit()
@@ -0,0 +1,126 @@
+from . import database
+from dataclasses import dataclass
+from typing import Dict, List
+
+@dataclass
+class ProductionCampaign():
+    id: int
+    product_id: int  # FK to products - all member orders make this product
+    quantity: int  # total quantity of the member orders
+    deadline: str  # Date string in format 'YYYY-MM-DD' - earliest member deadline
+    priority: int  # highest member priority (1=High, 2=Medium, 3=Low)
+    created_at: str = ""  # DateTime string in format 'YYYY-MM-DD HH:MM:SS'
+
+    def __str__(self) -> str:
+        return f"ProductionCampaign(ID: {self.id}, Product ID: {self.product_id}, Quantity: {self.quantity}, Deadline: {self.deadline}, Priority: {self.priority})"
+
+
+class CampaignRepository:
+    """Production campaigns: batches of same-product orders scheduled as one block."""
+
+    @staticmethod
+    def init_table():
+        """Creates the production_campaigns and campaign_orders tables if they don't exist."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS production_campaigns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    product_id INTEGER NOT NULL,
+                    quantity INTEGER NOT NULL CHECK(quantity > 0),
+                    deadline DATE NOT NULL,
+                    priority INTEGER NOT NULL CHECK(priority IN (1, 2, 3)),
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+                );
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS campaign_orders (
+                    campaign_id INTEGER NOT NULL,
+                    order_id INTEGER NOT NULL UNIQUE,
+                    FOREIGN KEY (campaign_id) REFERENCES production_campaigns(id) ON DELETE CASCADE,
+                    FOREIGN KEY (order_id) REFERENCES production_orders(id) ON DELETE CASCADE,
+                    PRIMARY KEY (campaign_id, order_id)
+                );
+            """)
+            conn.commit()
+
+    @staticmethod
+    def add_campaign(campaign: ProductionCampaign, order_ids: List[int]):
+        """Adds a campaign with its member orders. Returns the campaign with its new ID."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO production_campaigns (product_id, quantity, deadline, priority)
+                VALUES (?, ?, ?, ?)
+            """, (campaign.product_id, campaign.quantity, campaign.deadline, campaign.priority))
+            campaign.id = cursor.lastrowid
+            cursor.executemany("INSERT INTO campaign_orders (campaign_id, order_id) VALUES (?, ?)",
+                               [(campaign.id, order_id) for order_id in order_ids])
+            conn.commit()
+            cursor.execute("SELECT created_at FROM production_campaigns WHERE id = ?", (campaign.id,))
+            campaign.created_at = cursor.fetchone()[0]
+        return campaign
+
+    @staticmethod
+    def get_campaign_by_id(campaign_id: int) -> ProductionCampaign:
+        """Fetches a campaign by its ID. Returns None if not found."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, product_id, quantity, deadline, priority, created_at
+                FROM production_campaigns WHERE id = ?
+            """, (campaign_id,))
+            row = cursor.fetchone()
+            if row:
+                return ProductionCampaign(id=row[0], product_id=row[1], quantity=row[2], deadline=row[3], priority=row[4], created_at=row[5])
+            return None
+
+    @staticmethod
+    def get_all_campaigns() -> List[ProductionCampaign]:
+        """Returns all campaigns, ordered by deadline."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, product_id, quantity, deadline, priority, created_at
+                FROM production_campaigns ORDER BY deadline, id
+            """)
+            rows = cursor.fetchall()
+            return [ProductionCampaign(id=row[0], product_id=row[1], quantity=row[2], deadline=row[3], priority=row[4], created_at=row[5]) for row in rows]
+
+    @staticmethod
+    def get_order_ids(campaign_id: int) -> List[int]:
+        """Returns the IDs of the orders that belong to a campaign."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT order_id FROM campaign_orders WHERE campaign_id = ? ORDER BY order_id", (campaign_id,))
+            return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def get_campaign_members() -> Dict[int, List[int]]:
+        """Returns campaign_id -> member order IDs for all campaigns."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT campaign_id, order_id FROM campaign_orders ORDER BY campaign_id, order_id")
+            members: Dict[int, List[int]] = {}
+            for campaign_id, order_id in cursor.fetchall():
+                members.setdefault(campaign_id, []).append(order_id)
+            return members
+
+    @staticmethod
+    def delete_unstarted_campaigns() -> int:
+        """
+        Deletes campaigns that have no plan left (they get rebuilt). Campaigns with a plan of any
+        status stay, including planned ones kept in a rolling-horizon frozen zone. Returns the number deleted.
+        """
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM production_campaigns
+                WHERE id NOT IN (
+                    SELECT campaign_id FROM production_plans
+                    WHERE campaign_id IS NOT NULL
+                )
+            """)
+            conn.commit()
+            return cursor.rowcount
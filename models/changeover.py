@@ -0,0 +1,91 @@
+from . import database
+from dataclasses import dataclass
+from typing import List
+
+@dataclass
+class Changeover():
+    id: int
+    machine_id: int  # FK to machines
+    from_product_id: int  # FK to products - product the machine ran before
+    to_product_id: int  # FK to products - product the machine switches to
+    setup_minutes: float  # time lost for the switch
+
+    def __str__(self) -> str:
+        return f"Changeover(ID: {self.id}, Machine ID: {self.machine_id}, Product {self.from_product_id} -> {self.to_product_id}, Setup: {self.setup_minutes} min)"
+
+
+class ChangeoverRepository:
+    @staticmethod
+    def init_table():
+        """Creates the changeovers table if it doesn't exist."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS changeovers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    machine_id INTEGER NOT NULL,
+                    from_product_id INTEGER NOT NULL,
+                    to_product_id INTEGER NOT NULL,
+                    setup_minutes REAL NOT NULL CHECK(setup_minutes >= 0),
+                    FOREIGN KEY (machine_id) REFERENCES machines(id) ON DELETE CASCADE,
+                    FOREIGN KEY (from_product_id) REFERENCES products(id) ON DELETE CASCADE,
+                    FOREIGN KEY (to_product_id) REFERENCES products(id) ON DELETE CASCADE,
+                    UNIQUE(machine_id, from_product_id, to_product_id)
+                );
+            """)
+            conn.commit()
+
+    @staticmethod
+    def add_changeover(changeover: Changeover):
+        """Adds a new changeover to the database. Returns the changeover with its new ID."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO changeovers (machine_id, from_product_id, to_product_id, setup_minutes)
+                VALUES (?, ?, ?, ?)
+            """, (changeover.machine_id, changeover.from_product_id, changeover.to_product_id, changeover.setup_minutes))
+            conn.commit()
+            changeover.id = cursor.lastrowid
+        return changeover
+
+    @staticmethod
+    def get_changeovers_by_machine_id(machine_id: int) -> List[Changeover]:
+        """Fetches all changeovers of a specific machine."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, machine_id, from_product_id, to_product_id, setup_minutes
+                FROM changeovers WHERE machine_id = ?
+                ORDER BY from_product_id, to_product_id
+            """, (machine_id,))
+            rows = cursor.fetchall()
+            return [Changeover(id=row[0], machine_id=row[1], from_product_id=row[2], to_product_id=row[3], setup_minutes=row[4]) for row in rows]
+
+    @staticmethod
+    def update_changeover(changeover: Changeover):
+        """Updates an existing changeover in the database."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE changeovers
+                SET machine_id = ?, from_product_id = ?, to_product_id = ?, setup_minutes = ?
+                WHERE id = ?
+            """, (changeover.machine_id, changeover.from_product_id, changeover.to_product_id, changeover.setup_minutes, changeover.id))
+            conn.commit()
+
+    @staticmethod
+    def delete_changeover(changeover: Changeover):
+        """Deletes a changeover from the database."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM changeovers WHERE id = ?", (changeover.id,))
+            conn.commit()
+
+    @staticmethod
+    def get_all_changeovers() -> List[Changeover]:
+        """Returns all changeovers from the database."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, machine_id, from_product_id, to_product_id, setup_minutes FROM changeovers ORDER BY id")
+            rows = cursor.fetchall()
+            return [Changeover(id=row[0], machine_id=row[1], from_product_id=row[2], to_product_id=row[3], setup_minutes=row[4]) for row in rows]
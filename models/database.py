@@ -43,6 +43,12 @@ def close_db():
     """Closes the shared database connection."""
     _connection_manager.close_connection()
 
+def add_column_if_missing(cursor, table: str, column: str, definition: str):
+    """Adds a column to an existing table (schema upgrade for databases created by older versions)."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
 def init_db():
     """Creates the database file and initializes all tables."""
     
@@ -64,6 +70,14 @@ def init_db():
     from .machine import MachineRepository, MachineRecipeRepository
     from .order import ProductionOrderRepository
     from .production_plan import ProductionPlanRepository
+    from .calendar import CalendarRepository
+    from .changeover import ChangeoverRepository
+    from .material_receipt import MaterialReceiptRepository
+    from .routing import RoutingRepository
+    from .campaign import CampaignRepository
+    from .material_pegging import MaterialPeggingRepository
+    from .material_policy import MaterialPolicyRepository
+    from .material_allocation import MaterialAllocationRepository
     
     # Initialize tables for all repositories - this will create the DB file properly
     
@@ -74,7 +88,7 @@ def init_db():
     print("Products table initialized.")
     
     BOMRepository.init_table()
-    print("BOM table initialized.")
+    print("BOM tables initialized.")
     
     MachineRepository.init_table()
     print("Machines table initialized.")
@@ -88,4 +102,28 @@ def init_db():
     ProductionPlanRepository.init_table()
     print("Production plans table initialized.")
     
+    CalendarRepository.init_table()
+    print("Machine calendar tables initialized.")
+    
+    ChangeoverRepository.init_table()
+    print("Changeovers table initialized.")
+    
+    MaterialReceiptRepository.init_table()
+    print("Material receipts table initialized.")
+    
+    RoutingRepository.init_table()
+    print("Routing tables initialized.")
+    
+    CampaignRepository.init_table()
+    print("Campaign tables initialized.")
+    
+    MaterialPeggingRepository.init_table()
+    print("Material pegging table initialized.")
+    
+    MaterialPolicyRepository.init_table()
+    print("Material policies table initialized.")
+    
+    MaterialAllocationRepository.init_table()
+    print("Material allocations table initialized.")
+    
     print("Database initialization completed successfully!")
\ No newline at end of file
@@ -0,0 +1,101 @@
+from . import database
+from dataclasses import dataclass
+from typing import Dict, List
+
+@dataclass
+class MaterialAllocation():
+    id: int
+    material_id: int  # FK to materials
+    order_id: int  # FK to production_orders
+    quantity_required: float  # what the order needs of the material
+    quantity_allocated: float  # on-hand stock reserved for the order
+
+    @property
+    def quantity_missing(self) -> float:
+        return self.quantity_required - self.quantity_allocated
+
+    def __str__(self) -> str:
+        return f"MaterialAllocation(ID: {self.id}, Material ID: {self.material_id}, Order ID: {self.order_id}, Required: {self.quantity_required}, Allocated: {self.quantity_allocated})"
+
+
+class MaterialAllocationRepository:
+    """Reservations of on-hand material stock to pending orders (kept up to date by the MRP state)."""
+
+    @staticmethod
+    def init_table():
+        """Creates the material_allocations table if it doesn't exist."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS material_allocations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    material_id INTEGER NOT NULL,
+                    order_id INTEGER NOT NULL,
+                    quantity_required REAL NOT NULL,
+                    quantity_allocated REAL NOT NULL CHECK(quantity_allocated >= 0),
+                    FOREIGN KEY (material_id) REFERENCES materials(id) ON DELETE CASCADE,
+                    FOREIGN KEY (order_id) REFERENCES production_orders(id) ON DELETE CASCADE
+                );
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_material_allocations_material ON material_allocations(material_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_material_allocations_order ON material_allocations(order_id)")
+            conn.commit()
+
+    @staticmethod
+    def replace_material_allocations(allocations_by_material: Dict[int, List[MaterialAllocation]], replace_all: bool = False):
+        """
+        Replaces the allocations of the given materials in one transaction.
+
+        Args:
+            allocations_by_material: material_id -> the material's allocations (one per order)
+            replace_all: If True, the allocations of all other materials are deleted as well
+        """
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            if replace_all:
+                cursor.execute("DELETE FROM material_allocations")
+            else:
+                cursor.executemany("DELETE FROM material_allocations WHERE material_id = ?", [(m,) for m in allocations_by_material])
+            cursor.executemany("""
+                INSERT INTO material_allocations (material_id, order_id, quantity_required, quantity_allocated)
+                VALUES (?, ?, ?, ?)
+            """, [(a.material_id, a.order_id, a.quantity_required, a.quantity_allocated)
+                  for allocations in allocations_by_material.values() for a in allocations])
+            conn.commit()
+
+    @staticmethod
+    def get_allocations_by_order_id(order_id: int) -> List[MaterialAllocation]:
+        """Reservations of an order, one per material it needs."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, material_id, order_id, quantity_required, quantity_allocated
+                FROM material_allocations WHERE order_id = ?
+                ORDER BY material_id
+            """, (order_id,))
+            return [MaterialAllocation(*row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def get_allocations_by_material_id(material_id: int) -> List[MaterialAllocation]:
+        """Reservations of a material, one per order that needs it."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, material_id, order_id, quantity_required, quantity_allocated
+                FROM material_allocations WHERE material_id = ?
+                ORDER BY order_id
+            """, (material_id,))
+            return [MaterialAllocation(*row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def get_uncovered_allocations() -> List[MaterialAllocation]:
+        """Allocations that do not cover what the order needs, by order."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, material_id, order_id, quantity_required, quantity_allocated
+                FROM material_allocations
+                WHERE quantity_allocated < quantity_required - 1e-9
+                ORDER BY order_id, material_id
+            """)
+            return [MaterialAllocation(*row) for row in cursor.fetchall()]
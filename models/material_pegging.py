@@ -0,0 +1,86 @@
+from . import database
+from dataclasses import dataclass
+from typing import Dict, List
+
+@dataclass
+class MaterialPeg():
+    id: int
+    material_id: int  # FK to materials
+    order_id: int  # FK to production_orders
+    quantity: float  # quantity of the material this order needs
+    need_date: str = None  # DateTime string in format 'YYYY-MM-DD HH:MM:SS' (planned start), None = unplanned, needed now
+
+    def __str__(self) -> str:
+        return f"MaterialPeg(ID: {self.id}, Material ID: {self.material_id}, Order ID: {self.order_id}, Quantity: {self.quantity}, Need date: {self.need_date})"
+
+
+class MaterialPeggingRepository:
+    """Which pending orders need which materials, how much and when (kept up to date by the MRP state)."""
+
+    @staticmethod
+    def init_table():
+        """Creates the material_pegging table and its lookup indexes if they don't exist."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS material_pegging (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    material_id INTEGER NOT NULL,
+                    order_id INTEGER NOT NULL,
+                    quantity REAL NOT NULL,
+                    need_date DATETIME,
+                    FOREIGN KEY (material_id) REFERENCES materials(id) ON DELETE CASCADE,
+                    FOREIGN KEY (order_id) REFERENCES production_orders(id) ON DELETE CASCADE
+                );
+            """)
+            # Material -> orders in need order, and order -> materials
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_material_pegging_material_need ON material_pegging(material_id, need_date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_material_pegging_order ON material_pegging(order_id)")
+            conn.commit()
+
+    @staticmethod
+    def replace_order_pegs(pegs_by_order: Dict[int, List[MaterialPeg]], replace_all: bool = False):
+        """
+        Replaces the pegs of the given orders in one transaction (an empty list removes an order's pegs).
+
+        Args:
+            pegs_by_order: order_id -> the order's pegs (one per material)
+            replace_all: If True, the pegs of all other orders are deleted as well
+        """
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            if replace_all:
+                cursor.execute("DELETE FROM material_pegging")
+            else:
+                cursor.executemany("DELETE FROM material_pegging WHERE order_id = ?", [(order_id,) for order_id in pegs_by_order])
+            cursor.executemany("""
+                INSERT INTO material_pegging (material_id, order_id, quantity, need_date)
+                VALUES (?, ?, ?, ?)
+            """, [(p.material_id, p.order_id, p.quantity, p.need_date) for pegs in pegs_by_order.values() for p in pegs])
+            conn.commit()
+
+    @staticmethod
+    def get_pegs_by_material_id(material_id: int) -> List[MaterialPeg]:
+        """Orders needing a material, unplanned orders first, then by need date."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, material_id, order_id, quantity, need_date
+                FROM material_pegging WHERE material_id = ?
+                ORDER BY need_date, order_id
+            """, (material_id,))
+            rows = cursor.fetchall()
+            return [MaterialPeg(id=row[0], material_id=row[1], order_id=row[2], quantity=row[3], need_date=row[4]) for row in rows]
+
+    @staticmethod
+    def get_pegs_by_order_id(order_id: int) -> List[MaterialPeg]:
+        """Materials needed by an order."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, material_id, order_id, quantity, need_date
+                FROM material_pegging WHERE order_id = ?
+                ORDER BY material_id
+            """, (order_id,))
+            rows = cursor.fetchall()
+            return [MaterialPeg(id=row[0], material_id=row[1], order_id=row[2], quantity=row[3], need_date=row[4]) for row in rows]
@@ -0,0 +1,118 @@
+from . import database
+from dataclasses import dataclass
+from typing import List
+from enum import Enum
+
+class LotSizingPolicy(Enum):
+    LOT_FOR_LOT = "lot_for_lot"  # buy exactly the net requirement
+    FIXED = "fixed"  # buy multiples of fixed_quantity
+    EOQ = "eoq"  # buy at least the economic order quantity
+    PERIOD = "period"  # buy the net requirements of the next `periods` buckets at once
+    MIN_MAX = "min_max"  # when stock falls below min_quantity, refill up to max_quantity
+
+@dataclass
+class MaterialPolicy():
+    id: int
+    material_id: int  # FK to materials, one policy per material
+    policy: str = LotSizingPolicy.LOT_FOR_LOT.value
+    fixed_quantity: float = 0.0  # FIXED: lot size
+    periods: int = 1  # PERIOD: number of buckets covered by one purchase
+    min_quantity: float = 0.0  # MIN_MAX: reorder point; other policies: smallest lot
+    max_quantity: float = 0.0  # MIN_MAX: stock level to refill to
+    pack_size: float = 0.0  # lots are rounded up to multiples of this (0 = no rounding)
+    lead_time_days: int = 0  # supplier lead time: purchase is released this many days before it is needed
+    safety_stock: float = 0.0  # stock that should never be used up
+    ordering_cost: float = 0.0  # EOQ: fixed cost per purchase
+    holding_cost: float = 0.0  # EOQ: cost of holding one unit for a year
+
+    def __str__(self) -> str:
+        return f"MaterialPolicy(ID: {self.id}, Material ID: {self.material_id}, Policy: {self.policy}, Lead time: {self.lead_time_days} days, Safety stock: {self.safety_stock})"
+
+
+class MaterialPolicyRepository:
+    """Lot-sizing policy, lead time and safety stock per material (materials without one use lot-for-lot)."""
+
+    @staticmethod
+    def init_table():
+        """Creates the material_policies table if it doesn't exist."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS material_policies (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    material_id INTEGER NOT NULL UNIQUE,
+                    policy TEXT NOT NULL DEFAULT 'lot_for_lot' CHECK(policy IN ('lot_for_lot', 'fixed', 'eoq', 'period', 'min_max')),
+                    fixed_quantity REAL NOT NULL DEFAULT 0 CHECK(fixed_quantity >= 0),
+                    periods INTEGER NOT NULL DEFAULT 1 CHECK(periods >= 1),
+                    min_quantity REAL NOT NULL DEFAULT 0 CHECK(min_quantity >= 0),
+                    max_quantity REAL NOT NULL DEFAULT 0 CHECK(max_quantity >= 0),
+                    pack_size REAL NOT NULL DEFAULT 0 CHECK(pack_size >= 0),
+                    lead_time_days INTEGER NOT NULL DEFAULT 0 CHECK(lead_time_days >= 0),
+                    safety_stock REAL NOT NULL DEFAULT 0 CHECK(safety_stock >= 0),
+                    ordering_cost REAL NOT NULL DEFAULT 0 CHECK(ordering_cost >= 0),
+                    holding_cost REAL NOT NULL DEFAULT 0 CHECK(holding_cost >= 0),
+                    CHECK(policy != 'min_max' OR max_quantity >= min_quantity),
+                    FOREIGN KEY (material_id) REFERENCES materials(id) ON DELETE CASCADE
+                );
+            """)
+            conn.commit()
+
+    @staticmethod
+    def set_policy(policy: MaterialPolicy):
+        """Adds or replaces the policy of a material. Returns the policy with its ID."""
+        if policy.policy == LotSizingPolicy.MIN_MAX.value and policy.max_quantity < policy.min_quantity:
+            raise ValueError(f"Min/max policy of material {policy.material_id}: max quantity {policy.max_quantity} "
+                             f"is below min quantity {policy.min_quantity}")
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO material_policies (material_id, policy, fixed_quantity, periods, min_quantity, max_quantity,
+                                               pack_size, lead_time_days, safety_stock, ordering_cost, holding_cost)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(material_id) DO UPDATE SET
+                    policy = excluded.policy, fixed_quantity = excluded.fixed_quantity, periods = excluded.periods,
+                    min_quantity = excluded.min_quantity, max_quantity = excluded.max_quantity, pack_size = excluded.pack_size,
+                    lead_time_days = excluded.lead_time_days, safety_stock = excluded.safety_stock,
+                    ordering_cost = excluded.ordering_cost, holding_cost = excluded.holding_cost
+            """, (policy.material_id, policy.policy, policy.fixed_quantity, policy.periods, policy.min_quantity,
+                  policy.max_quantity, policy.pack_size, policy.lead_time_days, policy.safety_stock,
+                  policy.ordering_cost, policy.holding_cost))
+            cursor.execute("SELECT id FROM material_policies WHERE material_id = ?", (policy.material_id,))
+            policy.id = cursor.fetchone()[0]
+            conn.commit()
+        return policy
+
+    @staticmethod
+    def get_policy_by_material_id(material_id: int) -> MaterialPolicy:
+        """Fetches the policy of a material. Returns None if it has none."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, material_id, policy, fixed_quantity, periods, min_quantity, max_quantity,
+                       pack_size, lead_time_days, safety_stock, ordering_cost, holding_cost
+                FROM material_policies WHERE material_id = ?
+            """, (material_id,))
+            row = cursor.fetchone()
+            if row:
+                return MaterialPolicy(*row)
+            return None
+
+    @staticmethod
+    def get_all_policies() -> List[MaterialPolicy]:
+        """Returns the policies of all materials that have one."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, material_id, policy, fixed_quantity, periods, min_quantity, max_quantity,
+                       pack_size, lead_time_days, safety_stock, ordering_cost, holding_cost
+                FROM material_policies ORDER BY material_id
+            """)
+            return [MaterialPolicy(*row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def delete_policy(policy: MaterialPolicy):
+        """Deletes a policy; the material falls back to lot-for-lot."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM material_policies WHERE id = ?", (policy.id,))
+            conn.commit()
@@ -0,0 +1,106 @@
+from . import database
+from dataclasses import dataclass
+from typing import List
+
+@dataclass
+class MaterialReceipt():
+    id: int
+    material_id: int  # FK to materials
+    quantity: float  # quantity that will arrive
+    expected_time: str  # DateTime string in format 'YYYY-MM-DD HH:MM:SS' - when the delivery is expected
+    note: str = ""  # e.g. supplier or purchase order number
+
+    def __str__(self) -> str:
+        return f"MaterialReceipt(ID: {self.id}, Material ID: {self.material_id}, Quantity: {self.quantity}, Expected: {self.expected_time}, Note: '{self.note}')"
+
+
+class MaterialReceiptRepository:
+    """Expected material deliveries (open purchase orders) not yet in stock."""
+
+    @staticmethod
+    def init_table():
+        """Creates the material_receipts table if it doesn't exist."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS material_receipts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    material_id INTEGER NOT NULL,
+                    quantity REAL NOT NULL CHECK(quantity > 0),
+                    expected_time DATETIME NOT NULL,
+                    note TEXT DEFAULT '',
+                    FOREIGN KEY (material_id) REFERENCES materials(id) ON DELETE CASCADE
+                );
+            """)
+            conn.commit()
+
+    @staticmethod
+    def add_receipt(receipt: MaterialReceipt):
+        """Adds a new expected receipt to the database. Returns the receipt with its new ID."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO material_receipts (material_id, quantity, expected_time, note)
+                VALUES (?, ?, ?, ?)
+            """, (receipt.material_id, receipt.quantity, receipt.expected_time, receipt.note))
+            conn.commit()
+            receipt.id = cursor.lastrowid
+        return receipt
+
+    @staticmethod
+    def get_receipt_stamp() -> tuple:
+        """Cheap checksum of the receipts table (row count, last ID, total quantity, hashed expected times) to detect changes."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COUNT(*), COALESCE(MAX(id), 0), TOTAL(quantity),
+                       COALESCE(SUM(((id * 1000003 + COALESCE(CAST(strftime('%s', expected_time) AS INTEGER), 0)) % 2147483647
+                                     * 1000003 + material_id) % 2147483647), 0)
+                FROM material_receipts
+            """)
+            return tuple(cursor.fetchone())
+    
+    @staticmethod
+    def get_receipt_by_id(receipt_id: int) -> MaterialReceipt:
+        """Fetches a single expected receipt by ID."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, material_id, quantity, expected_time, note FROM material_receipts WHERE id = ?", (receipt_id,))
+            row = cursor.fetchone()
+            if row:
+                return MaterialReceipt(id=row[0], material_id=row[1], quantity=row[2], expected_time=row[3], note=row[4])
+            return None
+
+    @staticmethod
+    def get_receipts_by_material_id(material_id: int) -> List[MaterialReceipt]:
+        """Fetches all expected receipts of a material, earliest first."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, material_id, quantity, expected_time, note
+                FROM material_receipts WHERE material_id = ?
+                ORDER BY expected_time
+            """, (material_id,))
+            rows = cursor.fetchall()
+            return [MaterialReceipt(id=row[0], material_id=row[1], quantity=row[2], expected_time=row[3], note=row[4]) for row in rows]
+
+    @staticmethod
+    def get_all_receipts() -> List[MaterialReceipt]:
+        """Returns all expected receipts, ordered by material and expected time."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, material_id, quantity, expected_time, note
+                FROM material_receipts
+                ORDER BY material_id, expected_time
+            """)
+            rows = cursor.fetchall()
+            return [MaterialReceipt(id=row[0], material_id=row[1], quantity=row[2], expected_time=row[3], note=row[4]) for row in rows]
+
+    @staticmethod
+    def delete_receipt(receipt: MaterialReceipt):
+        """Deletes an expected receipt (e.g. once it was booked into stock)."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM material_receipts WHERE id = ?", (receipt.id,))
+            conn.commit()
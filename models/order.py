@@ -1,6 +1,7 @@
 from . import database
+from .bom import BOMComponent
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, List, Tuple
 from enum import Enum
 from datetime import date
 
@@ -155,11 +156,142 @@ class ProductionOrderRepository:
                   order.assigned_machine_id, order.started_at if order.started_at else None, order.id))
             conn.commit()
 
+    @staticmethod
+    def complete_orders(order_ids: List[int]) -> int:
+        """
+        Marks orders as completed and posts their stock movements in one transaction:
+        raw materials of the product's BOM are issued and the finished products are received.
+        Sub-assemblies (bom_components) are issued from stock as far as it goes; the rest
+        counts as built with the order, so their raw materials are issued instead. The orders' material reservations and pegs
+        are released and the stock left is re-allocated to the other orders.
+        Orders that are already completed are skipped.
+        
+        Args:
+            order_ids: IDs of the orders to complete
+            
+        Returns:
+            Number of orders completed
+            
+        Raises:
+            ValueError: If a raw material is short; nothing is posted then
+        """
+        from services.multilevel_bom import MultiLevelBOM
+        
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS posting_orders (order_id INTEGER PRIMARY KEY)")
+            cursor.execute("DELETE FROM posting_orders")
+            cursor.executemany("INSERT OR IGNORE INTO posting_orders (order_id) VALUES (?)", [(order_id,) for order_id in order_ids])
+            cursor.execute("""
+                DELETE FROM posting_orders
+                WHERE order_id NOT IN (SELECT id FROM production_orders WHERE status != 'completed')
+            """)
+            
+            # Net sub-assemblies level by level: their on-hand stock is issued first, the rest
+            # is built along with the order and backflushed (its own BOM is issued instead)
+            cursor.execute("""
+                SELECT o.product_id, SUM(o.quantity) FROM posting_orders p
+                JOIN production_orders o ON o.id = p.order_id
+                GROUP BY o.product_id
+            """)
+            demand = dict(cursor.fetchall())
+            cursor.execute("SELECT id, parent_product_id, component_product_id, quantity_needed FROM bom_components")
+            components = [BOMComponent(*row) for row in cursor.fetchall()]
+            cursor.execute("""
+                SELECT id, MAX(quantity, 0) FROM products
+                WHERE id IN (SELECT component_product_id FROM bom_components)
+            """)
+            used_stock: Dict[int, float] = {}
+            production = MultiLevelBOM(components).production_quantities(demand, dict(cursor.fetchall()), used_stock)
+            
+            # Issue raw materials: BOM x quantity built, aggregated per material
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS posting_production (product_id INTEGER PRIMARY KEY, quantity REAL)")
+            cursor.execute("DELETE FROM posting_production")
+            cursor.executemany("INSERT INTO posting_production (product_id, quantity) VALUES (?, ?)", production.items())
+            issue = """
+                SELECT b.material_id, SUM(b.quantity_needed * p.quantity) AS quantity
+                FROM posting_production p
+                JOIN bom b ON b.product_id = p.product_id
+                GROUP BY b.material_id
+            """
+            # Stock never goes negative: reject the whole posting if a material is short
+            cursor.execute(f"""
+                SELECT m.name, m.quantity, issue.quantity FROM ({issue}) AS issue
+                JOIN materials m ON m.id = issue.material_id
+                WHERE issue.quantity > m.quantity + 1e-9
+                ORDER BY m.id
+            """)
+            short = cursor.fetchall()
+            if short:
+                conn.rollback()
+                raise ValueError("Not enough stock to complete the orders: " + ", ".join(
+                    f"{name} needs {needed:.2f}, {on_hand:.2f} on hand" for name, on_hand, needed in short
+                ))
+            cursor.execute(f"""
+                UPDATE materials SET quantity = materials.quantity - issue.quantity
+                FROM ({issue}) AS issue
+                WHERE materials.id = issue.material_id
+            """)
+            cursor.execute("DELETE FROM posting_production")
+            
+            # Receive finished products, issue the sub-assemblies taken from stock
+            movements = {product_id: quantity for product_id, quantity in demand.items()}
+            for product_id, quantity in used_stock.items():
+                movements[product_id] = movements.get(product_id, 0) - quantity
+            cursor.executemany("UPDATE products SET quantity = quantity + ? WHERE id = ?",
+                               [(quantity, product_id) for product_id, quantity in movements.items()])
+            
+            cursor.execute("""
+                UPDATE production_orders SET status = 'completed'
+                WHERE id IN (SELECT order_id FROM posting_orders)
+            """)
+            completed = cursor.rowcount
+            ProductionOrderRepository._release_reservations(cursor)
+            conn.commit()
+        return completed
+    
+    @staticmethod
+    def _release_reservations(cursor):
+        """
+        Deletes the material reservations and pegs of the orders in posting_orders and
+        re-allocates the stock of the affected materials to their other orders, like the
+        MRP state does: higher priority first, then earlier deadline. Empties posting_orders.
+        """
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS released_materials (material_id INTEGER PRIMARY KEY)")
+        cursor.execute("DELETE FROM released_materials")
+        cursor.execute("""
+            INSERT OR IGNORE INTO released_materials (material_id)
+            SELECT material_id FROM material_allocations WHERE order_id IN (SELECT order_id FROM posting_orders)
+        """)
+        cursor.execute("DELETE FROM material_allocations WHERE order_id IN (SELECT order_id FROM posting_orders)")
+        cursor.execute("DELETE FROM material_pegging WHERE order_id IN (SELECT order_id FROM posting_orders)")
+        # Greedy by rank: each order gets what is left after the orders ranked before it
+        cursor.execute("""
+            UPDATE material_allocations SET quantity_allocated = ranked.quantity
+            FROM (
+                SELECT a.id, MIN(a.quantity_required, MAX(MAX(m.quantity, 0) - COALESCE(SUM(a.quantity_required) OVER (
+                    PARTITION BY a.material_id ORDER BY o.priority, o.deadline, a.order_id
+                    ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                ), 0), 0)) AS quantity
+                FROM material_allocations a
+                JOIN production_orders o ON o.id = a.order_id
+                JOIN materials m ON m.id = a.material_id
+                WHERE a.material_id IN (SELECT material_id FROM released_materials)
+            ) AS ranked
+            WHERE material_allocations.id = ranked.id
+        """)
+        cursor.execute("DELETE FROM released_materials")
+        cursor.execute("DELETE FROM posting_orders")
+    
     @staticmethod
     def delete_order(order: ProductionOrder):
-        """Deletes a production order from the database."""
+        """Deletes a production order from the database; its material reservations go to the other orders."""
         with database.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS posting_orders (order_id INTEGER PRIMARY KEY)")
+            cursor.execute("DELETE FROM posting_orders")
+            cursor.execute("INSERT INTO posting_orders (order_id) VALUES (?)", (order.id,))
+            ProductionOrderRepository._release_reservations(cursor)
             cursor.execute("DELETE FROM production_orders WHERE id = ?", (order.id,))
             conn.commit()
     
@@ -180,6 +312,14 @@ class ProductionOrderRepository:
                 assigned_machine_id=row[7], started_at=row[8] if row[8] else ""
             ) for row in rows]
     
+    @staticmethod
+    def get_pending_snapshot() -> Dict[int, Tuple[int, int, int, str]]:
+        """Returns order_id -> (product_id, quantity, priority, deadline) of all orders that are not yet completed."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, product_id, quantity, priority, deadline FROM production_orders WHERE status != 'completed'")
+            return {row[0]: row[1:] for row in cursor.fetchall()}
+    
     @staticmethod
     def get_pending_orders() -> List[ProductionOrder]:
         """Returns all orders that are not yet completed (in_queue or in_progress)."""
@@ -1,6 +1,6 @@
 from . import database
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, List
 from enum import Enum
 from datetime import datetime
 
@@ -20,10 +20,14 @@ class ProductionPlan():
     actual_start_time: str = ""  # DateTime string, nullable - when production actually started (updates when work begins)
     status: str = "planned"  # Current status: planned, in_progress, or completed
     created_at: str = ""  # DateTime string in format 'YYYY-MM-DD HH:MM:SS' - when this plan was calculated/created
+    operation_id: int = None  # FK to routing_operations - routing step this plan executes, None for single-step products
+    campaign_id: int = None  # FK to production_campaigns - set when the plan produces a whole campaign (order_id is its lead order)
     
     def __str__(self) -> str:
         actual_info = f", Actual Start: {self.actual_start_time}" if self.actual_start_time else ""
-        return f"ProductionPlan(ID: {self.id}, Order ID: {self.order_id}, Machine ID: {self.machine_id}, Planned: {self.planned_start_time} -> {self.planned_end_time}, Duration: {self.duration_hours}h, Status: {self.status}, Created: {self.created_at}{actual_info})"
+        operation_info = f", Operation ID: {self.operation_id}" if self.operation_id else ""
+        operation_info += f", Campaign ID: {self.campaign_id}" if self.campaign_id else ""
+        return f"ProductionPlan(ID: {self.id}, Order ID: {self.order_id}{operation_info}, Machine ID: {self.machine_id}, Planned: {self.planned_start_time} -> {self.planned_end_time}, Duration: {self.duration_hours}h, Status: {self.status}, Created: {self.created_at}{actual_info})"
 
 
 class ProductionPlanRepository:
@@ -43,10 +47,20 @@ class ProductionPlanRepository:
                     actual_start_time DATETIME,
                     status TEXT NOT NULL CHECK(status IN ('planned', 'in_progress', 'completed')),
                     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    operation_id INTEGER,
+                    campaign_id INTEGER,
                     FOREIGN KEY (order_id) REFERENCES production_orders(id) ON DELETE CASCADE,
                     FOREIGN KEY (machine_id) REFERENCES machines(id) ON DELETE CASCADE
                 );
             """)
+            # Databases created before routings existed
+            database.add_column_if_missing(cursor, "production_plans", "operation_id", "INTEGER")
+            database.add_column_if_missing(cursor, "production_plans", "campaign_id", "INTEGER")
+            # Rolling-horizon queries filter by status and start time, and look up plans by order
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_production_plans_status_start ON production_plans(status, planned_start_time)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_production_plans_order ON production_plans(order_id)")
+            # Repairs read one machine's timeline
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_production_plans_machine_start ON production_plans(machine_id, planned_start_time)")
             conn.commit()
     
     @staticmethod
@@ -55,10 +69,10 @@ class ProductionPlanRepository:
         with database.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO production_plans (order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO production_plans (order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, operation_id, campaign_id) 
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (plan.order_id, plan.machine_id, plan.planned_start_time, plan.planned_end_time, 
-                  plan.duration_hours, plan.actual_start_time if plan.actual_start_time else None, plan.status))
+                  plan.duration_hours, plan.actual_start_time if plan.actual_start_time else None, plan.status, plan.operation_id, plan.campaign_id))
             conn.commit()
             plan.id = cursor.lastrowid
             # Get the created_at value that was set by the database
@@ -66,13 +80,35 @@ class ProductionPlanRepository:
             plan.created_at = cursor.fetchone()[0]
         return plan
 
+    @staticmethod
+    def add_plans(plans: List[ProductionPlan]):
+        """Adds many production plans in a single transaction. Sets ID and created_at on each plan."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT CURRENT_TIMESTAMP, COALESCE(MAX(id), 0) FROM production_plans")
+            created_at, last_id = cursor.fetchone()
+            cursor.executemany("""
+                INSERT INTO production_plans (order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at, operation_id, campaign_id) 
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(plan.order_id, plan.machine_id, plan.planned_start_time, plan.planned_end_time, 
+                   plan.duration_hours, plan.actual_start_time if plan.actual_start_time else None, plan.status, created_at,
+                   plan.operation_id, plan.campaign_id)
+                  for plan in plans])
+            # New rows get increasing IDs in insertion order within this transaction
+            cursor.execute("SELECT id FROM production_plans WHERE id > ? ORDER BY id", (last_id,))
+            for plan, row in zip(plans, cursor.fetchall()):
+                plan.id = row[0]
+                plan.created_at = created_at
+            conn.commit()
+        return plans
+
     @staticmethod
     def get_plan_by_id(plan_id: int) -> ProductionPlan:
         """Fetches a production plan by its ID. Returns None if not found."""
         with database.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT id, order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at 
+                SELECT id, order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at, operation_id, campaign_id 
                 FROM production_plans WHERE id = ?
             """, (plan_id,))
             row = cursor.fetchone()
@@ -80,34 +116,56 @@ class ProductionPlanRepository:
                 return ProductionPlan(
                     id=row[0], order_id=row[1], machine_id=row[2], 
                     planned_start_time=row[3], planned_end_time=row[4], duration_hours=row[5],
-                    actual_start_time=row[6] if row[6] else "", status=row[7], created_at=row[8]
+                    actual_start_time=row[6] if row[6] else "", status=row[7], created_at=row[8], operation_id=row[9], campaign_id=row[10]
                 )
             return None
     
     @staticmethod
     def get_plans_by_order_id(order_id: int) -> List[ProductionPlan]:
-        """Fetches all production plans for a specific order."""
+        """Fetches all production plans for a specific order, including plans of a campaign it belongs to."""
         with database.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT id, order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at 
-                FROM production_plans WHERE order_id = ?
+                SELECT id, order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at, operation_id, campaign_id 
+                FROM production_plans 
+                WHERE order_id = ? OR campaign_id IN (SELECT campaign_id FROM campaign_orders WHERE order_id = ?)
                 ORDER BY planned_start_time
-            """, (order_id,))
+            """, (order_id, order_id))
             rows = cursor.fetchall()
             return [ProductionPlan(
                 id=row[0], order_id=row[1], machine_id=row[2], 
                 planned_start_time=row[3], planned_end_time=row[4], duration_hours=row[5],
-                actual_start_time=row[6] if row[6] else "", status=row[7], created_at=row[8]
+                actual_start_time=row[6] if row[6] else "", status=row[7], created_at=row[8], operation_id=row[9], campaign_id=row[10]
             ) for row in rows]
     
+    @staticmethod
+    def get_order_start_times() -> Dict[int, str]:
+        """Returns order_id -> earliest planned start of its planned/in_progress plans (campaign members get their campaign's start)."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT order_id, MIN(planned_start_time) FROM production_plans
+                WHERE status IN ('planned', 'in_progress')
+                GROUP BY order_id
+                UNION ALL
+                SELECT co.order_id, MIN(pp.planned_start_time)
+                FROM campaign_orders co JOIN production_plans pp ON pp.campaign_id = co.campaign_id
+                WHERE pp.status IN ('planned', 'in_progress')
+                GROUP BY co.order_id
+            """)
+            starts: Dict[int, str] = {}
+            for order_id, start in cursor.fetchall():
+                if order_id not in starts or start < starts[order_id]:
+                    starts[order_id] = start
+            return starts
+    
     @staticmethod
     def get_plans_by_machine_id(machine_id: int) -> List[ProductionPlan]:
         """Fetches all production plans assigned to a specific machine, ordered by planned start time."""
         with database.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT id, order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at 
+                SELECT id, order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at, operation_id, campaign_id 
                 FROM production_plans WHERE machine_id = ?
                 ORDER BY planned_start_time
             """, (machine_id,))
@@ -115,7 +173,7 @@ class ProductionPlanRepository:
             return [ProductionPlan(
                 id=row[0], order_id=row[1], machine_id=row[2], 
                 planned_start_time=row[3], planned_end_time=row[4], duration_hours=row[5],
-                actual_start_time=row[6] if row[6] else "", status=row[7], created_at=row[8]
+                actual_start_time=row[6] if row[6] else "", status=row[7], created_at=row[8], operation_id=row[9], campaign_id=row[10]
             ) for row in rows]
     
     @staticmethod
@@ -124,7 +182,7 @@ class ProductionPlanRepository:
         with database.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT id, order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at 
+                SELECT id, order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at, operation_id, campaign_id 
                 FROM production_plans WHERE status = ?
                 ORDER BY planned_start_time
             """, (status,))
@@ -132,7 +190,7 @@ class ProductionPlanRepository:
             return [ProductionPlan(
                 id=row[0], order_id=row[1], machine_id=row[2], 
                 planned_start_time=row[3], planned_end_time=row[4], duration_hours=row[5],
-                actual_start_time=row[6] if row[6] else "", status=row[7], created_at=row[8]
+                actual_start_time=row[6] if row[6] else "", status=row[7], created_at=row[8], operation_id=row[9], campaign_id=row[10]
             ) for row in rows]
     
     @staticmethod
@@ -141,7 +199,7 @@ class ProductionPlanRepository:
         with database.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT id, order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at 
+                SELECT id, order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at, operation_id, campaign_id 
                 FROM production_plans 
                 ORDER BY planned_start_time
             """)
@@ -149,7 +207,7 @@ class ProductionPlanRepository:
             return [ProductionPlan(
                 id=row[0], order_id=row[1], machine_id=row[2], 
                 planned_start_time=row[3], planned_end_time=row[4], duration_hours=row[5],
-                actual_start_time=row[6] if row[6] else "", status=row[7], created_at=row[8]
+                actual_start_time=row[6] if row[6] else "", status=row[7], created_at=row[8], operation_id=row[9], campaign_id=row[10]
             ) for row in rows]
     
     @staticmethod
@@ -183,6 +241,95 @@ class ProductionPlanRepository:
             cursor.execute("DELETE FROM production_plans WHERE order_id = ?", (order_id,))
             conn.commit()
     
+    @staticmethod
+    def get_machine_plans_after(machine_id: int, after: str) -> List[ProductionPlan]:
+        """Fetches planned/in_progress plans of a machine that end after the given time, ordered by start."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at, operation_id, campaign_id 
+                FROM production_plans 
+                WHERE machine_id = ? AND planned_end_time > ? AND status IN ('planned', 'in_progress')
+                ORDER BY planned_start_time
+            """, (machine_id, after))
+            rows = cursor.fetchall()
+            return [ProductionPlan(
+                id=row[0], order_id=row[1], machine_id=row[2], 
+                planned_start_time=row[3], planned_end_time=row[4], duration_hours=row[5],
+                actual_start_time=row[6] if row[6] else "", status=row[7], created_at=row[8], operation_id=row[9], campaign_id=row[10]
+            ) for row in rows]
+    
+    @staticmethod
+    def update_plans(plans: List[ProductionPlan]):
+        """Updates machine, times and duration of many plans in a single transaction."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                UPDATE production_plans 
+                SET machine_id = ?, planned_start_time = ?, planned_end_time = ?, duration_hours = ?
+                WHERE id = ?
+            """, [(plan.machine_id, plan.planned_start_time, plan.planned_end_time, plan.duration_hours, plan.id)
+                  for plan in plans])
+            conn.commit()
+    
+    @staticmethod
+    def get_plan_stamp() -> tuple:
+        """
+        Cheap summary of the plan table to detect changes: row count, last ID, plans per status
+        and a checksum over (id, start, end, machine) of every plan, so in-place moves show up too.
+        """
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            # Per-plan hash mixed modulo a prime to stay within 64-bit integers, summed over all plans
+            cursor.execute("""
+                SELECT COUNT(*), COALESCE(MAX(id), 0),
+                       COALESCE(SUM(status = 'in_progress'), 0), COALESCE(SUM(status = 'completed'), 0),
+                       COALESCE(SUM((((id * 1000003 + COALESCE(CAST(strftime('%s', planned_start_time) AS INTEGER), 0)) % 2147483647
+                                     * 1000003 + COALESCE(CAST(strftime('%s', planned_end_time) AS INTEGER), 0)) % 2147483647
+                                    * 1000003 + machine_id) % 2147483647), 0)
+                FROM production_plans
+            """)
+            return tuple(cursor.fetchone())
+    
+    @staticmethod
+    def get_frozen_plans(frozen_until: str) -> List[ProductionPlan]:
+        """
+        Returns the plans of every order that is in progress or has a planned plan
+        starting before frozen_until ('YYYY-MM-DD HH:MM:SS'), including its later lots.
+        """
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at, operation_id, campaign_id 
+                FROM production_plans 
+                WHERE status IN ('planned', 'in_progress') AND order_id IN (
+                    SELECT order_id FROM production_plans
+                    WHERE status = 'in_progress' OR (status = 'planned' AND planned_start_time < ?)
+                )
+                ORDER BY machine_id, planned_start_time
+            """, (frozen_until,))
+            rows = cursor.fetchall()
+            return [ProductionPlan(
+                id=row[0], order_id=row[1], machine_id=row[2], 
+                planned_start_time=row[3], planned_end_time=row[4], duration_hours=row[5],
+                actual_start_time=row[6] if row[6] else "", status=row[7], created_at=row[8], operation_id=row[9], campaign_id=row[10]
+            ) for row in rows]
+    
+    @staticmethod
+    def delete_unfrozen_plans(frozen_until: str) -> int:
+        """Deletes planned plans of all orders not frozen (see get_frozen_plans). Returns the number deleted."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM production_plans 
+                WHERE status = 'planned' AND order_id NOT IN (
+                    SELECT order_id FROM production_plans
+                    WHERE status = 'in_progress' OR (status = 'planned' AND planned_start_time < ?)
+                )
+            """, (frozen_until,))
+            conn.commit()
+            return cursor.rowcount
+    
     @staticmethod
     def delete_all_plans():
         """Deletes all production plans from the database. Used when generating a fresh plan."""
@@ -197,7 +344,7 @@ class ProductionPlanRepository:
         with database.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT id, order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at 
+                SELECT id, order_id, machine_id, planned_start_time, planned_end_time, duration_hours, actual_start_time, status, created_at, operation_id, campaign_id 
                 FROM production_plans 
                 WHERE status IN ('planned', 'in_progress')
                 ORDER BY machine_id, planned_start_time
@@ -206,7 +353,7 @@ class ProductionPlanRepository:
             return [ProductionPlan(
                 id=row[0], order_id=row[1], machine_id=row[2], 
                 planned_start_time=row[3], planned_end_time=row[4], duration_hours=row[5],
-                actual_start_time=row[6] if row[6] else "", status=row[7], created_at=row[8]
+                actual_start_time=row[6] if row[6] else "", status=row[7], created_at=row[8], operation_id=row[9], campaign_id=row[10]
             ) for row in rows]
     
     @staticmethod
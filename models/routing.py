@@ -0,0 +1,193 @@
+from . import database
+from dataclasses import dataclass
+from typing import List
+
+@dataclass
+class RoutingOperation():
+    id: int
+    product_id: int  # FK to products
+    sequence: int  # step number - without explicit precedences the steps run in this order
+    name: str  # e.g. cutting, welding, painting
+
+    def __str__(self) -> str:
+        return f"RoutingOperation(ID: {self.id}, Product ID: {self.product_id}, Step {self.sequence}: '{self.name}')"
+
+
+@dataclass
+class OperationRecipe():
+    id: int
+    operation_id: int  # FK to routing_operations
+    machine_id: int  # FK to machines - machine that can perform this operation
+    production_capacity: float  # units per hour for this operation on this machine
+
+    def __str__(self) -> str:
+        return f"OperationRecipe(ID: {self.id}, Operation ID: {self.operation_id}, Machine ID: {self.machine_id}, Capacity: {self.production_capacity} units/h)"
+
+
+@dataclass
+class OperationPrecedence():
+    id: int
+    operation_id: int  # FK to routing_operations - operation that has to wait
+    predecessor_id: int  # FK to routing_operations - operation that must finish first
+
+    def __str__(self) -> str:
+        return f"OperationPrecedence(ID: {self.id}, Operation {self.predecessor_id} -> {self.operation_id})"
+
+
+class RoutingRepository:
+    """Multi-operation routings. A product with routing operations is produced step by step;
+    if its operations have no precedences they run in sequence order, otherwise as a DAG."""
+
+    @staticmethod
+    def init_table():
+        """Creates the routing_operations, operation_recipes and operation_precedences tables if they don't exist."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS routing_operations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    product_id INTEGER NOT NULL,
+                    sequence INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+                    UNIQUE(product_id, sequence)
+                );
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS operation_recipes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    operation_id INTEGER NOT NULL,
+                    machine_id INTEGER NOT NULL,
+                    production_capacity REAL NOT NULL CHECK(production_capacity > 0),
+                    FOREIGN KEY (operation_id) REFERENCES routing_operations(id) ON DELETE CASCADE,
+                    FOREIGN KEY (machine_id) REFERENCES machines(id) ON DELETE CASCADE,
+                    UNIQUE(operation_id, machine_id)
+                );
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS operation_precedences (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    operation_id INTEGER NOT NULL,
+                    predecessor_id INTEGER NOT NULL,
+                    FOREIGN KEY (operation_id) REFERENCES routing_operations(id) ON DELETE CASCADE,
+                    FOREIGN KEY (predecessor_id) REFERENCES routing_operations(id) ON DELETE CASCADE,
+                    UNIQUE(operation_id, predecessor_id),
+                    CHECK(operation_id != predecessor_id)
+                );
+            """)
+            conn.commit()
+
+    @staticmethod
+    def add_operation(operation: RoutingOperation):
+        """Adds a new routing operation to the database. Returns the operation with its new ID."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO routing_operations (product_id, sequence, name)
+                VALUES (?, ?, ?)
+            """, (operation.product_id, operation.sequence, operation.name))
+            conn.commit()
+            operation.id = cursor.lastrowid
+        return operation
+
+    @staticmethod
+    def get_operations_by_product_id(product_id: int) -> List[RoutingOperation]:
+        """Fetches the routing of a product, ordered by step number."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, product_id, sequence, name
+                FROM routing_operations WHERE product_id = ?
+                ORDER BY sequence
+            """, (product_id,))
+            rows = cursor.fetchall()
+            return [RoutingOperation(id=row[0], product_id=row[1], sequence=row[2], name=row[3]) for row in rows]
+
+    @staticmethod
+    def get_all_operations() -> List[RoutingOperation]:
+        """Returns all routing operations, ordered by product and step number."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, product_id, sequence, name FROM routing_operations ORDER BY product_id, sequence")
+            rows = cursor.fetchall()
+            return [RoutingOperation(id=row[0], product_id=row[1], sequence=row[2], name=row[3]) for row in rows]
+
+    @staticmethod
+    def delete_operation(operation: RoutingOperation):
+        """Deletes a routing operation (with its recipes and precedences)."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM routing_operations WHERE id = ?", (operation.id,))
+            conn.commit()
+
+    @staticmethod
+    def add_operation_recipe(recipe: OperationRecipe):
+        """Adds a machine that can perform an operation. Returns the recipe with its new ID."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO operation_recipes (operation_id, machine_id, production_capacity)
+                VALUES (?, ?, ?)
+            """, (recipe.operation_id, recipe.machine_id, recipe.production_capacity))
+            conn.commit()
+            recipe.id = cursor.lastrowid
+        return recipe
+
+    @staticmethod
+    def get_recipes_by_operation_id(operation_id: int) -> List[OperationRecipe]:
+        """Fetches all machines that can perform an operation."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, operation_id, machine_id, production_capacity
+                FROM operation_recipes WHERE operation_id = ?
+            """, (operation_id,))
+            rows = cursor.fetchall()
+            return [OperationRecipe(id=row[0], operation_id=row[1], machine_id=row[2], production_capacity=row[3]) for row in rows]
+
+    @staticmethod
+    def get_all_operation_recipes() -> List[OperationRecipe]:
+        """Returns all operation recipes from the database."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, operation_id, machine_id, production_capacity FROM operation_recipes ORDER BY id")
+            rows = cursor.fetchall()
+            return [OperationRecipe(id=row[0], operation_id=row[1], machine_id=row[2], production_capacity=row[3]) for row in rows]
+
+    @staticmethod
+    def delete_operation_recipe(recipe: OperationRecipe):
+        """Deletes an operation recipe from the database."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM operation_recipes WHERE id = ?", (recipe.id,))
+            conn.commit()
+
+    @staticmethod
+    def add_precedence(precedence: OperationPrecedence):
+        """Adds a precedence (predecessor must finish before operation starts). Returns it with its new ID."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO operation_precedences (operation_id, predecessor_id)
+                VALUES (?, ?)
+            """, (precedence.operation_id, precedence.predecessor_id))
+            conn.commit()
+            precedence.id = cursor.lastrowid
+        return precedence
+
+    @staticmethod
+    def get_all_precedences() -> List[OperationPrecedence]:
+        """Returns all operation precedences from the database."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, operation_id, predecessor_id FROM operation_precedences ORDER BY id")
+            rows = cursor.fetchall()
+            return [OperationPrecedence(id=row[0], operation_id=row[1], predecessor_id=row[2]) for row in rows]
+
+    @staticmethod
+    def delete_precedence(precedence: OperationPrecedence):
+        """Deletes an operation precedence from the database."""
+        with database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM operation_precedences WHERE id = ?", (precedence.id,))
+            conn.commit()
@@ -0,0 +1,99 @@
+"""
+Bill of materials compiled into a sparse products x materials matrix (CSR, pure NumPy).
+Gross material requirements of many orders are one sparse matrix-vector product.
+The compiled matrix is cached in memory and rebuilt when the bom table changes.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from models import database
+from models.bom import BOM, BOMRepository
+from models.material import Material
+
+
+class BOMMatrix:
+    """quantity_needed per (product, material) in compressed sparse row form."""
+
+    def __init__(self, boms: List[BOM]):
+        self.product_ids = sorted({b.product_id for b in boms})
+        self.material_ids = sorted({b.material_id for b in boms})
+        self.product_index: Dict[int, int] = {p: i for i, p in enumerate(self.product_ids)}
+        self.material_index: Dict[int, int] = {m: i for i, m in enumerate(self.material_ids)}
+
+        rows = np.array([self.product_index[b.product_id] for b in boms], dtype=np.int64)
+        cols = np.array([self.material_index[b.material_id] for b in boms], dtype=np.int64)
+        values = np.array([b.quantity_needed for b in boms], dtype=np.float64)
+        order = np.lexsort((cols, rows))
+        self.indices = cols[order]
+        self.data = values[order]
+        self.indptr = np.zeros(len(self.product_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(self.product_ids)), out=self.indptr[1:])
+
+    def row(self, product_id: int) -> Tuple[List[int], np.ndarray]:
+        """Materials of one product and their quantities per unit."""
+        p = self.product_index.get(product_id)
+        if p is None:
+            return [], np.zeros(0)
+        lo, hi = self.indptr[p], self.indptr[p + 1]
+        return [self.material_ids[m] for m in self.indices[lo:hi]], self.data[lo:hi]
+
+    def product_vector(self, quantities: Dict[int, float]) -> np.ndarray:
+        """Dense vector of product quantities (products without BOM are dropped)."""
+        vector = np.zeros(len(self.product_ids))
+        for product_id, quantity in quantities.items():
+            p = self.product_index.get(product_id)
+            if p is not None:
+                vector[p] += quantity
+        return vector
+
+    def gross(self, product_vector: np.ndarray) -> np.ndarray:
+        """Gross requirements per material (material_ids order): BOM^T x product quantities."""
+        per_entry = self.data * np.repeat(product_vector, np.diff(self.indptr))
+        return np.bincount(self.indices, weights=per_entry, minlength=len(self.material_ids))
+
+    def gross_matrix(self, product_matrix: np.ndarray) -> np.ndarray:
+        """Gross requirements per material and column (e.g. time bucket) of a products x columns matrix."""
+        result = np.zeros((len(self.material_ids), product_matrix.shape[1]))
+        # Only BOM lines of products with any quantity, grouped by material (column-wise)
+        rows = np.repeat(np.arange(len(self.product_ids)), np.diff(self.indptr))
+        active = np.flatnonzero(product_matrix.any(axis=1)[rows])
+        if len(active) == 0:
+            return result
+        active = active[np.argsort(self.indices[active], kind="stable")]
+        materials = self.indices[active]
+        starts = np.flatnonzero(np.r_[True, materials[1:] != materials[:-1]])
+        contributions = self.data[active, None] * product_matrix[rows[active]]
+        result[materials[starts]] = np.add.reduceat(contributions, starts, axis=0)
+        return result
+
+    def used(self, product_vector: np.ndarray) -> np.ndarray:
+        """Mask of the materials used by any product with a non-zero quantity."""
+        active = np.repeat(product_vector != 0, np.diff(self.indptr))
+        return np.bincount(self.indices[active], minlength=len(self.material_ids)) > 0
+
+    def stock_vector(self, materials: List[Material]) -> np.ndarray:
+        """Stock per material (material_ids order); materials not in any BOM are ignored."""
+        vector = np.zeros(len(self.material_ids))
+        for material in materials:
+            m = self.material_index.get(material.id)
+            if m is not None:
+                vector[m] = material.quantity
+        return vector
+
+    def shortages(self, product_vector: np.ndarray, stock: np.ndarray) -> np.ndarray:
+        """Gross requirements minus stock (positive = shortage, negative = surplus)."""
+        return self.gross(product_vector) - stock
+
+
+_cache: Dict[str, object] = {"stamp": None, "matrix": None}
+
+
+def get_bom_matrix() -> BOMMatrix:
+    """Returns the compiled BOM matrix, rebuilding it only when the bom table changed."""
+    stamp = (str(database.DB_PATH), BOMRepository.get_bom_stamp())
+    if _cache["stamp"] != stamp:
+        _cache["matrix"] = BOMMatrix(BOMRepository.get_all_bom())
+        _cache["stamp"] = stamp
+    return _cache["matrix"]
@@ -0,0 +1,79 @@
+"""
+Campaign builder: batches queued orders of the same product with close deadlines
+into production campaigns, so each batch is scheduled as one block.
+"""
+
+from dataclasses import replace
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from models.campaign import ProductionCampaign, CampaignRepository
+from models.order import ProductionOrder
+
+
+class CampaignService:
+    """Service to build production campaigns from queued orders."""
+
+    @staticmethod
+    def build_campaigns(orders: List[ProductionOrder], tolerance_days: float,
+                        max_quantity: int = 0) -> Tuple[List[ProductionOrder], Dict[int, int]]:
+        """
+        Groups queued orders per product: starting from the earliest deadline, later
+        orders join the campaign while their deadline is within tolerance_days of it.
+        Campaigns without plans are rebuilt on every call; members of the campaigns that
+        keep their plans are left out, as those plans already produce them.
+
+        Args:
+            orders: Orders to schedule
+            tolerance_days: Maximum deadline spread inside one campaign
+            max_quantity: Upper limit of a campaign's total quantity (0 = unlimited)
+
+        Returns:
+            Tuple (orders to schedule with each campaign replaced by one combined order
+            carrying the ID of its lead order, lead order ID -> campaign ID)
+        """
+        deleted = CampaignRepository.delete_unstarted_campaigns()
+        if deleted:
+            print(f"Dissolved {deleted} campaigns that had not started")
+
+        # Orders of campaigns that keep their plans (started or frozen) are already covered
+        running = {order_id for ids in CampaignRepository.get_campaign_members().values() for order_id in ids}
+
+        by_product: Dict[int, List[ProductionOrder]] = {}
+        for order in orders:
+            if order.status == "in_queue" and order.id not in running:
+                by_product.setdefault(order.product_id, []).append(order)
+
+        replaced: Dict[int, ProductionOrder] = {}  # member order ID -> combined order (None for non-lead members)
+        campaign_of: Dict[int, int] = {}
+        for product_id, product_orders in by_product.items():
+            product_orders.sort(key=lambda o: (o.deadline, o.priority, o.id))
+            k = 0
+            while k < len(product_orders):
+                lead = product_orders[k]
+                limit = (datetime.strptime(lead.deadline, '%Y-%m-%d') + timedelta(days=tolerance_days)).strftime('%Y-%m-%d')
+                members = [lead]
+                quantity = lead.quantity
+                k += 1
+                while (k < len(product_orders) and product_orders[k].deadline <= limit
+                       and (not max_quantity or quantity + product_orders[k].quantity <= max_quantity)):
+                    members.append(product_orders[k])
+                    quantity += product_orders[k].quantity
+                    k += 1
+                if len(members) == 1:
+                    continue
+
+                campaign = CampaignRepository.add_campaign(ProductionCampaign(
+                    id=None, product_id=product_id, quantity=quantity,
+                    deadline=lead.deadline, priority=min(o.priority for o in members)
+                ), [o.id for o in members])
+                campaign_of[lead.id] = campaign.id
+                for member in members:
+                    replaced[member.id] = None
+                replaced[lead.id] = replace(lead, quantity=quantity, priority=campaign.priority)
+
+        if campaign_of:
+            print(f"Built {len(campaign_of)} campaigns from {len(replaced)} orders")
+        # Keep the original scheduling order; a campaign takes its lead order's place
+        result = [replaced.get(order.id, order) for order in orders if order.id not in running]
+        return [order for order in result if order is not None], campaign_of
@@ -0,0 +1,50 @@
+"""
+Dense sequence-dependent setup time matrix built from the changeovers table.
+Axis order: machine x from_product x to_product, values in minutes.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+from models.changeover import Changeover
+
+
+class ChangeoverMatrix:
+    """Setup minutes per (machine, from product, to product). Unknown pairs cost nothing."""
+
+    def __init__(self, changeovers: List[Changeover]):
+        machine_ids = sorted({c.machine_id for c in changeovers})
+        product_ids = sorted({c.from_product_id for c in changeovers} | {c.to_product_id for c in changeovers})
+        self.machine_index: Dict[int, int] = {m: i for i, m in enumerate(machine_ids)}
+        self.product_index: Dict[int, int] = {p: i for i, p in enumerate(product_ids)}
+
+        self.minutes = np.zeros((len(machine_ids), len(product_ids), len(product_ids)), dtype=np.float64)
+        if changeovers:
+            m = np.array([self.machine_index[c.machine_id] for c in changeovers])
+            a = np.array([self.product_index[c.from_product_id] for c in changeovers])
+            b = np.array([self.product_index[c.to_product_id] for c in changeovers])
+            self.minutes[m, a, b] = [c.setup_minutes for c in changeovers]
+            # Running the same product again never needs a setup
+            self.minutes[:, np.arange(len(product_ids)), np.arange(len(product_ids))] = 0.0
+
+    def hours(self, machine_id: int, from_product_id: int, to_product_id: int) -> float:
+        """Setup hours when a machine switches between two products."""
+        if from_product_id == to_product_id:
+            return 0.0
+        m = self.machine_index.get(machine_id)
+        a = self.product_index.get(from_product_id)
+        b = self.product_index.get(to_product_id)
+        if m is None or a is None or b is None:
+            return 0.0
+        return float(self.minutes[m, a, b]) / 60
+
+    def sequence_hours(self, machine_id: int, product_ids: List[int]) -> float:
+        """Total setup hours of running the products in the given order on one machine."""
+        m = self.machine_index.get(machine_id)
+        if m is None or len(product_ids) < 2:
+            return 0.0
+        idx = np.array([self.product_index.get(p, -1) for p in product_ids])
+        a, b = idx[:-1], idx[1:]
+        known = (a >= 0) & (b >= 0)
+        return float(self.minutes[m, a[known], b[known]].sum()) / 60
@@ -1,6 +1,8 @@
 from datetime import date
 from models.product import ProductRepository
 from models.order import ProductionOrderRepository
+from models.production_plan import ProductionPlanRepository
+from services.schedule_metrics import plan_metrics
 
 class DashboardService:
     """Service to prepare data for the Dashboard view (KPI and table)."""
@@ -72,4 +74,23 @@ class DashboardService:
                 "status": o.status,
                 "deadline": o.deadline
             })
-        return table_data
\ No newline at end of file
+        return table_data
+
+    @staticmethod
+    def get_schedule_kpis():
+        """Return quality measures of the current production plan for the KPI area."""
+        plans = ProductionPlanRepository.get_plans_for_gantt()
+        metrics = plan_metrics(plans, ProductionOrderRepository.get_all_orders())
+        return {
+            "makespan_hours": round(metrics.makespan_hours, 1),
+            "late_planned_orders": metrics.late_orders,
+            "weighted_tardiness_hours": round(metrics.weighted_tardiness, 1),
+            "average_utilization": round(metrics.average_utilization * 100, 1),
+            "peak_wip": max(metrics.wip_levels, default=0),
+
+            "makespan_label": "📅 Plan Makespan (h)",
+            "late_planned_label": "⚠️ Planned Late",
+            "tardiness_label": "⏳ Weighted Tardiness (h)",
+            "utilization_label": "🏭 Machine Utilization (%)",
+            "wip_label": "📦 Peak WIP"
+        }
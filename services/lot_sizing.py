@@ -0,0 +1,134 @@
+"""
+Lot sizing: turns time-phased requirements into planned purchases per material
+policy (lot-for-lot, fixed quantity, EOQ, period order quantity, min/max), with
+safety stock, pack multiples and supplier lead times. All materials are sized
+together, one NumPy step per time bucket.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List
+
+import numpy as np
+
+from models.material_policy import LotSizingPolicy, MaterialPolicy
+
+# Policy codes in the arrays
+POLICY_CODES = {p.value: k for k, p in enumerate(LotSizingPolicy)}
+
+
+@dataclass
+class PolicyArrays:
+    """Policy parameters per material, aligned with a material_ids list."""
+    code: np.ndarray
+    fixed_quantity: np.ndarray
+    periods: np.ndarray
+    min_quantity: np.ndarray
+    max_quantity: np.ndarray
+    pack_size: np.ndarray
+    lead_time_days: np.ndarray
+    safety_stock: np.ndarray
+    eoq: np.ndarray
+
+
+@dataclass
+class PlannedPurchase:
+    """A suggested purchase order."""
+    material_id: int
+    quantity: float
+    need_date: str  # Date string 'YYYY-MM-DD': start of the bucket the material must be in stock
+    release_date: str  # Date string 'YYYY-MM-DD': when to place the order (need date minus lead time)
+    late: bool  # release date already passed, released today
+
+    def __str__(self) -> str:
+        late_info = " (LATE)" if self.late else ""
+        return f"PlannedPurchase(Material ID: {self.material_id}, Quantity: {self.quantity}, Release: {self.release_date}, Need: {self.need_date}{late_info})"
+
+
+def economic_order_quantity(annual_demand: np.ndarray, ordering_cost: np.ndarray, holding_cost: np.ndarray) -> np.ndarray:
+    """EOQ = sqrt(2 * annual demand * ordering cost / holding cost); 0 where holding cost is not set."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eoq = np.sqrt(2.0 * annual_demand * ordering_cost / holding_cost)
+    return np.where(holding_cost > 0, eoq, 0.0)
+
+
+def policy_arrays(material_ids: List[int], policies: List[MaterialPolicy], annual_demand: np.ndarray) -> PolicyArrays:
+    """Policy parameters per material; materials without a policy are lot-for-lot."""
+    by_material: Dict[int, MaterialPolicy] = {p.material_id: p for p in policies}
+    default = MaterialPolicy(id=None, material_id=None)
+    rows = [by_material.get(m, default) for m in material_ids]
+    column = lambda name: np.array([getattr(p, name) for p in rows], dtype=np.float64)
+    return PolicyArrays(
+        code=np.array([POLICY_CODES[p.policy] for p in rows], dtype=np.int64),
+        fixed_quantity=column("fixed_quantity"),
+        periods=column("periods").astype(np.int64),
+        min_quantity=column("min_quantity"),
+        max_quantity=column("max_quantity"),
+        pack_size=column("pack_size"),
+        lead_time_days=column("lead_time_days").astype(np.int64),
+        safety_stock=column("safety_stock"),
+        eoq=economic_order_quantity(annual_demand, column("ordering_cost"), column("holding_cost")),
+    )
+
+
+def plan_lots(stock: np.ndarray, gross: np.ndarray, receipts: np.ndarray, policies: PolicyArrays) -> np.ndarray:
+    """
+    Planned purchase quantities (materials x buckets) arriving at the start of each bucket.
+
+    A purchase is triggered when projected stock would fall below safety stock
+    (min/max: below the reorder point, refilling to max_quantity but at least back
+    to the reorder point). Lots are then sized by policy, raised to min_quantity
+    and rounded up to pack multiples.
+    """
+    materials, buckets = gross.shape
+    lots = np.zeros((materials, buckets))
+    # Net flow of later buckets, for period order quantities
+    flow = np.concatenate([np.zeros((materials, 1)), np.cumsum(gross - receipts, axis=1)], axis=1)
+    rows = np.arange(materials)
+    is_min_max = policies.code == POLICY_CODES[LotSizingPolicy.MIN_MAX.value]
+    reorder_point = np.where(is_min_max, np.maximum(policies.min_quantity, policies.safety_stock), policies.safety_stock)
+    on_hand = stock.astype(np.float64).copy()
+
+    for t in range(buckets):
+        available = on_hand + receipts[:, t] - gross[:, t]
+        shortfall = policies.safety_stock - available
+        trigger = available < reorder_point - 1e-9
+        if not trigger.any():
+            on_hand = available
+            continue
+
+        window_end = np.minimum(t + policies.periods, buckets)
+        later = np.maximum(flow[rows, window_end] - flow[:, t + 1], 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fixed = np.where(policies.fixed_quantity > 0, np.ceil(shortfall / policies.fixed_quantity) * policies.fixed_quantity, shortfall)
+        lot = np.choose(policies.code, [
+            shortfall,  # lot_for_lot
+            fixed,  # fixed
+            np.maximum(shortfall, policies.eoq),  # eoq
+            shortfall + later,  # period
+            np.maximum(np.maximum(policies.max_quantity, policies.safety_stock), reorder_point) - available,  # min_max
+        ])
+        lot = np.where(is_min_max, lot, np.maximum(lot, policies.min_quantity))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lot = np.where(policies.pack_size > 0, np.ceil(lot / policies.pack_size - 1e-9) * policies.pack_size, lot)
+        lot = np.where(trigger, lot, 0.0)
+        lots[:, t] = lot
+        on_hand = available + lot
+    return lots
+
+
+def planned_purchases(material_ids: List[int], bucket_starts: List[str], lots: np.ndarray,
+                      lead_time_days: np.ndarray, today: date = None) -> List[PlannedPurchase]:
+    """Purchase orders from planned lots, released lead time before they are needed, by release date."""
+    today = np.datetime64(today or date.today(), "D")
+    m, t = np.nonzero(lots > 1e-9)
+    need = np.array(bucket_starts, dtype="datetime64[D]")[t]
+    release = need - lead_time_days[m].astype("timedelta64[D]")
+    late = release < today
+    purchases = [
+        PlannedPurchase(material_id=material_ids[k], quantity=q, need_date=n, release_date=r, late=l)
+        for k, q, n, r, l in zip(m.tolist(), lots[m, t].tolist(), need.astype(str).tolist(),
+                                 np.maximum(release, today).astype(str).tolist(), late.tolist())
+    ]
+    purchases.sort(key=lambda p: (p.release_date, p.material_id))
+    return purchases
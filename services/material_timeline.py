@@ -0,0 +1,59 @@
+"""
+Projected stock timeline for material-constrained scheduling.
+Per material: stock on hand plus expected receipts as a cumulative supply curve,
+and the quantity already reserved by released orders.
+"""
+
+from bisect import bisect_left
+from datetime import datetime
+from itertools import accumulate
+from typing import Dict, List, Tuple
+
+from models.material import Material
+from models.material_receipt import MaterialReceipt
+
+
+class MaterialTimeline:
+    """
+    Releases orders against projected stock, first come first served.
+
+    Supply of a material at time t is stock on hand plus all receipts expected by t.
+    An order may start at the first t where supply covers everything reserved so far
+    plus its own need; each check is a binary search over that material's receipts.
+    Orders reserved earlier may start later, so this never overbooks the stock.
+    """
+
+    def __init__(self, materials: List[Material], receipts: List[MaterialReceipt], origin: datetime):
+        self.times: Dict[int, List[float]] = {}  # material_id -> receipt times in hours (sorted)
+        self.supply: Dict[int, List[float]] = {}  # material_id -> cumulative supply after each receipt
+        self.reserved: Dict[int, float] = {}
+
+        stock = {m.id: m.quantity for m in materials}
+        by_material: Dict[int, List[Tuple[float, float]]] = {}
+        for receipt in receipts:
+            t = (datetime.strptime(receipt.expected_time, '%Y-%m-%d %H:%M:%S') - origin).total_seconds() / 3600
+            # Overdue deliveries are assumed to arrive now
+            by_material.setdefault(receipt.material_id, []).append((max(t, 0.0), receipt.quantity))
+
+        for material_id in set(stock) | set(by_material):
+            events = sorted(by_material.get(material_id, []))
+            self.times[material_id] = [0.0] + [t for t, _ in events]
+            self.supply[material_id] = list(accumulate([stock.get(material_id, 0.0)] + [q for _, q in events]))
+
+    def earliest_time(self, needs: List[Tuple[int, float]]) -> float:
+        """Earliest hour when all (material_id, quantity) needs are covered, or inf if never."""
+        release = 0.0
+        for material_id, quantity in needs:
+            supply = self.supply.get(material_id)
+            if supply is None:
+                return float("inf")
+            k = bisect_left(supply, self.reserved.get(material_id, 0.0) + quantity - 1e-9)
+            if k == len(supply):
+                return float("inf")
+            release = max(release, self.times[material_id][k])
+        return release
+
+    def reserve(self, needs: List[Tuple[int, float]]):
+        """Books the needs of a released order."""
+        for material_id, quantity in needs:
+            self.reserved[material_id] = self.reserved.get(material_id, 0.0) + quantity
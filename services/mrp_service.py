@@ -4,14 +4,26 @@ Calculates material needs for production orders and identifies shortages.
 Helps logists determine what materials to order and when.
 """
 
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from typing import List, Dict, Tuple
 from dataclasses import dataclass
-from models.order import ProductionOrderRepository
+
+import numpy as np
+
+from models import database
+from models.order import ProductionOrder, ProductionOrderRepository
 from models.product import ProductRepository
 from models.material import MaterialRepository
-from models.bom import BOMRepository
 from models.production_plan import ProductionPlanRepository
+from models.material_receipt import MaterialReceiptRepository
+from models.material_allocation import MaterialAllocation, MaterialAllocationRepository
+from models.material_pegging import MaterialPeg, MaterialPeggingRepository
+from models.material_policy import MaterialPolicyRepository
+from models.bom import BOMRepository
+from services.bom_matrix import get_bom_matrix
+from services.multilevel_bom import MultiLevelBOM
+from services.lot_sizing import PlannedPurchase, plan_lots, planned_purchases, policy_arrays
+from services.time_phased_mrp import BUCKET_DAYS, TimePhasedPlan, bucket_of, bucket_starts, project
 
 
 @dataclass
@@ -31,9 +43,223 @@ class MaterialRequirement:
         return f"{self.material_name} ({self.unit}): Need {self.quantity_needed}, Have {self.quantity_in_stock} [{status}]"
 
 
+@dataclass
+class RequirementDelta:
+    """Change of one material's requirement in a what-if simulation."""
+    material_id: int
+    material_name: str
+    unit: str
+    quantity_needed_before: float
+    quantity_needed_after: float
+    quantity_in_stock_before: float
+    quantity_in_stock_after: float
+    
+    @property
+    def shortage_before(self) -> float:
+        return max(self.quantity_needed_before - self.quantity_in_stock_before, 0.0)
+    
+    @property
+    def shortage_after(self) -> float:
+        return max(self.quantity_needed_after - self.quantity_in_stock_after, 0.0)
+    
+    def __str__(self) -> str:
+        return f"{self.material_name} ({self.unit}): Need {self.quantity_needed_before} -> {self.quantity_needed_after}, Short {self.shortage_before} -> {self.shortage_after}"
+
+
+def _order_shortages(pegs: List[MaterialPeg], stock: float, receipts: List[Tuple[str, float]]) -> Dict[int, float]:
+    """
+    Serves the pegs of one material first come, first served (unplanned orders first,
+    then by need date) from stock plus the receipts expected by each need date.
+    
+    Returns:
+        order_id -> quantity missing, for orders that are not fully covered
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    receipts = sorted(receipts)
+    available, k = stock, 0
+    shortages: Dict[int, float] = {}
+    for peg in sorted(pegs, key=lambda p: (p.need_date or "", p.order_id)):
+        need_date = max(peg.need_date or now, now)
+        while k < len(receipts) and receipts[k][0] <= need_date:
+            available += receipts[k][1]
+            k += 1
+        available -= peg.quantity
+        if available < -1e-9:
+            shortages[peg.order_id] = min(peg.quantity, -available)
+    return shortages
+
+
 class MRPService:
     """Service to calculate material requirements and generate procurement plans."""
     
+    # Incremental MRP state per database file (see services/mrp_state.py)
+    _states: Dict[str, object] = {}
+    # Last time-phased plan and planned purchases: (key, result), reused while the key holds
+    _phased_cache: Dict[str, tuple] = {}
+    
+    @staticmethod
+    def _current_state():
+        """The incremental MRP state of the current database, refreshed (pegging table included)."""
+        from services.mrp_state import MRPState
+        key = str(database.DB_PATH)
+        state = MRPService._states.get(key)
+        # A new connection means the database file may have been replaced: rebuild
+        if state is None or state.connection is not database.get_connection():
+            state = MRPService._states[key] = MRPState()
+            print(f"MRP state built for {len(state.requirements)} materials")
+        else:
+            updated = state.refresh()
+            print(f"MRP state refreshed: {updated} materials recalculated")
+        return state
+    
+    @staticmethod
+    def current_requirements() -> List[MaterialRequirement]:
+        """
+        Material requirements of pending orders, kept up to date incrementally:
+        only materials affected by changed orders, BOM lines, stock or plans are recalculated.
+        Gives the same result as calculate_material_requirements().
+        
+        Returns:
+            List of MaterialRequirement objects, one per material needed
+        """
+        return MRPService._current_state().get_requirements()
+    
+    @staticmethod
+    def explode_product(product_id: int, quantity: float) -> Dict[int, float]:
+        """
+        Raw materials needed to produce a quantity of one product through all BOM levels.
+        Sub-assembly stock is netted level by level, as in the MRP run.
+        
+        Args:
+            product_id: ID of the product to produce
+            quantity: Quantity to produce
+            
+        Returns:
+            material_id -> quantity needed (materials of the compiled BOM only)
+        """
+        matrix = get_bom_matrix()
+        structure = MultiLevelBOM(BOMRepository.get_all_components())
+        if structure.children:
+            stock = {p.id: p.quantity for p in ProductRepository.get_all_products()}
+            production = structure.production_quantities({product_id: quantity}, stock)
+        else:
+            production = {product_id: quantity}
+        gross = matrix.gross(matrix.product_vector(production))
+        return {matrix.material_ids[m]: float(gross[m]) for m in np.flatnonzero(gross)}
+    
+    @staticmethod
+    def simulate(extra_orders: List[ProductionOrder] = None, stock_overrides: Dict[int, float] = None) -> List[RequirementDelta]:
+        """
+        What-if MRP: how requirements and shortages change if hypothetical orders were
+        added and/or material stock levels were different. The hypothetical data lives
+        only in memory on top of the refreshed MRP state, so the answer takes milliseconds
+        and reflects the latest orders, BOM and stock; nothing is written to the database.
+        
+        Args:
+            extra_orders: Hypothetical orders (only product_id and quantity are used)
+            stock_overrides: material_id -> hypothetical stock level
+            
+        Returns:
+            List of RequirementDelta objects for the materials affected, in material_id order
+        """
+        state = MRPService._current_state()
+        stock_overrides = stock_overrides or {}
+        extra_demand: Dict[int, float] = {}
+        for order in extra_orders or []:
+            extra_demand[order.product_id] = extra_demand.get(order.product_id, 0) + order.quantity
+        delta = state.what_if(extra_demand)
+        
+        deltas: List[RequirementDelta] = []
+        for material_id in sorted(set(delta) | set(stock_overrides)):
+            material = state.materials.get(material_id)
+            if material is None:
+                continue
+            current = state.requirements.get(material_id)
+            needed = current.quantity_needed if current else 0.0
+            deltas.append(RequirementDelta(
+                material_id=material_id,
+                material_name=material.name,
+                unit=material.unit,
+                quantity_needed_before=needed,
+                quantity_needed_after=needed + delta.get(material_id, 0.0),
+                quantity_in_stock_before=material.quantity,
+                quantity_in_stock_after=stock_overrides.get(material_id, material.quantity)
+            ))
+        return deltas
+    
+    @staticmethod
+    def uncovered_orders() -> Dict[int, List[MaterialAllocation]]:
+        """
+        Orders whose material needs are not covered by the stock reserved for them.
+        On-hand stock is allocated by priority, then deadline; allocations are updated
+        only for materials affected by changes since the last call.
+        
+        Returns:
+            Dictionary order_id -> allocations of the materials it is short of
+        """
+        MRPService._current_state()
+        uncovered: Dict[int, List[MaterialAllocation]] = {}
+        for allocation in MaterialAllocationRepository.get_uncovered_allocations():
+            uncovered.setdefault(allocation.order_id, []).append(allocation)
+        return uncovered
+    
+    @staticmethod
+    def orders_short_if_delayed(receipt_id: int, new_expected_time: str, refresh: bool = False) -> List[Tuple[int, float]]:
+        """
+        Which orders run short of a material if one of its deliveries slips.
+        Only the pegs and receipts of that material are read; the pegs are those
+        persisted by the last MRP run unless refresh is set.
+        
+        Args:
+            receipt_id: ID of the expected receipt (delivery) that slips
+            new_expected_time: New expected time 'YYYY-MM-DD HH:MM:SS'
+            refresh: Bring the MRP state (and the pegs) up to date first
+            
+        Returns:
+            List of (order_id, quantity missing) for orders that are covered now
+            but not after the delay, in need order
+        """
+        receipt = MaterialReceiptRepository.get_receipt_by_id(receipt_id)
+        if receipt is None:
+            return []
+        if refresh:
+            MRPService._current_state()
+        material = MaterialRepository.get_material_by_id(receipt.material_id)
+        pegs = MaterialPeggingRepository.get_pegs_by_material_id(receipt.material_id)
+        receipts = MaterialReceiptRepository.get_receipts_by_material_id(receipt.material_id)
+        delayed = [(r.expected_time if r.id != receipt_id else new_expected_time, r.quantity) for r in receipts]
+        
+        before = _order_shortages(pegs, material.quantity, [(r.expected_time, r.quantity) for r in receipts])
+        after = _order_shortages(pegs, material.quantity, delayed)
+        return [(p.order_id, after[p.order_id]) for p in pegs if p.order_id in after and p.order_id not in before]
+    
+    @staticmethod
+    def blocking_materials(order_id: int, refresh: bool = False) -> List[Tuple[int, float]]:
+        """
+        Which materials block an order: materials that will not be available in full
+        at the order's planned start, after earlier needs of other orders are served.
+        Only the pegs and receipts of the order's materials are read; the pegs are those
+        persisted by the last MRP run unless refresh is set.
+        
+        Args:
+            order_id: ID of the production order
+            refresh: Bring the MRP state (and the pegs) up to date first
+            
+        Returns:
+            List of (material_id, quantity missing for this order)
+        """
+        if refresh:
+            MRPService._current_state()
+        blocking: List[Tuple[int, float]] = []
+        for peg in MaterialPeggingRepository.get_pegs_by_order_id(order_id):
+            material = MaterialRepository.get_material_by_id(peg.material_id)
+            pegs = MaterialPeggingRepository.get_pegs_by_material_id(peg.material_id)
+            receipts = [(r.expected_time, r.quantity) for r in MaterialReceiptRepository.get_receipts_by_material_id(peg.material_id)]
+            missing = _order_shortages(pegs, material.quantity, receipts).get(order_id)
+            if missing:
+                blocking.append((peg.material_id, missing))
+        return blocking
+    
     @staticmethod
     def calculate_material_requirements() -> List[MaterialRequirement]:
         """
@@ -56,69 +282,77 @@ class MRPService:
         
         print(f"\n📋 Analyzing {len(pending_orders)} pending orders...")
         
-        # Dictionary to accumulate material requirements
-        # Key: material_id, Value: {name, unit, quantity_needed, in_stock, orders, earliest_deadline}
-        material_reqs: Dict[int, Dict] = {}
+        # Compiled BOM (cached), materials and plan start times are loaded once
+        matrix = get_bom_matrix()
+        materials = {m.id: m for m in MaterialRepository.get_all_materials()}
         
-        # Get all production plans to determine when materials are needed
-        production_plans = ProductionPlanRepository.get_all_plans()
+        # When each order will be produced (earliest planned/in_progress plan)
+        order_start_times = ProductionPlanRepository.get_order_start_times()
         
-        # Process each pending order
+        # Aggregate pending orders per product: quantity, orders, earliest start, unplanned orders
+        product_quantity: Dict[int, float] = {}
+        product_orders: Dict[int, List[int]] = {}
+        product_start: Dict[int, str] = {}
+        product_unplanned: Dict[int, bool] = {}
         for order in pending_orders:
-            # Get BOM entries (materials needed) for this product
-            bom_entries = BOMRepository.get_bom_by_product_id(order.product_id)
-            
-            # Find when this order will be produced (from production plan)
-            order_start_time = None
-            for plan in production_plans:
-                if plan.order_id == order.id and plan.status in ["planned", "in_progress"]:
-                    order_start_time = plan.planned_start_time
-                    break
-            
-            # For each material in the BOM
-            for bom_entry in bom_entries:
-                material = MaterialRepository.get_material_by_id(bom_entry.material_id)
-                if not material:
+            product_quantity[order.product_id] = product_quantity.get(order.product_id, 0) + order.quantity
+            product_orders.setdefault(order.product_id, []).append(order.id)
+            order_start_time = order_start_times.get(order.id)
+            if order_start_time is None:
+                product_unplanned[order.product_id] = True
+            elif order.product_id not in product_start or order_start_time < product_start[order.product_id]:
+                product_start[order.product_id] = order_start_time
+        
+        # Sub-assemblies: net their demand level by level against product stock
+        structure = MultiLevelBOM(BOMRepository.get_all_components())
+        if structure.children:
+            stock = {p.id: p.quantity for p in ProductRepository.get_all_products()}
+            production = structure.production_quantities(product_quantity, stock)
+        else:
+            production = product_quantity
+        
+        # Gross requirements of all orders in one sparse matrix-vector product
+        product_vector = matrix.product_vector(production)
+        gross = matrix.gross(product_vector)
+        
+        # Orders and earliest need per material, from the products (and sub-assemblies) that use it
+        # Key: material_id, Value: {orders, earliest start, unplanned orders}
+        material_reqs: Dict[int, Dict] = {}
+        for product_id, order_ids in product_orders.items():
+            material_ids = {m for q in structure.subtree(product_id) if q in production for m in matrix.row(q)[0]}
+            for material_id in sorted(material_ids):
+                if material_id not in materials:
                     continue
+                req = material_reqs.setdefault(material_id, {"orders": [], "earliest_start": None, "unplanned": False})
+                req["orders"].extend(order_ids)
                 
-                # Calculate quantity needed for this order
-                quantity_needed = bom_entry.quantity_needed * order.quantity
-                
-                # Add or update in material requirements
-                if material.id not in material_reqs:
-                    material_reqs[material.id] = {
-                        "name": material.name,
-                        "unit": material.unit,
-                        "quantity_needed": 0,
-                        "in_stock": material.quantity,
-                        "orders": [],
-                        "deadline": order_start_time if order_start_time else datetime.now().isoformat()
-                    }
-                
-                material_reqs[material.id]["quantity_needed"] += quantity_needed
-                material_reqs[material.id]["orders"].append(order.id)
-                
-                # Update deadline to earliest (soonest needed)
-                if order_start_time:
-                    current_deadline = datetime.fromisoformat(material_reqs[material.id]["deadline"])
-                    order_deadline = datetime.fromisoformat(order_start_time)
-                    if order_deadline < current_deadline:
-                        material_reqs[material.id]["deadline"] = order_start_time
+                # Orders without a plan need the material now
+                req["unplanned"] = req["unplanned"] or product_unplanned.get(product_id, False)
+                start = product_start.get(product_id)
+                if start is not None and (req["earliest_start"] is None or start < req["earliest_start"]):
+                    req["earliest_start"] = start
         
         # Create MaterialRequirement objects
+        now = datetime.now()
         requirements: List[MaterialRequirement] = []
         
         for material_id, req in material_reqs.items():
-            difference = req["quantity_needed"] - req["in_stock"]
+            material = materials[material_id]
+            quantity_needed = float(gross[matrix.material_index[material_id]])
+            earliest = req["earliest_start"]
+            if earliest is None or (req["unplanned"] and datetime.fromisoformat(earliest) > now):
+                deadline = now.isoformat()
+            else:
+                deadline = earliest
             
             req_obj = MaterialRequirement(
                 material_id=material_id,
-                material_name=req["name"],
-                unit=req["unit"],
-                quantity_needed=req["quantity_needed"],
-                quantity_in_stock=req["in_stock"],
-                quantity_difference=difference,
-                deadline=req["deadline"],
+                material_name=material.name,
+                unit=material.unit,
+                quantity_needed=quantity_needed,
+                quantity_in_stock=material.quantity,
+                quantity_difference=quantity_needed - material.quantity,
+                deadline=deadline,
                 orders_requiring=req["orders"]
             )
             requirements.append(req_obj)
@@ -126,25 +360,149 @@ class MRPService:
         print(f"\n✅ Material requirements calculated for {len(requirements)} materials")
         return requirements
     
+    @staticmethod
+    def calculate_time_phased(bucket: str = "week", horizon_days: int = 365) -> TimePhasedPlan:
+        """
+        Calculates material flow per time bucket for pending production orders.
+        Each order needs its materials in the bucket of its earliest planned start
+        (unplanned orders: today). Orders and receipts beyond the horizon are left out.
+        
+        Args:
+            bucket: "day" or "week" (weeks start on Monday)
+            horizon_days: Length of the horizon in days
+            
+        Returns:
+            TimePhasedPlan with materials x buckets arrays
+        """
+        if bucket not in BUCKET_DAYS:
+            raise ValueError(f"Unknown bucket '{bucket}', expected one of {list(BUCKET_DAYS)}")
+        bucket_days = BUCKET_DAYS[bucket]
+        start = date.today()
+        if bucket == "week":
+            start -= timedelta(days=start.weekday())
+        buckets = -(-horizon_days // bucket_days)
+        today = start.isoformat()
+        
+        matrix = get_bom_matrix()
+        structure = MultiLevelBOM(BOMRepository.get_all_components())
+        order_start_times = ProductionPlanRepository.get_order_start_times()
+        
+        # Ordered quantity per bucket and product
+        demand: Dict[int, Dict[int, float]] = {}
+        for order in ProductionOrderRepository.get_pending_orders():
+            k = bucket_of(order_start_times.get(order.id, today), start, bucket_days, buckets)
+            if k >= 0:
+                per_product = demand.setdefault(k, {})
+                per_product[order.product_id] = per_product.get(order.product_id, 0) + order.quantity
+        
+        # Quantity to produce per product and bucket; sub-assembly stock is used up bucket by bucket
+        production = np.zeros((len(matrix.product_ids), buckets))
+        stock = {p.id: p.quantity for p in ProductRepository.get_all_products()} if structure.children else {}
+        for k in sorted(demand):
+            if structure.children:
+                used: Dict[int, float] = {}
+                quantities = structure.production_quantities(demand[k], stock, used)
+                for product_id, quantity in used.items():
+                    stock[product_id] -= quantity
+            else:
+                quantities = demand[k]
+            for product_id, quantity in quantities.items():
+                p = matrix.product_index.get(product_id)
+                if p is not None:
+                    production[p, k] += quantity
+        
+        receipts = np.zeros((len(matrix.material_ids), buckets))
+        for receipt in MaterialReceiptRepository.get_all_receipts():
+            m = matrix.material_index.get(receipt.material_id)
+            k = bucket_of(receipt.expected_time, start, bucket_days, buckets)
+            if m is not None and k >= 0:
+                receipts[m, k] += receipt.quantity
+        
+        gross = matrix.gross_matrix(production)
+        on_hand = matrix.stock_vector(MaterialRepository.get_all_materials())
+        projected, net = project(on_hand, gross, receipts)
+        return TimePhasedPlan(
+            material_ids=list(matrix.material_ids),
+            bucket_starts=bucket_starts(start, bucket_days, buckets),
+            gross=gross, receipts=receipts, projected_on_hand=projected, net=net
+        )
+    
+    @staticmethod
+    def plan_purchases(bucket: str = "week", horizon_days: int = 365) -> List[PlannedPurchase]:
+        """
+        Suggests purchase orders from the time-phased requirements, sized by each
+        material's lot-sizing policy (lot-for-lot without one) and released lead time
+        before the bucket in which the material is needed.
+        
+        Args:
+            bucket: "day" or "week"
+            horizon_days: Length of the horizon in days
+            
+        Returns:
+            List of PlannedPurchase objects, earliest release first
+        """
+        return MRPService._purchases(MRPService._current_state(), bucket, horizon_days)
+    
+    @staticmethod
+    def current_time_phased(bucket: str = "week", horizon_days: int = 365) -> TimePhasedPlan:
+        """
+        Same as calculate_time_phased, but recalculated only when orders, BOM, stock, plans
+        (tracked by the incremental MRP state) or expected receipts changed since the last call.
+        """
+        return MRPService._time_phased(MRPService._current_state(), bucket, horizon_days)
+    
+    @staticmethod
+    def _time_phased(state, bucket: str, horizon_days: int) -> TimePhasedPlan:
+        """Cached time-phased plan for a refreshed MRP state."""
+        key = (state, state.version, MaterialReceiptRepository.get_receipt_stamp(), date.today(), bucket, horizon_days)
+        cached = MRPService._phased_cache.get("phased")
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        phased = MRPService.calculate_time_phased(bucket, horizon_days)
+        MRPService._phased_cache["phased"] = (key, phased)
+        return phased
+    
+    @staticmethod
+    def _purchases(state, bucket: str, horizon_days: int) -> List[PlannedPurchase]:
+        """Cached planned purchases for a refreshed MRP state; also recalculated when policies change."""
+        phased = MRPService._time_phased(state, bucket, horizon_days)
+        policy_rows = MaterialPolicyRepository.get_all_policies()
+        key = (phased, repr(policy_rows))
+        cached = MRPService._phased_cache.get("purchases")
+        if cached is not None and cached[0][0] is phased and cached[0][1] == key[1]:
+            return list(cached[1])
+        stock = get_bom_matrix().stock_vector(state.materials.values())
+        annual_demand = phased.gross.sum(axis=1) * 365.0 / horizon_days
+        policies = policy_arrays(phased.material_ids, policy_rows, annual_demand)
+        lots = plan_lots(stock, phased.gross, phased.receipts, policies)
+        purchases = planned_purchases(phased.material_ids, phased.bucket_starts, lots, policies.lead_time_days)
+        MRPService._phased_cache["purchases"] = (key, purchases)
+        return list(purchases)
+    
     @staticmethod
     def generate_procurement_plan() -> Dict:
         """
         Generates a procurement plan for logists.
         Shows what materials need to be ordered and their deadlines.
+        The MRP state is refreshed once; the weekly time-phased plan and the planned
+        purchases are reused from the last call unless their inputs changed.
         
         Returns:
-            Dictionary with material info and procurement summary
+            Dictionary with material info, planned purchases, the weekly time-phased plan
+            ("time_phased") and procurement summary
         """
         print("\n" + "="*80)
         print("PROCUREMENT PLAN - WHAT TO ORDER & WHEN PRODUCTION STOPS")
         print("="*80)
         
-        # Get all material requirements
-        all_requirements = MRPService.calculate_material_requirements()
+        # Get all material requirements (only changed materials are recalculated)
+        state = MRPService._current_state()
+        all_requirements = state.get_requirements()
         
         if not all_requirements:
             print("\nNo materials needed - no production planned")
-            return {"all_materials": [], "shortage_materials": [], "summary": {}}
+            return {"all_materials": [], "shortage_materials": [], "planned_purchases": [],
+                    "time_phased": MRPService._time_phased(state, "week", 365), "summary": {}}
         
         # Filter materials with shortage
         shortage_materials = [r for r in all_requirements if r.quantity_difference > 0]
@@ -170,15 +528,28 @@ class MRPService:
             earliest_deadline = min(r.deadline for r in shortage_materials).split()[0]
             print(f"   ⏰ Earliest deadline: {earliest_deadline}")
         
+        # Purchase orders sized by lot-sizing policy and released by lead time
+        # (reused from the last call unless the state, receipts or policies changed)
+        purchases = MRPService._purchases(state, "week", 365)
+        names = {r.material_id: r.material_name for r in all_requirements}
+        if purchases:
+            print(f"\n{'RELEASE':<12} {'MATERIAL':<15} {'QUANTITY':<10} {'NEEDED BY':<12}")
+            for purchase in purchases:
+                late = " LATE" if purchase.late else ""
+                print(f"{purchase.release_date:<12} {names.get(purchase.material_id, purchase.material_id):<15} {purchase.quantity:<10.1f} {purchase.need_date:<12}{late}")
+        
         print("\n" + "="*80)
         
         return {
             "all_materials": all_requirements,
             "shortage_materials": shortage_materials,
+            "planned_purchases": purchases,
+            "time_phased": MRPService._time_phased(state, "week", 365),
             "summary": {
                 "total_materials": len(all_requirements),
                 "materials_with_shortage": len(shortage_materials),
-                "total_shortage_value": total_to_order
+                "total_shortage_value": total_to_order,
+                "planned_purchases": len(purchases)
             }
         }
 
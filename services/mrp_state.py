@@ -0,0 +1,347 @@
+"""
+Incremental MRP state kept in memory between runs.
+Each pending order's material needs are pegged to the materials (material -> orders
+index); when orders, BOM lines, stock levels or plan start times change, only the
+requirements of the affected materials are recalculated and only the pegs of the
+affected orders are written to the material_pegging table. On-hand stock of the
+affected materials is re-allocated to their orders (material_allocations).
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from models import database
+from models.bom import BOMComponent, BOMRepository
+from models.material import Material, MaterialRepository
+from models.material_allocation import MaterialAllocation, MaterialAllocationRepository
+from models.material_pegging import MaterialPeg, MaterialPeggingRepository
+from models.order import ProductionOrder, ProductionOrderRepository
+from models.product import ProductRepository
+from models.production_plan import ProductionPlanRepository
+from services.bom_matrix import get_bom_matrix
+from services.multilevel_bom import MultiLevelBOM
+
+
+class MRPState:
+    """
+    Material requirements of the pending orders, updated incrementally.
+
+    Orders of single-level products contribute their BOM explosion independently.
+    Orders of products with sub-assemblies share the sub-assembly stock, so their
+    needs are netted together as one group that is recalculated whenever one of
+    them (or the product structure) changes.
+    """
+
+    def __init__(self):
+        self.connection = database.get_connection()  # database the state (and its tables) belong to
+        self.orders: Dict[int, Tuple[int, float]] = {}  # order_id -> (product_id, quantity)
+        self.ranks: Dict[int, tuple] = {}  # order_id -> (priority, deadline): who gets stock first
+        self.pegging: Dict[int, Dict[int, float]] = {}  # material_id -> order_id -> quantity
+        self.order_materials: Dict[int, List[int]] = {}  # order_id -> pegged material_ids
+        self.group_needs: Dict[int, float] = {}  # material_id -> netted need of the multi-level orders
+        self.materials: Dict[int, Material] = {}
+        self.product_stock: Dict[int, float] = {}
+        self.start_times: Dict[int, str] = {}
+        self.requirements: Dict[int, object] = {}  # material_id -> MaterialRequirement
+        self.dirty: Set[int] = set()  # materials to recalculate
+        self.touched: Set[int] = set()  # orders whose pegs must be saved
+        self.unallocated: Set[int] = set()  # materials whose stock must be re-allocated
+        self.structure = MultiLevelBOM([])
+        self.bom_lines: Dict[int, List[Tuple[int, float]]] = {}  # product_id -> [(material_id, quantity per unit)]
+        self.stamps: Dict[str, tuple] = {}
+        self.saved = False  # pegging and allocation tables not yet written by this state
+        self.version = 0  # bumped whenever orders, BOM, stock or plans changed the state
+        self.refresh()
+
+    def get_requirements(self) -> List:
+        """Current requirements (MaterialRequirement) in material_id order."""
+        return [self.requirements[m] for m in sorted(self.requirements)]
+
+    def what_if(self, extra_demand: Dict[int, float]) -> Dict[int, float]:
+        """
+        Change of material needs if extra quantities of products were ordered.
+        Reads the state without changing it.
+
+        Args:
+            extra_demand: product_id -> additional quantity ordered
+
+        Returns:
+            material_id -> additional quantity needed
+        """
+        delta: Dict[int, float] = {}
+        grouped = {p: q for p, q in extra_demand.items() if p in self.structure.children}
+        for product_id, quantity in extra_demand.items():
+            if product_id not in grouped:
+                for material_id, per_unit in self.bom_lines.get(product_id, []):
+                    delta[material_id] = delta.get(material_id, 0.0) + per_unit * quantity
+        if grouped:
+            # Extra sub-assembly demand competes for the same sub-assembly stock: net the group again
+            demand = self._group_demand()
+            for product_id, quantity in grouped.items():
+                demand[product_id] = demand.get(product_id, 0) + quantity
+            _, needs = self._net_group(demand)
+            for material_id in set(needs) | set(self.group_needs):
+                delta[material_id] = delta.get(material_id, 0.0) + needs.get(material_id, 0.0) - self.group_needs.get(material_id, 0.0)
+        return delta
+
+    # --- change detection ---
+
+    def refresh(self) -> int:
+        """
+        Brings the state up to date with the database by comparing cheap snapshots
+        of the BOM, stock levels, plan start times and pending orders.
+
+        Returns:
+            Number of materials whose requirements were recalculated
+        """
+        components = BOMRepository.get_all_components()
+        bom_stamp = (BOMRepository.get_bom_stamp(), tuple((c.parent_product_id, c.component_product_id, c.quantity_needed) for c in components))
+        if self.stamps.get("bom") != bom_stamp:
+            self.stamps["bom"] = bom_stamp
+            self.bom_changed(components)
+
+        materials = {m.id: m for m in MaterialRepository.get_all_materials()}
+        for material_id in set(materials) | set(self.materials):
+            if materials.get(material_id) != self.materials.get(material_id):
+                self.stock_changed(material_id)
+        self.materials = materials
+
+        regroup = False
+        if self.structure.children:
+            product_stock = {p.id: p.quantity for p in ProductRepository.get_all_products()}
+            regroup = product_stock != self.product_stock
+            self.product_stock = product_stock
+
+        plan_stamp = ProductionPlanRepository.get_plan_stamp()
+        if self.stamps.get("plans") != plan_stamp:
+            self.stamps["plans"] = plan_stamp
+            self.plans_changed()
+
+        snapshot = ProductionOrderRepository.get_pending_snapshot()
+        pending = {order_id: row[:2] for order_id, row in snapshot.items()}
+        ranks = {order_id: row[2:] for order_id, row in snapshot.items()}
+        if ranks != self.ranks:
+            for order_id in set(ranks) & set(self.ranks):
+                if ranks[order_id] != self.ranks[order_id]:
+                    self.unallocated.update(self.order_materials.get(order_id, []))
+            self.ranks = ranks
+        changed = [] if pending == self.orders else \
+            [order_id for order_id in set(pending) | set(self.orders) if pending.get(order_id) != self.orders.get(order_id)]
+        regroup = regroup or any(self._is_grouped(pending.get(o)) or self._is_grouped(self.orders.get(o)) for o in changed)
+        for order_id in changed:
+            self._set_order(order_id, pending.get(order_id))
+        if regroup:
+            self._regroup()
+            self.version += 1
+
+        updated = len(self.dirty)
+        self._flush()
+        return updated
+
+    def order_changed(self, order_id: int, order: Optional[ProductionOrder] = None):
+        """
+        Re-pegs one order and recalculates the materials it uses.
+
+        Args:
+            order_id: ID of the changed order
+            order: The order as it is now, None if it is no longer pending
+        """
+        entry = (order.product_id, order.quantity) if order is not None else None
+        old = self.orders.get(order_id)
+        if order is not None:
+            if self.ranks.get(order_id) not in (None, (order.priority, order.deadline)):
+                self.unallocated.update(self.order_materials.get(order_id, []))
+            self.ranks[order_id] = (order.priority, order.deadline)
+        else:
+            self.ranks.pop(order_id, None)
+        self._set_order(order_id, entry)
+        if self._is_grouped(old) or self._is_grouped(entry):
+            self._regroup()
+        self._flush()
+
+    def stock_changed(self, material_id: int):
+        """Marks a material whose stock level changed."""
+        self.dirty.add(material_id)
+
+    def bom_changed(self, components: List[BOMComponent]):
+        """Reloads the product structure and re-pegs the orders of products whose BOM changed."""
+        matrix = get_bom_matrix()
+        bom_lines: Dict[int, List[Tuple[int, float]]] = {}
+        for product_id in matrix.product_ids:
+            material_ids, quantities = matrix.row(product_id)
+            bom_lines[product_id] = list(zip(material_ids, quantities.tolist()))
+        changed = {p for p in set(bom_lines) | set(self.bom_lines) if bom_lines.get(p) != self.bom_lines.get(p)}
+        old_parents = set(self.structure.children)
+        self.bom_lines = bom_lines
+        self.structure = MultiLevelBOM(components)
+        # Products that gained or lost sub-assemblies move between single-level and grouped pegging
+        changed |= old_parents ^ set(self.structure.children)
+        if self.structure.children and not self.product_stock:
+            self.product_stock = {p.id: p.quantity for p in ProductRepository.get_all_products()}
+
+        for order_id, entry in list(self.orders.items()):
+            if entry[0] in changed:
+                self._set_order(order_id, entry)
+        self._regroup()
+
+    def plans_changed(self):
+        """Reloads planned start times; materials of re-planned orders get new deadlines."""
+        start_times = ProductionPlanRepository.get_order_start_times()
+        for order_id in set(start_times) | set(self.start_times):
+            if start_times.get(order_id) != self.start_times.get(order_id):
+                self.dirty.update(self.order_materials.get(order_id, []))
+                if order_id in self.orders:
+                    self.touched.add(order_id)
+        self.start_times = start_times
+
+    # --- pegging ---
+
+    def _is_grouped(self, entry: Optional[Tuple[int, float]]) -> bool:
+        """True for orders of products with sub-assemblies (netted together)."""
+        return entry is not None and entry[0] in self.structure.children
+
+    def _unpeg(self, order_id: int):
+        for material_id in self.order_materials.pop(order_id, []):
+            self.pegging[material_id].pop(order_id, None)
+            self.dirty.add(material_id)
+            self.touched.add(order_id)
+
+    def _peg(self, order_id: int, needs: Dict[int, float]):
+        """Pegs an order to its material needs; materials whose pegs did not change stay clean."""
+        for material_id in self.order_materials.get(order_id, []):
+            if material_id not in needs:
+                self.pegging[material_id].pop(order_id, None)
+                self.dirty.add(material_id)
+                self.touched.add(order_id)
+        self.order_materials[order_id] = list(needs)
+        for material_id, need in needs.items():
+            pegged = self.pegging.setdefault(material_id, {})
+            if pegged.get(order_id) != need:
+                pegged[order_id] = need
+                self.dirty.add(material_id)
+                self.touched.add(order_id)
+
+    def _set_order(self, order_id: int, entry: Optional[Tuple[int, float]]):
+        """Replaces the pegs of one order; orders with sub-assemblies are pegged by _regroup."""
+        if entry is None or self._is_grouped(entry):
+            self._unpeg(order_id)
+        if entry is None:
+            self.orders.pop(order_id, None)
+            return
+        self.orders[order_id] = entry
+        if not self._is_grouped(entry):
+            product_id, quantity = entry
+            self._peg(order_id, {m: per_unit * quantity for m, per_unit in self.bom_lines.get(product_id, [])})
+
+    def _group_demand(self) -> Dict[int, float]:
+        """Ordered quantity per product with sub-assemblies."""
+        demand: Dict[int, float] = {}
+        for product_id, quantity in self.orders.values():
+            if product_id in self.structure.children:
+                demand[product_id] = demand.get(product_id, 0) + quantity
+        return demand
+
+    def _net_group(self, demand: Dict[int, float]) -> Tuple[Dict[int, float], Dict[int, float]]:
+        """Production quantities and material needs of the grouped demand, netted against product stock."""
+        production = self.structure.production_quantities(demand, self.product_stock) if demand else {}
+        needs: Dict[int, float] = {}
+        for p, q in production.items():
+            for material_id, per_unit in self.bom_lines.get(p, []):
+                needs[material_id] = needs.get(material_id, 0.0) + per_unit * q
+        return production, needs
+
+    def _regroup(self):
+        """
+        Nets the orders with sub-assemblies together against product stock and re-pegs
+        them to the materials of the sub-assemblies that still have to be produced.
+        """
+        grouped = {o: e for o, e in self.orders.items() if self._is_grouped(e)}
+        production, needs = self._net_group(self._group_demand())
+        for material_id in set(needs) | set(self.group_needs):
+            if needs.get(material_id) != self.group_needs.get(material_id):
+                self.dirty.add(material_id)
+        self.group_needs = needs
+
+        # Per order: its own explosion, limited to the sub-assemblies produced at all
+        for order_id, (product_id, quantity) in grouped.items():
+            own: Dict[int, float] = {}
+            for p, q in self.structure.production_quantities({product_id: quantity}, {}).items():
+                if p in production:
+                    for material_id, per_unit in self.bom_lines.get(p, []):
+                        own[material_id] = own.get(material_id, 0.0) + per_unit * q
+            self._peg(order_id, own)
+
+    # --- requirements ---
+
+    def _flush(self):
+        """Recalculates dirty materials, saves the pegs of touched orders and re-allocates stock."""
+        if self.dirty or self.touched or self.unallocated or not self.saved:
+            self.version += 1
+        self.unallocated |= self.dirty
+        self._rebuild_dirty()
+        if self.touched or not self.saved:
+            MaterialPeggingRepository.replace_order_pegs({
+                order_id: [MaterialPeg(id=None, material_id=m, order_id=order_id, quantity=self.pegging[m][order_id],
+                                       need_date=self.start_times.get(order_id))
+                           for m in self.order_materials.get(order_id, [])]
+                for order_id in self.touched
+            }, replace_all=not self.saved)
+            self.touched.clear()
+        if self.unallocated or not self.saved:
+            MaterialAllocationRepository.replace_material_allocations(
+                {m: self._allocate(m) for m in self.unallocated}, replace_all=not self.saved)
+            self.unallocated.clear()
+        self.saved = True
+
+    def _allocate(self, material_id: int) -> List[MaterialAllocation]:
+        """
+        Reserves the material's on-hand stock to its orders: higher priority first,
+        then earlier deadline. Orders of products with sub-assemblies reserve for
+        their full (unnetted) explosion.
+        """
+        material = self.materials.get(material_id)
+        pegged = self.pegging.get(material_id, {})
+        if material is None:
+            return []
+        available = max(material.quantity, 0.0)
+        allocations: List[MaterialAllocation] = []
+        for order_id in sorted(pegged, key=lambda o: (self.ranks.get(o, (0, "")), o)):
+            reserved = min(pegged[order_id], available)
+            available -= reserved
+            allocations.append(MaterialAllocation(id=None, material_id=material_id, order_id=order_id,
+                                                  quantity_required=pegged[order_id], quantity_allocated=reserved))
+        return allocations
+
+    def _rebuild_dirty(self):
+        """Recalculates the requirement of every material marked dirty."""
+        from services.mrp_service import MaterialRequirement
+        now = datetime.now()
+        for material_id in self.dirty:
+            pegged = self.pegging.get(material_id)
+            material = self.materials.get(material_id)
+            if not pegged or material is None:
+                self.requirements.pop(material_id, None)
+                continue
+            needed = sum(q for order_id, q in pegged.items() if not self._is_grouped(self.orders[order_id]))
+            needed += self.group_needs.get(material_id, 0.0)
+
+            # Same rule as the full calculation: earliest planned start, now if unplanned orders need it earlier
+            starts = [self.start_times.get(order_id) for order_id in pegged]
+            planned = [s for s in starts if s is not None]
+            earliest = min(planned) if planned else None
+            if earliest is None or (len(planned) < len(starts) and datetime.fromisoformat(earliest) > now):
+                deadline = now.isoformat()
+            else:
+                deadline = earliest
+
+            self.requirements[material_id] = MaterialRequirement(
+                material_id=material_id,
+                material_name=material.name,
+                unit=material.unit,
+                quantity_needed=needed,
+                quantity_in_stock=material.quantity,
+                quantity_difference=needed - material.quantity,
+                deadline=deadline,
+                orders_requiring=sorted(pegged)
+            )
+        self.dirty.clear()
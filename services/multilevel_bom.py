@@ -0,0 +1,104 @@
+"""
+Multi-level bills of materials: products built from sub-assemblies (bom_components)
+that in turn use raw materials (bom). Products are ordered by low-level code (the
+deepest level at which they occur), so requirements can be netted level by level and
+every sub-assembly is exploded once per run, however many parents use it.
+"""
+
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from models.bom import BOMComponent
+
+
+class BOMCycleError(ValueError):
+    """Raised when sub-assembly links form a cycle."""
+
+
+def low_level_codes(components: List[BOMComponent]) -> Dict[int, int]:
+    """
+    Computes the low-level code of every product that appears in a component link
+    (0 = top level). Kahn's algorithm: a product's code is fixed once all its parents are.
+
+    Raises:
+        BOMCycleError: if the links contain a cycle
+    """
+    children: Dict[int, List[int]] = {}
+    parent_count: Dict[int, int] = {}
+    for c in components:
+        children.setdefault(c.parent_product_id, []).append(c.component_product_id)
+        parent_count[c.component_product_id] = parent_count.get(c.component_product_id, 0) + 1
+        parent_count.setdefault(c.parent_product_id, 0)
+
+    levels = {p: 0 for p, count in parent_count.items() if count == 0}
+    available = list(levels)
+    while available:
+        p = available.pop()
+        for c in children.get(p, []):
+            levels[c] = max(levels.get(c, 0), levels[p] + 1)
+            parent_count[c] -= 1
+            if parent_count[c] == 0:
+                available.append(c)
+
+    cyclic = sorted(p for p, count in parent_count.items() if count > 0)
+    if cyclic:
+        raise BOMCycleError(f"BOM components contain a cycle through products {cyclic}")
+    return levels
+
+
+class MultiLevelBOM:
+    """Product structure from sub-assembly links, with memoized explosions."""
+
+    def __init__(self, components: List[BOMComponent]):
+        self.children: Dict[int, List[Tuple[int, float]]] = {}
+        for c in components:
+            self.children.setdefault(c.parent_product_id, []).append((c.component_product_id, c.quantity_needed))
+        self.levels = low_level_codes(components)
+        self._subtrees: Dict[int, FrozenSet[int]] = {}
+
+    def low_level_code(self, product_id: int) -> int:
+        return self.levels.get(product_id, 0)
+
+    def would_create_cycle(self, parent_product_id: int, component_product_id: int) -> bool:
+        """True if linking the component into the parent would close a cycle."""
+        return parent_product_id in self.subtree(component_product_id)
+
+    def subtree(self, product_id: int) -> FrozenSet[int]:
+        """The product and all sub-assemblies below it (memoized)."""
+        result = self._subtrees.get(product_id)
+        if result is None:
+            result = frozenset([product_id]).union(*(self.subtree(c) for c, _ in self.children.get(product_id, [])))
+            self._subtrees[product_id] = result
+        return result
+
+    def production_quantities(self, demand: Dict[int, float], stock: Dict[int, float],
+                              used_stock: Optional[Dict[int, float]] = None) -> Dict[int, float]:
+        """
+        Nets requirements level by level.
+
+        Independent demand (orders) is produced as ordered. Dependent demand of a
+        sub-assembly, summed over all its parents, is first covered from its on-hand
+        stock; only the rest is produced and exploded further down.
+
+        Args:
+            demand: product_id -> quantity ordered
+            stock: product_id -> quantity on hand
+            used_stock: If given, receives product_id -> stock consumed by the netting
+
+        Returns:
+            product_id -> quantity to produce (products with nothing to produce are left out)
+        """
+        dependent: Dict[int, float] = {}
+        production: Dict[int, float] = {}
+        products = set().union(*(self.subtree(p) for p in demand))
+        for product_id in sorted(products, key=lambda p: (self.low_level_code(p), p)):
+            needed = dependent.get(product_id, 0.0)
+            on_hand = stock.get(product_id, 0.0)
+            if used_stock is not None and needed > 0 and on_hand > 0:
+                used_stock[product_id] = used_stock.get(product_id, 0.0) + min(needed, on_hand)
+            quantity = demand.get(product_id, 0.0) + max(needed - on_hand, 0.0)
+            if quantity <= 0:
+                continue
+            production[product_id] = quantity
+            for component_id, per_unit in self.children.get(product_id, []):
+                dependent[component_id] = dependent.get(component_id, 0.0) + quantity * per_unit
+        return production
@@ -0,0 +1,197 @@
+"""
+Monte Carlo robustness simulation of a production plan.
+The plan is replayed many times with random processing times and machine
+breakdowns. Each replay keeps the planned machine sequences: a plan starts at
+the later of its planned start, the end of the previous plan on its machine and
+(for routing operations) the end of the operations of its order that precede it.
+All runs of a chunk are simulated at once as NumPy vectors; chunks are spread
+over a process pool.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import List, Optional
+
+import numpy as np
+
+from models.order import ProductionOrder, ProductionOrderRepository
+from models.production_plan import ProductionPlan
+from services.schedule_metrics import PlanArrays, plan_arrays, order_completion
+
+DISTRIBUTIONS = ("lognormal", "triangular", "uniform")
+
+
+@dataclass
+class RobustnessOptions:
+    """Settings of a robustness simulation."""
+    runs: int = 2000
+    duration_distribution: str = "lognormal"  # one of DISTRIBUTIONS
+    duration_spread: float = 0.15  # relative spread of processing times (std dev / half-width)
+    mtbf_hours: float = 0.0  # mean working hours between machine breakdowns (0 = no breakdowns)
+    mttr_hours: float = 2.0  # mean repair time of a breakdown
+    workers: int = 0  # worker processes (0 = one per CPU)
+    chunk_runs: int = 250  # runs simulated together in one worker call
+    seed: Optional[int] = None
+
+
+@dataclass
+class OrderRisk:
+    """Simulated completion of one order."""
+    order_id: int
+    deadline: str
+    late_probability: float
+    p50_completion: str  # DateTime string in format 'YYYY-MM-DD HH:MM:SS'
+    p90_completion: str
+
+    def __str__(self) -> str:
+        return f"OrderRisk(Order ID: {self.order_id}, Deadline: {self.deadline}, Late: {self.late_probability:.0%}, P50: {self.p50_completion}, P90: {self.p90_completion})"
+
+
+@dataclass
+class ReplayModel:
+    """Plan structure needed to replay it, in planned start order."""
+    order: np.ndarray  # positions (in PlanArrays order) by planned start
+    machine_previous: np.ndarray  # position of the previous plan on the same machine (-1 = none)
+    predecessors: List[List[int]]  # positions of earlier operations of the same order
+    start: np.ndarray  # planned start hours, PlanArrays order
+    span: np.ndarray  # planned end - start (includes non-working time)
+    work: np.ndarray  # processing hours (duration_hours)
+
+
+def build_replay_model(plans: List[ProductionPlan], arrays: PlanArrays) -> ReplayModel:
+    """Derives machine and operation precedences from the plans (sorted like `arrays`)."""
+    by_start = np.lexsort((arrays.machine, arrays.start))
+    machine_previous = np.full(len(plans), -1, dtype=np.int64)
+    last_on_machine = {}
+    for k in by_start:
+        machine_previous[k] = last_on_machine.get(arrays.machine[k], -1)
+        last_on_machine[arrays.machine[k]] = k
+
+    # Routing operations of one order wait for its operations that are planned to end before they start
+    predecessors: List[List[int]] = [[] for _ in plans]
+    for first, last in zip(arrays.segments, np.r_[arrays.segments[1:], len(plans)]):
+        operations = [k for k in range(first, last) if plans[k].operation_id is not None]
+        for k in operations:
+            predecessors[k] = [p for p in operations if p != k and arrays.end[p] <= arrays.start[k]]
+
+    return ReplayModel(
+        order=by_start, machine_previous=machine_previous, predecessors=predecessors,
+        start=arrays.start, span=arrays.end - arrays.start,
+        work=np.array([p.duration_hours for p in plans], dtype=np.float64)
+    )
+
+
+def sample_durations(rng: np.random.Generator, work: np.ndarray, runs: int,
+                     options: RobustnessOptions) -> np.ndarray:
+    """Random processing hours, shape (runs, plans). All distributions have mean `work`."""
+    spread = options.duration_spread
+    shape = (runs, len(work))
+    if options.duration_distribution == "lognormal":
+        sigma = np.sqrt(np.log1p(spread ** 2))
+        factor = rng.lognormal(-sigma ** 2 / 2, sigma, shape)
+    elif options.duration_distribution == "triangular":
+        factor = rng.triangular(1 - spread, 1, 1 + spread, shape)
+    elif options.duration_distribution == "uniform":
+        factor = rng.uniform(1 - spread, 1 + spread, shape)
+    else:
+        raise ValueError(f"Unknown distribution '{options.duration_distribution}', expected one of {DISTRIBUTIONS}")
+    return work * np.maximum(factor, 0.0)
+
+
+def sample_breakdowns(rng: np.random.Generator, work: np.ndarray, runs: int,
+                      options: RobustnessOptions) -> np.ndarray:
+    """Random repair hours hitting each plan, shape (runs, plans)."""
+    if options.mtbf_hours <= 0:
+        return np.zeros((runs, len(work)))
+    failures = rng.poisson(work / options.mtbf_hours, (runs, len(work)))
+    # The sum of n exponential repair times is Gamma(n) distributed
+    return np.where(failures > 0, rng.gamma(np.maximum(failures, 1), options.mttr_hours), 0.0)
+
+
+def replay(model: ReplayModel, duration: np.ndarray, downtime: np.ndarray) -> np.ndarray:
+    """Simulated end hours of every plan, shape (runs, plans). Vectorized over runs."""
+    runs = duration.shape[0]
+    end = np.empty((runs, len(model.start)))
+    # Wall time stretches with the processing time; breakdowns add on top
+    extra = duration - model.work + downtime
+    for k in model.order:
+        start = np.full(runs, model.start[k])
+        previous = model.machine_previous[k]
+        if previous >= 0:
+            np.maximum(start, end[:, previous], out=start)
+        for p in model.predecessors[k]:
+            np.maximum(start, end[:, p], out=start)
+        end[:, k] = start + model.span[k] + extra[:, k]
+    return end
+
+
+def _simulate_chunk(model: ReplayModel, arrays: PlanArrays, runs: int, seed: np.random.SeedSequence,
+                    options: RobustnessOptions) -> np.ndarray:
+    """Worker: order completion hours of `runs` replays, shape (runs, orders)."""
+    rng = np.random.default_rng(seed)
+    duration = sample_durations(rng, model.work, runs, options)
+    downtime = sample_breakdowns(rng, model.work, runs, options)
+    return order_completion(arrays, replay(model, duration, downtime))
+
+
+def simulate_plan(plans: List[ProductionPlan], orders: List[ProductionOrder],
+                  options: Optional[RobustnessOptions] = None) -> List[OrderRisk]:
+    """
+    Replays a plan `options.runs` times with random disturbances.
+
+    Args:
+        plans: Plans to replay (e.g. the current plan)
+        orders: Orders of those plans, for deadlines and priorities
+        options: Distributions, number of runs and workers
+
+    Returns:
+        OrderRisk list, most endangered orders first; a campaign plan yields one
+        entry per member order, scored against that order's deadline
+    """
+    options = options or RobustnessOptions()
+    if options.duration_distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown distribution '{options.duration_distribution}', expected one of {DISTRIBUTIONS}")
+    if not plans or options.runs <= 0:
+        return []
+
+    # Sort by order so plan positions match the array positions
+    plans = sorted(plans, key=lambda p: p.order_id)
+    arrays = plan_arrays(plans, orders)
+    model = build_replay_model(plans, arrays)
+
+    sizes = [min(options.chunk_runs, options.runs - k) for k in range(0, options.runs, options.chunk_runs)]
+    seeds = np.random.SeedSequence(options.seed).spawn(len(sizes))
+    workers = min(len(sizes), options.workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_simulate_chunk, [model] * len(sizes), [arrays] * len(sizes), sizes, seeds,
+                                  [options] * len(sizes)))
+    else:
+        parts = [_simulate_chunk(model, arrays, runs, seed, options) for runs, seed in zip(sizes, seeds)]
+    completion = np.vstack(parts)
+
+    late = (completion > arrays.due).mean(axis=0)
+    p50, p90 = np.percentile(completion, [50, 90], axis=0)
+    deadlines = {o.id: o.deadline for o in orders}
+
+    def timestamp(hours: float) -> str:
+        return (arrays.origin + timedelta(hours=float(hours))).isoformat(sep=' ', timespec='seconds')
+
+    risks = [OrderRisk(
+        order_id=order_id, deadline=deadlines.get(order_id, ""), late_probability=float(late[k]),
+        p50_completion=timestamp(p50[k]), p90_completion=timestamp(p90[k])
+    ) for k, order_id in enumerate(arrays.order_ids)]
+    risks.sort(key=lambda r: (-r.late_probability, r.p90_completion))
+    return risks
+
+
+def current_plan_risks(options: Optional[RobustnessOptions] = None) -> List[OrderRisk]:
+    """Runs the robustness simulation on the current plan (all planned/in_progress plans)."""
+    from services.scheduling_service import SchedulingService
+    plans = SchedulingService.get_current_plan()
+    risks = simulate_plan(plans, ProductionOrderRepository.get_all_orders(), options)
+    at_risk = sum(1 for r in risks if r.late_probability >= 0.1)
+    print(f"Robustness simulation: {at_risk} of {len(risks)} orders late in at least 10% of the runs")
+    return risks
@@ -1,6 +1,9 @@
 from datetime import datetime
 from models.order import ProductionOrderRepository
 from models.machine import MachineRepository
+from models.production_plan import ProductionPlanRepository
+from services.schedule_metrics import plan_metrics
+from services.plan_robustness import current_plan_risks
 from services.mrp_service import MRPService
 
 class ReportsService:
@@ -14,11 +17,17 @@ class ReportsService:
         Returns a list of dicts with report data and a list of columns.
         - Orders: filtered by dates, machine and status.
         - Stock: full MRP result: stock, needed, shortage
+        - Schedule: utilization and idle time of every machine in the current plan
+        - Risk: simulated late probability and P50/P90 completion of every planned order
         """
         if report_type.lower() == "orders":
             return self._get_filtered_orders(start_date, end_date, machine_id, status)
         elif report_type.lower() == "stock":
             return self._get_stock_data()
+        elif report_type.lower() == "schedule":
+            return self._get_schedule_data()
+        elif report_type.lower() == "risk":
+            return self._get_risk_data()
         else:
             return [], []
 
@@ -83,4 +92,41 @@ class ReportsService:
             })
 
         columns = ["Material", "In Stock", "Required", "Difference"]
-        return rows, columns
\ No newline at end of file
+        return rows, columns
+
+    def _get_schedule_data(self):
+        """Returns per-machine quality measures of the current plan:
+        - busy and idle hours within the plan's makespan
+        - utilization in percent
+        """
+        plans = ProductionPlanRepository.get_plans_for_gantt()
+        metrics = plan_metrics(plans, ProductionOrderRepository.get_all_orders())
+        machines = {m.id: m.name for m in MachineRepository.get_all_machines()}
+
+        rows = []
+        for machine_id, share in metrics.utilization.items():
+            rows.append({
+                "machine": machines.get(machine_id, f"M{machine_id}"),
+                "busy": round(metrics.makespan_hours - metrics.idle_hours[machine_id], 2),
+                "idle": round(metrics.idle_hours[machine_id], 2),
+                "utilization": round(share * 100, 1),
+            })
+
+        columns = ["Machine", "Busy (h)", "Idle (h)", "Utilization (%)"]
+        return rows, columns
+
+    def _get_risk_data(self):
+        """Returns deadline risk of planned orders from a Monte Carlo replay of the current plan,
+        most endangered orders first."""
+        rows = []
+        for risk in current_plan_risks():
+            rows.append({
+                "order_id": risk.order_id,
+                "deadline": risk.deadline,
+                "late_probability": round(risk.late_probability * 100, 1),
+                "p50": risk.p50_completion,
+                "p90": risk.p90_completion,
+            })
+
+        columns = ["Order Id", "Deadline", "Late probability (%)", "P50 completion", "P90 completion"]
+        return rows, columns
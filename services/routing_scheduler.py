@@ -0,0 +1,198 @@
+"""
+List scheduler for multi-operation routings.
+Operations of every order form a DAG (topologically ordered per product). An event
+loop releases an operation once all its predecessors are finished and each machine
+works off its own heap of ready operations, most urgent order first.
+Times are expressed in hours relative to a schedule origin.
+"""
+
+import heapq
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from models.routing import RoutingOperation, OperationRecipe, OperationPrecedence
+from services.working_calendar import WorkingTimeIndex
+
+
+@dataclass
+class Routing:
+    """Operations of one product in topological order, with their machines."""
+    operations: List[int]  # operation ids, every predecessor before its successors
+    successors: List[List[int]]  # positions of the operations that wait for position k
+    predecessor_count: List[int]
+    capacities: List[Dict[int, float]]  # machine_id -> units per hour, per position
+
+
+@dataclass
+class RoutedJob:
+    """One order that follows a routing."""
+    order_id: int
+    product_id: int
+    quantity: float
+    due: float  # deadline in hours from the schedule origin
+    weight: float  # tardiness weight (higher = more important)
+    release: float = 0.0  # earliest start of its first operations
+
+
+@dataclass
+class OperationSlot:
+    """Scheduled operation of an order."""
+    order_id: int
+    operation_id: int
+    machine_id: int
+    start: float
+    end: float
+    hours: float  # processing time (end - start also contains non-working time)
+
+
+def build_routings(operations: List[RoutingOperation], recipes: List[OperationRecipe],
+                   precedences: List[OperationPrecedence]) -> Dict[int, Routing]:
+    """
+    Compiles routing tables into one Routing per product (Kahn's algorithm).
+    Products whose operations have no precedences run them in step order.
+    Products with a cyclic routing or an operation without machines are skipped with a warning.
+    """
+    by_product: Dict[int, List[RoutingOperation]] = {}
+    for operation in operations:
+        by_product.setdefault(operation.product_id, []).append(operation)
+    capacities: Dict[int, Dict[int, float]] = {}
+    for recipe in recipes:
+        capacities.setdefault(recipe.operation_id, {})[recipe.machine_id] = recipe.production_capacity
+    predecessors: Dict[int, List[int]] = {}
+    for precedence in precedences:
+        predecessors.setdefault(precedence.operation_id, []).append(precedence.predecessor_id)
+
+    routings: Dict[int, Routing] = {}
+    for product_id, product_operations in by_product.items():
+        product_operations.sort(key=lambda o: o.sequence)
+        ids = [o.id for o in product_operations]
+        if any(o in predecessors for o in ids):
+            edges = {o: [p for p in predecessors.get(o, []) if p in ids] for o in ids}
+        else:
+            # Plain ordered routing: every step waits for the previous one
+            edges = {o: ([ids[k - 1]] if k else []) for k, o in enumerate(ids)}
+
+        missing = [o for o in ids if not capacities.get(o)]
+        if missing:
+            print(f"Warning: Routing of product {product_id} has operations without machines {missing} - skipped")
+            continue
+
+        # Kahn: repeatedly take operations whose predecessors are all placed, lowest step first
+        waiting = {o: len(edges[o]) for o in ids}
+        followers: Dict[int, List[int]] = {o: [] for o in ids}
+        for o in ids:
+            for p in edges[o]:
+                followers[p].append(o)
+        step = {o.id: o.sequence for o in product_operations}
+        available = [(step[o], o) for o in ids if waiting[o] == 0]
+        heapq.heapify(available)
+        order = []
+        while available:
+            _, o = heapq.heappop(available)
+            order.append(o)
+            for f in followers[o]:
+                waiting[f] -= 1
+                if waiting[f] == 0:
+                    heapq.heappush(available, (step[f], f))
+        if len(order) < len(ids):
+            print(f"Warning: Routing of product {product_id} contains a cycle - skipped")
+            continue
+
+        position = {o: k for k, o in enumerate(order)}
+        routings[product_id] = Routing(
+            operations=order,
+            successors=[[position[f] for f in followers[o]] for o in order],
+            predecessor_count=[len(edges[o]) for o in order],
+            capacities=[capacities[o] for o in order]
+        )
+    return routings
+
+
+def schedule_routings(jobs: List[RoutedJob], routings: Dict[int, Routing],
+                      ready: Optional[Dict[int, float]] = None,
+                      calendars: Optional[Dict[int, WorkingTimeIndex]] = None) -> List[OperationSlot]:
+    """
+    Schedules all operations of all jobs, respecting precedences.
+
+    Event loop over time: when an operation becomes ready it is queued on the capable
+    machine expected to finish it first; when a machine becomes free it starts the
+    queued operation of the most urgent order (earliest due, then highest weight).
+
+    Args:
+        jobs: Orders to schedule (their product must have a routing)
+        routings: Product routings from build_routings
+        ready: Hours at which busy machines become free
+        calendars: Working-time indexes of machines that do not run 24/7
+
+    Returns:
+        OperationSlot list in start order per machine
+    """
+    ready = ready or {}
+    calendars = calendars or {}
+    free_at: Dict[int, float] = {}
+    load: Dict[int, float] = {}  # when a machine is expected to clear its queue
+    queues: Dict[int, List[tuple]] = {}
+    idle: Dict[int, bool] = {}
+
+    # Event heap: (time, kind, seq, payload); at equal times all ready events (kind 0)
+    # are queued before machines pick their next operation (kind 1)
+    events: List[tuple] = []
+    seq = 0
+
+    pending: List[List[int]] = []
+    earliest: List[List[float]] = []
+    urgency = [(job.due, -job.weight, j) for j, job in enumerate(jobs)]
+    for j, job in enumerate(jobs):
+        routing = routings[job.product_id]
+        pending.append(list(routing.predecessor_count))
+        earliest.append([job.release] * len(routing.operations))
+        for k, count in enumerate(routing.predecessor_count):
+            if count == 0:
+                events.append((job.release, 0, seq, (j, k)))
+                seq += 1
+    heapq.heapify(events)
+
+    slots: List[OperationSlot] = []
+    while events:
+        t, kind, _, payload = heapq.heappop(events)
+        if kind == 0:
+            j, k = payload
+            job = jobs[j]
+            capacities = routings[job.product_id].capacities[k]
+            machine_id = min(capacities, key=lambda m: (
+                max(load.get(m, ready.get(m, 0.0)), t) + job.quantity / capacities[m], m
+            ))
+            load[machine_id] = max(load.get(machine_id, ready.get(machine_id, 0.0)), t) + job.quantity / capacities[machine_id]
+            heapq.heappush(queues.setdefault(machine_id, []), (urgency[j], k))
+            if idle.get(machine_id, True):
+                idle[machine_id] = False
+                heapq.heappush(events, (max(t, free_at.get(machine_id, ready.get(machine_id, 0.0))), 1, seq, machine_id))
+                seq += 1
+        else:
+            machine_id = payload
+            queue = queues[machine_id]
+            if not queue:
+                idle[machine_id] = True
+                free_at[machine_id] = t
+                continue
+            (_, _, j), k = heapq.heappop(queue)
+            job = jobs[j]
+            routing = routings[job.product_id]
+            hours = job.quantity / routing.capacities[k][machine_id]
+            calendar = calendars.get(machine_id)
+            if calendar is None:
+                start, end = t, t + hours
+            else:
+                start = calendar.next_working_time(t)
+                end = calendar.add_working_hours(start, hours)
+            slots.append(OperationSlot(job.order_id, routing.operations[k], machine_id, start, end, hours))
+            heapq.heappush(events, (end, 1, seq, machine_id))
+            seq += 1
+
+            for f in routing.successors[k]:
+                pending[j][f] -= 1
+                earliest[j][f] = max(earliest[j][f], end)
+                if pending[j][f] == 0:
+                    heapq.heappush(events, (earliest[j][f], 0, seq, (j, f)))
+                    seq += 1
+    return slots
@@ -0,0 +1,70 @@
+"""
+Decomposition of a scheduling problem into independent machine/product clusters.
+Products that share no machine (via machine recipes) never compete for capacity,
+so each connected component of the machine-product graph can be scheduled alone.
+"""
+
+from typing import Dict, List, Tuple
+
+from services.schedule_problem import ScheduleProblem
+
+
+def find_clusters(problem: ScheduleProblem) -> List[List[int]]:
+    """
+    Groups jobs into connected components of the machine graph (union-find).
+
+    Returns:
+        Job index lists, ordered by the smallest machine id of each cluster
+    """
+    parent: Dict[int, int] = {}
+
+    def find(m: int) -> int:
+        root = m
+        while parent[root] != root:
+            root = parent[root]
+        while parent[m] != root:  # path compression
+            parent[m], m = root, parent[m]
+        return root
+
+    for job in problem.jobs:
+        machines = list(job.durations)
+        for m in machines:
+            parent.setdefault(m, m)
+        first = find(machines[0])
+        for m in machines[1:]:
+            root = find(m)
+            if root != first:
+                # Smaller id becomes the root, so cluster order is deterministic
+                first, root = min(first, root), max(first, root)
+                parent[root] = first
+
+    clusters: Dict[int, List[int]] = {}
+    for j, job in enumerate(problem.jobs):
+        clusters.setdefault(find(next(iter(job.durations))), []).append(j)
+    return [clusters[root] for root in sorted(clusters)]
+
+
+def subproblem(problem: ScheduleProblem, job_indices: List[int],
+               sequences: Dict[int, List[int]]) -> Tuple[ScheduleProblem, Dict[int, List[int]]]:
+    """
+    Extracts the given jobs as a standalone problem.
+    Job indices in the returned sequences are local (position in job_indices);
+    jobs of the sequences that are not in job_indices are left out.
+    """
+    local = {j: i for i, j in enumerate(job_indices)}
+    machines = set()
+    for j in job_indices:
+        machines.update(problem.jobs[j].durations)
+
+    sub = ScheduleProblem(
+        jobs=[problem.jobs[j] for j in job_indices],
+        ready={m: t for m, t in problem.ready.items() if m in machines},
+        makespan_weight=problem.makespan_weight,
+        calendars={m: c for m, c in problem.calendars.items() if m in machines},
+        setups=problem.setups
+    )
+    sub_sequences = {
+        m: [local[j] for j in sequence if j in local]
+        for m, sequence in sequences.items() if m in machines
+    }
+    return sub, sub_sequences
@@ -0,0 +1,171 @@
+"""
+Schedule quality metrics computed with NumPy over production plans.
+Plans are converted to flat arrays once; scoring a schedule (or a batch of
+candidate schedules with different times) is then pure array arithmetic.
+Times are expressed in hours relative to the earliest planned start.
+A campaign plan (one plan producing several orders) completes every member order,
+each scored against its own deadline.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from models.order import ProductionOrder
+from models.production_plan import ProductionPlan
+from models.campaign import CampaignRepository
+from services.schedule_problem import PRIORITY_WEIGHTS
+
+
+@dataclass
+class PlanArrays:
+    """Production plans as arrays. Plans are sorted by the order they belong to (a campaign's lead
+    order), so per-order values are segment reductions mapped to the orders they complete."""
+    origin: datetime
+    start: np.ndarray  # hours, per plan
+    end: np.ndarray  # hours, per plan
+    machine: np.ndarray  # machine index, per plan
+    order: np.ndarray  # segment index, per plan
+    machine_ids: List[int]
+    order_ids: List[int]  # scored orders (campaign members included)
+    due: np.ndarray  # hours, per scored order
+    weight: np.ndarray  # tardiness weight, per scored order
+    segments: np.ndarray  # first plan of every segment
+    order_segment: np.ndarray  # segment that completes each scored order
+
+
+@dataclass
+class ScheduleMetrics:
+    """Quality measures of one schedule."""
+    makespan_hours: float
+    total_tardiness_hours: float
+    weighted_tardiness: float
+    late_orders: int
+    utilization: Dict[int, float] = field(default_factory=dict)  # machine_id -> busy share of the makespan
+    idle_hours: Dict[int, float] = field(default_factory=dict)  # machine_id -> hours without work within the makespan
+    wip_times: List[float] = field(default_factory=list)  # hours at which work in progress changes
+    wip_levels: List[int] = field(default_factory=list)  # orders started but not finished from that time on
+
+    @property
+    def average_utilization(self) -> float:
+        if not self.utilization:
+            return 0.0
+        return sum(self.utilization.values()) / len(self.utilization)
+
+
+def campaign_members_of(plans: List[ProductionPlan]) -> Dict[int, List[int]]:
+    """campaign_id -> member order IDs, loaded only when some plan produces a campaign."""
+    if not any(p.campaign_id for p in plans):
+        return {}
+    return CampaignRepository.get_campaign_members()
+
+
+def plan_arrays(plans: List[ProductionPlan], orders: List[ProductionOrder],
+                origin: Optional[datetime] = None,
+                campaign_members: Optional[Dict[int, List[int]]] = None) -> PlanArrays:
+    """
+    Converts plans and their orders into arrays.
+
+    Args:
+        plans: Plans to score (several plans per order are allowed: lots, operations)
+        orders: Orders of those plans (campaign members included), for deadlines and priorities
+        origin: Time zero (default: earliest planned start)
+        campaign_members: campaign_id -> member order IDs (default: loaded from the database)
+    """
+    starts = [datetime.fromisoformat(p.planned_start_time) for p in plans]
+    ends = [datetime.fromisoformat(p.planned_end_time) for p in plans]
+    origin = origin or (min(starts) if starts else datetime.now())
+    if campaign_members is None:
+        campaign_members = campaign_members_of(plans)
+
+    order_by_id = {o.id: o for o in orders}
+    segment_ids = sorted({p.order_id for p in plans})
+    segment_index = {order_id: k for k, order_id in enumerate(segment_ids)}
+    # A campaign plan completes all member orders of its campaign
+    members = {p.order_id: campaign_members[p.campaign_id] for p in plans
+               if p.campaign_id and campaign_members.get(p.campaign_id)}
+    order_ids = [order_id for segment_id in segment_ids for order_id in members.get(segment_id, [segment_id])]
+    order_segment = np.array([segment_index[segment_id] for segment_id in segment_ids
+                              for _ in members.get(segment_id, [segment_id])], dtype=np.int64)
+    machine_ids = sorted({p.machine_id for p in plans})
+    machine_index = {machine_id: k for k, machine_id in enumerate(machine_ids)}
+
+    start = np.array([(s - origin).total_seconds() / 3600 for s in starts], dtype=np.float64)
+    end = np.array([(e - origin).total_seconds() / 3600 for e in ends], dtype=np.float64)
+    order = np.array([segment_index[p.order_id] for p in plans], dtype=np.int64)
+    machine = np.array([machine_index[p.machine_id] for p in plans], dtype=np.int64)
+
+    due = np.full(len(order_ids), np.inf)
+    weight = np.ones(len(order_ids))
+    for k, order_id in enumerate(order_ids):
+        o = order_by_id.get(order_id)
+        if o is not None:
+            # Deadline means "by the end of that day"
+            deadline = datetime.fromisoformat(o.deadline) + timedelta(days=1)
+            due[k] = (deadline - origin).total_seconds() / 3600
+            weight[k] = PRIORITY_WEIGHTS.get(o.priority, 1.0)
+
+    sort = np.argsort(order, kind="stable")
+    order = order[sort]
+    segments = np.flatnonzero(np.r_[True, order[1:] != order[:-1]]) if len(order) else np.zeros(0, dtype=np.int64)
+    return PlanArrays(
+        origin=origin, start=start[sort], end=end[sort], machine=machine[sort], order=order,
+        machine_ids=machine_ids, order_ids=order_ids, due=due, weight=weight, segments=segments,
+        order_segment=order_segment
+    )
+
+
+def order_completion(arrays: PlanArrays, end: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Completion hour of every scored order (the last end of the plans producing it).
+    `end` may be a (candidates x plans) matrix to evaluate many schedules at once.
+    """
+    end = arrays.end if end is None else end
+    return np.maximum.reduceat(end, arrays.segments, axis=-1)[..., arrays.order_segment]
+
+
+def weighted_tardiness(arrays: PlanArrays, end: Optional[np.ndarray] = None) -> np.ndarray:
+    """Weighted tardiness of one schedule, or of every row of a (candidates x plans) end matrix."""
+    lateness = np.maximum(order_completion(arrays, end) - arrays.due, 0.0)
+    return lateness @ arrays.weight
+
+
+def compute_metrics(arrays: PlanArrays) -> ScheduleMetrics:
+    """Computes all quality measures of the schedule described by the arrays."""
+    if len(arrays.start) == 0:
+        return ScheduleMetrics(0.0, 0.0, 0.0, 0)
+
+    horizon_start = arrays.start.min()
+    makespan = float(arrays.end.max() - horizon_start)
+    completion = order_completion(arrays)
+    lateness = np.maximum(completion - arrays.due, 0.0)
+
+    busy = np.bincount(arrays.machine, weights=arrays.end - arrays.start, minlength=len(arrays.machine_ids))
+    share = busy / makespan if makespan > 0 else np.zeros_like(busy)
+
+    # WIP: +1 when an order's first plan starts, -1 when its last plan ends
+    first_start = np.minimum.reduceat(arrays.start, arrays.segments)[arrays.order_segment]
+    times = np.concatenate([first_start, completion])
+    steps = np.concatenate([np.ones(len(first_start), dtype=np.int64), -np.ones(len(completion), dtype=np.int64)])
+    sort = np.lexsort((steps, times))  # finishes before starts at the same instant
+    times, levels = times[sort], np.cumsum(steps[sort])
+    last = np.r_[times[1:] != times[:-1], True]  # keep the level after all changes at one time
+
+    return ScheduleMetrics(
+        makespan_hours=makespan,
+        total_tardiness_hours=float(lateness.sum()),
+        weighted_tardiness=float(lateness @ arrays.weight),
+        late_orders=int((lateness > 1e-9).sum()),
+        utilization={m: float(u) for m, u in zip(arrays.machine_ids, share)},
+        idle_hours={m: float(makespan - b) for m, b in zip(arrays.machine_ids, busy)},
+        wip_times=times[last].tolist(),
+        wip_levels=levels[last].tolist()
+    )
+
+
+def plan_metrics(plans: List[ProductionPlan], orders: List[ProductionOrder],
+                 campaign_members: Optional[Dict[int, List[int]]] = None) -> ScheduleMetrics:
+    """Shortcut: metrics of a list of plans."""
+    return compute_metrics(plan_arrays(plans, orders, campaign_members=campaign_members))
@@ -0,0 +1,171 @@
+"""
+Local-search optimizer for production schedules.
+Improves a greedy schedule with simulated annealing over machine assignment and
+sequence. Independent restarts run in parallel, one per CPU core.
+"""
+
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from services.schedule_problem import ScheduleProblem
+
+
+@dataclass
+class OptimizationResult:
+    """Best schedule found by the optimizer compared with the greedy baseline."""
+    sequences: Dict[int, List[int]]  # machine_id -> job indices in processing order
+    cost: float
+    baseline_cost: float
+    run_costs: List[float]  # best cost of every restart
+
+    @property
+    def improvement(self) -> float:
+        """Relative improvement over the baseline in percent."""
+        if self.baseline_cost <= 0:
+            return 0.0
+        return (self.baseline_cost - self.cost) / self.baseline_cost * 100
+
+
+def _total(per_machine: Dict[int, Tuple[float, float]], makespan_weight: float) -> float:
+    """Sums per-machine (tardiness, end) pairs into the objective value."""
+    tardiness = sum(t for t, _ in per_machine.values())
+    makespan = max((end for _, end in per_machine.values()), default=0.0)
+    return tardiness + makespan_weight * makespan
+
+
+def _anneal(problem: ScheduleProblem, initial: Dict[int, List[int]], deadline: float,
+            seed: int, perturb: bool) -> Tuple[Dict[int, List[int]], float]:
+    """
+    One simulated annealing run until the wall-clock deadline (time.time()).
+    A move takes one job out of its machine and inserts it at a random position
+    on any machine able to process it (same machine = resequencing).
+    """
+    rng = random.Random(seed)
+    sequences = {m: list(initial.get(m, [])) for m in problem.machines()}
+    location = {j: m for m, seq in sequences.items() for j in seq}
+    jobs = list(location)
+    if not jobs:
+        return sequences, problem.cost(sequences)
+
+    def random_move():
+        j = rng.choice(jobs)
+        src = location[j]
+        dst = rng.choice(list(problem.jobs[j].durations))
+        src_pos = sequences[src].index(j)
+        sequences[src].pop(src_pos)
+        dst_pos = rng.randint(0, len(sequences[dst]))
+        sequences[dst].insert(dst_pos, j)
+        location[j] = dst
+        return j, src, src_pos, dst, dst_pos
+
+    def undo(move):
+        j, src, src_pos, dst, dst_pos = move
+        sequences[dst].pop(dst_pos)
+        sequences[src].insert(src_pos, j)
+        location[j] = src
+
+    # Restarts other than the first start from a shuffled copy of the greedy plan
+    if perturb:
+        for _ in range(len(jobs)):
+            random_move()
+
+    per_machine = {m: problem.machine_cost(m, seq) for m, seq in sequences.items()}
+    current = _total(per_machine, problem.makespan_weight)
+    best, best_sequences = current, {m: list(seq) for m, seq in sequences.items()}
+
+    # Initial temperature from the average uphill step of a few random moves
+    deltas = []
+    for _ in range(min(50, 5 * len(jobs))):
+        move = random_move()
+        trial = dict(per_machine)
+        for m in {move[1], move[3]}:
+            trial[m] = problem.machine_cost(m, sequences[m])
+        deltas.append(abs(_total(trial, problem.makespan_weight) - current))
+        undo(move)
+    t_start = max(sum(deltas) / len(deltas), 1e-6)
+    t_end = t_start * 1e-3
+
+    started = time.time()
+    span = max(deadline - started, 1e-6)
+    temperature = t_start
+    iteration = 0
+    while True:
+        if iteration % 64 == 0:
+            now = time.time()
+            if now >= deadline:
+                break
+            temperature = t_start * (t_end / t_start) ** ((now - started) / span)
+        iteration += 1
+
+        move = random_move()
+        touched = {move[1], move[3]}
+        previous = {m: per_machine[m] for m in touched}
+        for m in touched:
+            per_machine[m] = problem.machine_cost(m, sequences[m])
+        candidate = _total(per_machine, problem.makespan_weight)
+        delta = candidate - current
+
+        if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+            current = candidate
+            if current < best - 1e-9:
+                best = current
+                best_sequences = {m: list(seq) for m, seq in sequences.items()}
+        else:
+            undo(move)
+            per_machine.update(previous)
+
+    return best_sequences, best
+
+
+def optimize_schedule(problem: ScheduleProblem, initial: Dict[int, List[int]],
+                      time_budget_seconds: float = 5.0, restarts: int = 0,
+                      seed: int = 0) -> OptimizationResult:
+    """
+    Runs independent annealing restarts in a process pool and keeps the best.
+
+    Args:
+        problem: Jobs and machine availability
+        initial: Greedy sequences (machine_id -> job indices) used as the baseline
+        time_budget_seconds: Wall-clock budget for the whole optimization
+        restarts: Number of independent runs (0 = one per CPU core)
+        seed: Base random seed, run i uses seed + i
+
+    Returns:
+        OptimizationResult with the best sequences (never worse than the baseline)
+    """
+    baseline = problem.cost(initial)
+    runs = restarts or os.cpu_count() or 1
+    started = time.time()
+
+    if runs == 1:
+        results = [_anneal(problem, initial, started + time_budget_seconds, seed, False)]
+    else:
+        # More runs than cores: run them in waves, each wave with its own slice of the budget
+        workers = min(runs, os.cpu_count() or 1)
+        waves = -(-runs // workers)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = []
+            for wave in range(waves):
+                deadline = started + time_budget_seconds * (wave + 1) / waves
+                futures = [pool.submit(_anneal, problem, initial, deadline, seed + i, i > 0)
+                           for i in range(wave * workers, min((wave + 1) * workers, runs))]
+                results.extend(f.result() for f in futures)
+
+    best_sequences, best_cost = initial, baseline
+    for i, (sequences, cost) in enumerate(results):
+        gain = (baseline - cost) / baseline * 100 if baseline > 0 else 0.0
+        print(f"   Optimizer run {i + 1}/{runs}: cost {cost:.2f} vs greedy {baseline:.2f} ({gain:+.1f}%)")
+        if cost < best_cost - 1e-9:
+            best_sequences, best_cost = sequences, cost
+
+    return OptimizationResult(
+        sequences=best_sequences,
+        cost=best_cost,
+        baseline_cost=baseline,
+        run_costs=[cost for _, cost in results]
+    )
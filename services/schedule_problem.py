@@ -0,0 +1,103 @@
+"""
+In-memory scheduling model shared by the greedy scheduler and the optimizers.
+Times are expressed in hours relative to a schedule origin (usually "now").
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from services.changeover_matrix import ChangeoverMatrix
+from services.working_calendar import WorkingTimeIndex
+
+
+# Tardiness weight per order priority (1=High, 2=Medium, 3=Low)
+PRIORITY_WEIGHTS = {1: 3.0, 2: 2.0, 3: 1.0}
+
+
+@dataclass
+class ScheduleJob:
+    """One order to schedule, with its processing time on every capable machine."""
+    order_id: int
+    weight: float  # tardiness weight (higher = more important)
+    due: float  # deadline in hours from the schedule origin
+    durations: Dict[int, float]  # machine_id -> processing time in hours
+    product_id: int = 0  # used for sequence-dependent setup times
+    release: float = 0.0  # earliest start in hours (e.g. when its materials are available)
+
+
+@dataclass
+class ScheduleProblem:
+    """Jobs plus machine availability. Sequences map machine_id -> list of job indices."""
+    jobs: List[ScheduleJob]
+    ready: Dict[int, float] = field(default_factory=dict)  # machine_id -> hours when machine is free
+    makespan_weight: float = 1.0
+    calendars: Dict[int, WorkingTimeIndex] = field(default_factory=dict)  # machines without one run 24/7
+    setups: Optional[ChangeoverMatrix] = None  # sequence-dependent setup times
+
+    def machines(self) -> List[int]:
+        """Returns all machines that can process at least one job."""
+        machine_ids = set()
+        for job in self.jobs:
+            machine_ids.update(job.durations)
+        return sorted(machine_ids)
+
+    def setup_hours(self, machine_id: int, previous: Optional[int], j: int) -> float:
+        """Changeover time before job j when the machine last ran job `previous`."""
+        if self.setups is None or previous is None:
+            return 0.0
+        return self.setups.hours(machine_id, self.jobs[previous].product_id, self.jobs[j].product_id)
+
+    def place(self, machine_id: int, t: float, j: int, previous: Optional[int] = None) -> Tuple[float, float]:
+        """Returns (start, end) of job j, including its setup, on a machine that becomes free at t."""
+        t = max(t, self.jobs[j].release)
+        duration = self.setup_hours(machine_id, previous, j) + self.jobs[j].durations[machine_id]
+        calendar = self.calendars.get(machine_id)
+        if calendar is None:
+            return t, t + duration
+        start = calendar.next_working_time(t)
+        return start, calendar.add_working_hours(start, duration)
+
+    def timeline(self, machine_id: int, sequence: List[int]) -> List[Tuple[float, float]]:
+        """Returns (start, end) hours for every job in the sequence, back to back."""
+        t = self.ready.get(machine_id, 0.0)
+        times = []
+        previous = None
+        for j in sequence:
+            start, t = self.place(machine_id, t, j, previous)
+            times.append((start, t))
+            previous = j
+        return times
+
+    def machine_cost(self, machine_id: int, sequence: List[int]) -> Tuple[float, float]:
+        """Returns (weighted tardiness, completion time of the last job) for one machine."""
+        tardiness = 0.0
+        t = self.ready.get(machine_id, 0.0)
+        previous = None
+        for j in sequence:
+            job = self.jobs[j]
+            _, t = self.place(machine_id, t, j, previous)
+            if t > job.due:
+                tardiness += job.weight * (t - job.due)
+            previous = j
+        return tardiness, t
+
+    def cost(self, sequences: Dict[int, List[int]]) -> float:
+        """Objective: total weighted tardiness + makespan_weight * makespan."""
+        tardiness = 0.0
+        makespan = 0.0
+        for machine_id, sequence in sequences.items():
+            if not sequence:
+                continue
+            machine_tardiness, end = self.machine_cost(machine_id, sequence)
+            tardiness += machine_tardiness
+            makespan = max(makespan, end)
+        return tardiness + self.makespan_weight * makespan
+
+    def setup_total(self, sequences: Dict[int, List[int]]) -> float:
+        """Total setup hours over all machines."""
+        if self.setups is None:
+            return 0.0
+        return sum(
+            self.setups.sequence_hours(machine_id, [self.jobs[j].product_id for j in sequence])
+            for machine_id, sequence in sequences.items()
+        )
@@ -3,24 +3,334 @@ Production scheduling service that generates production plans from pending order
 Assigns orders to machines based on availability, priority, and deadlines.
 """
 
+import hashlib
+import os
+import time
+from bisect import insort
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, replace
 from datetime import datetime, timedelta
 from typing import List, Dict
+from models import database
 from models.order import ProductionOrderRepository
-from models.machine import MachineRecipeRepository
+from models.machine import MachineRecipeRepository, MachineRepository
+from models.material import MaterialRepository
+from models.material_receipt import MaterialReceiptRepository
+from models.bom import BOMRepository
+from models.routing import RoutingRepository
+from models.campaign import CampaignRepository
 from models.production_plan import ProductionPlan, ProductionPlanRepository
+from models.calendar import MachineDowntime, CalendarRepository
+from models.changeover import ChangeoverRepository
+from services.changeover_matrix import ChangeoverMatrix
+from services.schedule_problem import ScheduleJob, ScheduleProblem, PRIORITY_WEIGHTS
+from services.schedule_optimizer import optimize_schedule
+from services.schedule_clusters import find_clusters, subproblem
+from services.working_calendar import WorkingTimeIndex, compile_calendar
+from services.material_timeline import MaterialTimeline
+from services.routing_scheduler import RoutedJob, build_routings, schedule_routings
+from services.campaign_service import CampaignService
+from services.schedule_metrics import plan_metrics
+
+# Above this many plans the per-order schedule log is truncated
+LOG_LIMIT = 100
+
+# Lots smaller than this share of their order are folded into the other lots
+MIN_LOT_SHARE = 0.05
+
+
+@dataclass
+class SchedulingOptions:
+    """Scheduler settings. The defaults reproduce the plain greedy plan."""
+    optimize: bool = False  # run the local-search optimizer after the greedy pass
+    time_budget_seconds: float = 5.0  # wall-clock budget for the optimizer
+    restarts: int = 0  # independent optimizer runs (0 = one per CPU core)
+    makespan_weight: float = 1.0  # weight of makespan vs. weighted tardiness
+    exact: bool = False  # solve small instances optimally with branch-and-bound
+    exact_max_orders: int = 12  # larger instances fall back to the heuristic (13-15 orders already take 5-35 s)
+    exact_time_limit_seconds: float = 30.0  # time cap for branch-and-bound
+    calendar_horizon_days: int = 366  # machine calendars are compiled this far ahead
+    group_setups: bool = False  # run same-product orders back to back to cut setup time
+    group_window_days: float = 7.0  # only pull orders forward whose deadline is this close
+    lot_split_min_quantity: int = 0  # split orders of at least this quantity into lots (0 = off)
+    max_lots: int = 4  # upper limit of lots (and parallel machines) per order
+    parallel_clusters: bool = False  # schedule independent machine/product clusters in parallel
+    max_workers: int = 0  # worker processes for clusters (0 = one per CPU core)
+    material_constrained: bool = False  # start orders only once their BOM materials are (projected to be) in stock
+    campaign_tolerance_days: float = 0.0  # batch queued same-product orders whose deadlines are this close (0 = off)
+    campaign_max_quantity: int = 0  # upper limit of a campaign's quantity (0 = unlimited)
+    use_cache: bool = True  # return the previous plan when no scheduling input changed
+    frozen_hours: float = 8.0  # rolling horizon: plans starting this soon are kept as they are
+    lookahead_hours: float = 72.0  # rolling horizon: orders due within this window after the frozen zone are optimized
+
+
+@dataclass
+class ExactResult:
+    """Outcome of the branch-and-bound solver."""
+    sequences: Dict[int, List[int]]  # machine_id -> job indices in processing order
+    cost: float
+    nodes: int  # search nodes expanded
+    seconds: float
+    optimal: bool  # False when the time limit stopped the search early
+
+
+def branch_and_bound(problem: ScheduleProblem, initial: Dict[int, List[int]],
+                     time_limit_seconds: float = 10.0) -> ExactResult:
+    """
+    Exact solver for small instances (assignment + sequence).
+    
+    A node appends one unscheduled job to the end of one capable machine. Nodes are
+    pruned when their lower bound (each remaining job finishing at its earliest possible
+    time) cannot beat the incumbent, or when another partial schedule with the same job
+    set is at least as good on every machine end time, tardiness and makespan.
+    
+    Args:
+        problem: Jobs and machine availability
+        initial: Heuristic sequences used as the first upper bound
+        time_limit_seconds: Search stops after this and returns the incumbent
+    
+    Returns:
+        ExactResult; optimal is False when the time limit stopped the search, then the
+        sequences are only the best schedule found so far, not proven optimal
+    """
+    machines = problem.machines()
+    index = {m: i for i, m in enumerate(machines)}
+    jobs = problem.jobs
+    n = len(jobs)
+    full = (1 << n) - 1
+    choices = [[(index[m], p) for m, p in job.durations.items()] for job in jobs]
+    weight = problem.makespan_weight
+    
+    best = {"cost": problem.cost(initial), "sequences": {m: list(seq) for m, seq in initial.items()}}
+    
+    # A tight first incumbent prunes far more: earliest-due-date list schedule,
+    # every job on the machine where it finishes first
+    edd: Dict[int, List[int]] = {}
+    free = dict(problem.ready)
+    for j in sorted(range(n), key=lambda k: (jobs[k].due, -jobs[k].weight)):
+        m = min(jobs[j].durations, key=lambda k: free.get(k, 0.0) + jobs[j].durations[k])
+        free[m] = free.get(m, 0.0) + jobs[j].durations[m]
+        edd.setdefault(m, []).append(j)
+    if problem.cost(edd) < best["cost"]:
+        best = {"cost": problem.cost(edd), "sequences": edd}
+    
+    memo: Dict[object, List[tuple]] = {}  # job mask -> non-dominated (tardiness, makespan, *ends)
+    partial = [[] for _ in machines]
+    stats = {"nodes": 0, "timed_out": False}
+    started = time.time()
+    
+    inf = float("inf")
+    # Processing time per job and machine index (inf = machine cannot make it)
+    durations = [[inf] * len(machines) for _ in jobs]
+    for j, options in enumerate(choices):
+        for i, p in options:
+            durations[j][i] = p
+    shortest = [min(p for _, p in options) for options in choices]
+    
+    def dominated(mask, state):
+        # With setup times the future also depends on what each machine ran last
+        key = (mask, tuple(jobs[seq[-1]].product_id if seq else None for seq in partial)) if problem.setups else mask
+        entries = memo.setdefault(key, [])
+        for other in entries:
+            if all(o <= s + 1e-9 for o, s in zip(other, state)):
+                return True
+        entries.append(state)
+        return False
+    
+    def search(mask, ends, tardiness, makespan):
+        stats["nodes"] += 1
+        if stats["nodes"] % 1024 == 0 and time.time() - started > time_limit_seconds:
+            stats["timed_out"] = True
+        if stats["timed_out"]:
+            return
+        
+        if mask == full:
+            cost = tardiness + weight * makespan
+            if cost < best["cost"] - 1e-9:
+                best["cost"] = cost
+                best["sequences"] = {machines[i]: list(seq) for i, seq in enumerate(partial) if seq}
+            return
+        
+        remaining = [j for j in range(n) if not mask >> j & 1]
+        work = sum(shortest[j] for j in remaining)
+        
+        # Earliest finish of every remaining job: best machine and runner-up. A child only
+        # moves one machine's end time, so its bound is recomputed in O(remaining jobs).
+        # Calendars only ever delay work, so max(end, release) + processing time stays a valid bound.
+        first, first_machine, second = {}, {}, {}
+        for k in remaining:
+            f1 = f2 = inf
+            m1 = -1
+            for i, p in choices[k]:
+                f = max(ends[i], jobs[k].release) + p
+                if f < f1:
+                    f1, f2, m1 = f, f1, i
+                elif f < f2:
+                    f2 = f
+            first[k], first_machine[k], second[k] = f1, m1, f2
+        
+        children = []
+        for j in remaining:
+            for i, p in choices[j]:
+                _, end = problem.place(machines[i], ends[i], j, partial[i][-1] if partial[i] else None)
+                child_tardiness = tardiness + (jobs[j].weight * (end - jobs[j].due) if end > jobs[j].due else 0.0)
+                child_makespan = max(makespan, end)
+                
+                # Lower bound: every other remaining job finishes as early as possible
+                bound_tardiness, bound_makespan = child_tardiness, child_makespan
+                for k in remaining:
+                    if k == j:
+                        continue
+                    finish = second[k] if first_machine[k] == i else first[k]
+                    finish = min(finish, max(end, jobs[k].release) + durations[k][i])
+                    if finish > jobs[k].due:
+                        bound_tardiness += jobs[k].weight * (finish - jobs[k].due)
+                    if finish > bound_makespan:
+                        bound_makespan = finish
+                child_ends = ends[:i] + (end,) + ends[i + 1:]
+                remaining_work = work - shortest[j]
+                if remaining_work:
+                    # Remaining work spread perfectly over all machines
+                    spread = (sum(min(e, bound_makespan) for e in child_ends) + remaining_work) / len(child_ends)
+                    bound_makespan = max(bound_makespan, spread)
+                
+                bound = bound_tardiness + weight * bound_makespan
+                if bound < best["cost"] - 1e-9:
+                    children.append((bound, j, i, child_ends, child_tardiness, child_makespan))
+        
+        # Most promising child first so the incumbent improves early
+        children.sort()
+        for bound, j, i, child_ends, child_tardiness, child_makespan in children:
+            if bound >= best["cost"] - 1e-9:
+                break
+            child_mask = mask | 1 << j
+            partial[i].append(j)
+            if dominated(child_mask, (child_tardiness, child_makespan) + child_ends):
+                partial[i].pop()
+                continue
+            search(child_mask, child_ends, child_tardiness, child_makespan)
+            partial[i].pop()
+            if stats["timed_out"]:
+                return
+    
+    search(0, tuple(problem.ready.get(m, 0.0) for m in machines), 0.0, 0.0)
+    
+    return ExactResult(
+        sequences=best["sequences"],
+        cost=best["cost"],
+        nodes=stats["nodes"],
+        seconds=time.time() - started,
+        optimal=not stats["timed_out"]
+    )
+
+
+def _improve_sequences(problem: ScheduleProblem, sequences: Dict[int, List[int]],
+                       options: SchedulingOptions) -> Dict[int, List[int]]:
+    """
+    Runs the optional improvement stages on greedy sequences: same-product grouping,
+    then the exact solver for small instances, then the local-search optimizer.
+    When the exact solver hits its time limit its result is not proven optimal: this is
+    logged and the local search (if enabled) still runs on it.
+    Module-level so clusters can run it in worker processes.
+    """
+    # Sequence-dependent setups: optionally group same-product orders
+    if options.group_setups and problem.setups is not None:
+        sequences = SchedulingService._group_by_product(problem, sequences, options.group_window_days * 24)
+    
+    # Small instances can be solved to optimality
+    solved = False
+    if options.exact and problem.jobs:
+        if len(problem.jobs) > options.exact_max_orders:
+            print(f"Exact solver skipped: {len(problem.jobs)} orders > limit of {options.exact_max_orders}, using heuristic")
+        else:
+            result = branch_and_bound(problem, sequences, options.exact_time_limit_seconds)
+            sequences = result.sequences
+            solved = result.optimal
+            state = "optimal" if result.optimal else "time limit hit, best found is NOT proven optimal"
+            print(f"Exact solver: cost {result.cost:.2f}, {result.nodes} nodes, {result.seconds:.2f}s ({state})")
+    
+    # Optional local-search stage on top of the greedy plan
+    if options.optimize and problem.jobs and not solved:
+        print(f"Optimizing schedule ({options.time_budget_seconds:.1f}s budget)...")
+        result = optimize_schedule(problem, sequences, options.time_budget_seconds, options.restarts)
+        print(f"Optimizer: cost {result.baseline_cost:.2f} -> {result.cost:.2f} ({result.improvement:.1f}% better than greedy)")
+        sequences = result.sequences
+    
+    return sequences
 
 
 class SchedulingService:
     """Service to calculate and generate production plans for pending orders."""
     
+    # Summary of the last scheduling run (shown in the Schedule view)
+    last_run: Dict = {}
+    
+    # Last result per run mode, keyed by the fingerprint of its inputs
+    _cache: Dict[str, tuple] = {}
+    cache_stats: Dict[str, int] = {"hits": 0, "misses": 0}
+    
     @staticmethod
-    def _create_plan_for_orders(pending_orders: List) -> List[ProductionPlan]:
+    def _fingerprint(mode: str, options: SchedulingOptions, stamp: str = "") -> str:
+        """
+        Hashes everything a plan depends on: pending orders, machine recipes, routings,
+        calendars, changeovers, scheduler options and the state of the plan table (plus stock, BOM
+        and expected receipts for material-constrained runs).
+        """
+        digest = hashlib.sha256()
+        for part in (
+            mode,
+            stamp,
+            str(database.DB_PATH),
+            asdict(options),
+            ProductionOrderRepository.get_pending_orders(),
+            MachineRecipeRepository.get_all_machine_recipes(),
+            CalendarRepository.get_all_shifts(),
+            CalendarRepository.get_all_downtimes(),
+            ChangeoverRepository.get_all_changeovers(),
+            RoutingRepository.get_all_operations(),
+            RoutingRepository.get_all_operation_recipes(),
+            RoutingRepository.get_all_precedences(),
+            ProductionPlanRepository.get_plan_stamp(),
+        ):
+            digest.update(repr(part).encode())
+        if options.material_constrained:
+            for part in (MaterialRepository.get_all_materials(), BOMRepository.get_all_bom(),
+                         MaterialReceiptRepository.get_all_receipts()):
+                digest.update(repr(part).encode())
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _cached_plans(mode: str, options: SchedulingOptions, stamp: str = ""):
+        """Returns the cached plans if the inputs are unchanged since the last run, else None."""
+        if not options.use_cache:
+            return None
+        entry = SchedulingService._cache.get(mode)
+        if entry and entry[0] == SchedulingService._fingerprint(mode, options, stamp):
+            SchedulingService.cache_stats["hits"] += 1
+            SchedulingService.last_run["cached"] = True
+            print(f"Inputs unchanged - reusing the previous plan ({len(entry[1])} plans, cache hit)")
+            return list(entry[1])
+        SchedulingService.cache_stats["misses"] += 1
+        return None
+    
+    @staticmethod
+    def _remember(mode: str, options: SchedulingOptions, plans: List[ProductionPlan], stamp: str = ""):
+        """Caches a fresh result. The fingerprint is taken after the plans were written,
+        so the next run with unchanged inputs matches it."""
+        SchedulingService.last_run["cached"] = False
+        if options.use_cache:
+            SchedulingService._cache[mode] = (SchedulingService._fingerprint(mode, options, stamp), list(plans))
+    
+    @staticmethod
+    def _create_plan_for_orders(pending_orders: List, options: SchedulingOptions = None) -> List[ProductionPlan]:
         """
         Internal helper method to create a production plan for a list of orders.
         Does not clear existing plans - caller handles that.
         
         Args:
             pending_orders: List of ProductionOrder objects to schedule
+            options: Scheduler settings (greedy only by default)
             
         Returns:
             List of ProductionPlan objects that were created
@@ -29,69 +339,380 @@ class SchedulingService:
             print("No orders to schedule.")
             return []
         
-        # Dictionary to track when each machine will be free (machine_id -> datetime)
-        machine_free_time: Dict[int, datetime] = {}
+        # Every machine is free right now
+        return SchedulingService._create_plan_for_orders_with_constraints(pending_orders, {}, options)
+    
+    @staticmethod
+    def _material_timeline(origin: datetime, options: SchedulingOptions):
+        """
+        Projected stock for material-constrained runs.
+        
+        Returns:
+            Tuple (MaterialTimeline or None if unconstrained, BOM lines by product ID)
+        """
+        if not options.material_constrained:
+            return None, {}
+        bom_by_product: Dict[int, List] = {}
+        for bom in BOMRepository.get_all_bom():
+            bom_by_product.setdefault(bom.product_id, []).append(bom)
+        timeline = MaterialTimeline(
+            MaterialRepository.get_all_materials(), MaterialReceiptRepository.get_all_receipts(), origin
+        )
+        return timeline, bom_by_product
+    
+    @staticmethod
+    def _release_order(order, material: tuple) -> float:
+        """
+        Earliest start (hours from the origin) of an order given the projected stock, reserving its materials.
+        Returns 0 for unconstrained runs and inf (nothing reserved) if the material never suffices.
+        """
+        timeline, bom_by_product = material
+        if timeline is None:
+            return 0.0
+        needs = [(b.material_id, b.quantity_needed * order.quantity) for b in bom_by_product.get(order.product_id, [])]
+        release = timeline.earliest_time(needs)
+        if release == float("inf"):
+            print(f"Warning: Not enough material for Order {order.id}, even with expected receipts - not scheduled")
+            return release
+        timeline.reserve(needs)
+        return release
+    
+    @staticmethod
+    def _split_at_horizon(orders: List, origin: datetime, horizon_hours: float):
+        """
+        Splits orders by deadline (end of the deadline day) at horizon_hours after origin.
+        
+        Returns:
+            Tuple (orders due within the horizon, orders due later), both in the given order
+        """
+        due_hours: Dict[str, float] = {}
+        near, later = [], []
+        for order in orders:
+            if order.deadline not in due_hours:
+                due = datetime.strptime(order.deadline, '%Y-%m-%d') + timedelta(days=1)
+                due_hours[order.deadline] = (due - origin).total_seconds() / 3600
+            (near if due_hours[order.deadline] <= horizon_hours else later).append(order)
+        return near, later
+    
+    @staticmethod
+    def _rough_plans(orders: List, free_hours: Dict[int, float], origin: datetime,
+                     options: SchedulingOptions, material: tuple = (None, {})) -> List[ProductionPlan]:
+        """
+        Rough placement of orders beyond the rolling horizon: in the given sequence, each on
+        its first machine recipe (routed orders: every operation on its first machine after its
+        predecessors), behind the work already placed and within machine calendars and material
+        releases, but without changeovers, lot splitting or optimization.
+        
+        Args:
+            orders: Orders to place
+            free_hours: machine_id -> hours from origin when the machine is free (updated)
+            origin: Schedule origin
+            options: Scheduler settings
+            material: Projected stock from _material_timeline
+        
+        Returns:
+            List of ProductionPlan objects
+        """
+        recipes_by_product: Dict[int, List] = {}
+        for recipe in MachineRecipeRepository.get_all_machine_recipes():
+            recipes_by_product.setdefault(recipe.product_id, []).append(recipe)
+        operations = RoutingRepository.get_all_operations()
+        routings = build_routings(
+            operations, RoutingRepository.get_all_operation_recipes(), RoutingRepository.get_all_precedences()
+        ) if operations else {}
+        machines = {r.machine_id for recipes in recipes_by_product.values() for r in recipes}
+        machines.update(m for routing in routings.values() for capacities in routing.capacities for m in capacities)
+        calendars = SchedulingService._load_calendars(sorted(machines), origin, options)
+        
+        def place(machine_id: int, ready: float, hours: float) -> tuple:
+            start = max(free_hours.get(machine_id, 0.0), ready)
+            calendar = calendars.get(machine_id)
+            if calendar is None:
+                end = start + hours
+            else:
+                start = calendar.next_working_time(start)
+                end = calendar.add_working_hours(start, hours)
+            free_hours[machine_id] = end
+            return start, end
+        
+        def plan(order_id: int, machine_id: int, start: float, end: float, hours: float, operation_id: int = None):
+            return ProductionPlan(
+                id=0,
+                order_id=order_id,
+                machine_id=machine_id,
+                planned_start_time=(origin + timedelta(hours=start)).isoformat(sep=' ', timespec='seconds'),
+                planned_end_time=(origin + timedelta(hours=end)).isoformat(sep=' ', timespec='seconds'),
+                duration_hours=round(hours, 2),
+                actual_start_time="",
+                status="planned",
+                operation_id=operation_id
+            )
+        
+        plans: List[ProductionPlan] = []
+        for order in orders:
+            routing = routings.get(order.product_id)
+            recipes = recipes_by_product.get(order.product_id)
+            if routing is None and not recipes:
+                print(f"Warning: No machine recipe found for product {order.product_id} (Order {order.id})")
+                continue
+            release = SchedulingService._release_order(order, material)
+            if release == float("inf"):
+                continue
+            if routing is None:
+                hours = order.quantity / recipes[0].production_capacity
+                start, end = place(recipes[0].machine_id, release, hours)
+                plans.append(plan(order.id, recipes[0].machine_id, start, end, hours))
+                continue
+            # Operations in topological order, each ready when its predecessors end
+            ready = [release] * len(routing.operations)
+            for k, operation_id in enumerate(routing.operations):
+                machine_id, capacity = next(iter(routing.capacities[k].items()))
+                hours = order.quantity / capacity
+                start, end = place(machine_id, ready[k], hours)
+                for f in routing.successors[k]:
+                    ready[f] = max(ready[f], end)
+                plans.append(plan(order.id, machine_id, start, end, hours, operation_id))
+        print(f"Rolling horizon: {len(plans)} rough plans placed behind the detailed work")
+        return plans
+    
+    @staticmethod
+    def _schedule_routed_orders(pending_orders: List, machine_free_time: Dict[int, datetime],
+                                origin: datetime, options: SchedulingOptions, material: tuple = (None, {})):
+        """
+        Schedules orders of products that have a routing, respecting operation precedences.
+        Material-constrained runs release each routed order against the projected stock first.
+        
+        Returns:
+            Tuple (plans of all operations, machine free times after them, orders left for single-step
+            scheduling, number of routed orders waiting for material)
+        """
+        operations = RoutingRepository.get_all_operations()
+        if not operations:
+            return [], machine_free_time, pending_orders, 0
+        routings = build_routings(
+            operations, RoutingRepository.get_all_operation_recipes(), RoutingRepository.get_all_precedences()
+        )
+        routed = [o for o in pending_orders if o.product_id in routings]
+        if not routed:
+            return [], machine_free_time, pending_orders, 0
+        
+        ready = {m: (t - origin).total_seconds() / 3600 for m, t in machine_free_time.items()}
+        jobs = []
+        due_hours: Dict[str, float] = {}
+        for order in routed:
+            release = SchedulingService._release_order(order, material)
+            if release == float("inf"):
+                continue
+            if order.deadline not in due_hours:
+                due = datetime.strptime(order.deadline, '%Y-%m-%d') + timedelta(days=1)
+                due_hours[order.deadline] = (due - origin).total_seconds() / 3600
+            jobs.append(RoutedJob(
+                order_id=order.id,
+                product_id=order.product_id,
+                quantity=order.quantity,
+                due=due_hours[order.deadline],
+                weight=PRIORITY_WEIGHTS.get(order.priority, 1.0),
+                release=release
+            ))
+        
+        machines = {m for routing in routings.values() for capacities in routing.capacities for m in capacities}
+        calendars = SchedulingService._load_calendars(sorted(machines), origin, options)
+        slots = schedule_routings(jobs, routings, ready, calendars)
+        
+        plans: List[ProductionPlan] = []
+        free_time = dict(machine_free_time)
+        for slot in slots:
+            planned_end = origin + timedelta(hours=slot.end)
+            plans.append(ProductionPlan(
+                id=0,
+                order_id=slot.order_id,
+                machine_id=slot.machine_id,
+                planned_start_time=(origin + timedelta(hours=slot.start)).isoformat(sep=' ', timespec='seconds'),
+                planned_end_time=planned_end.isoformat(sep=' ', timespec='seconds'),
+                duration_hours=round(slot.hours, 2),
+                actual_start_time="",
+                status="planned",
+                operation_id=slot.operation_id
+            ))
+            free_time[slot.machine_id] = max(free_time.get(slot.machine_id, planned_end), planned_end)
+            if len(plans) <= LOG_LIMIT:
+                print(f"Scheduled Order {slot.order_id} operation {slot.operation_id} on Machine {slot.machine_id}: "
+                      f"{plans[-1].planned_start_time} -> {plans[-1].planned_end_time} ({slot.hours:.2f}h)")
         
-        # List to collect all newly created plans
-        created_plans: List[ProductionPlan] = []
+        print(f"Routings: {len(routed)} orders scheduled as {len(plans)} operations")
+        remaining = [o for o in pending_orders if o.product_id not in routings]
+        return plans, free_time, remaining, sum(1 for job in jobs if job.release > 0)
+    
+    @staticmethod
+    def _build_problem(pending_orders: List, machine_free_time: Dict[int, datetime],
+                       origin: datetime, options: SchedulingOptions, material: tuple = (None, {})):
+        """
+        Builds the in-memory scheduling problem and the greedy sequences.
+        Greedy rule: orders in the given sequence, each on its first machine recipe.
+        Orders split into lots put one lot on each machine they are spread over.
         
-        # Process each order
+        Returns:
+            Tuple (ScheduleProblem, sequences dict machine_id -> job indices)
+        """
+        # Load all recipes once instead of querying per order
+        recipes_by_product: Dict[int, List] = {}
+        for recipe in MachineRecipeRepository.get_all_machine_recipes():
+            recipes_by_product.setdefault(recipe.product_id, []).append(recipe)
+        
+        # Machines that are busy (in-progress work) become free later
+        ready = {m: (t - origin).total_seconds() / 3600 for m, t in machine_free_time.items()}
+        # Rough machine load of the greedy pass, used to size lots
+        load: Dict[int, float] = dict(ready)
+        
+        jobs: List[ScheduleJob] = []
+        sequences: Dict[int, List[int]] = {}
+        due_hours: Dict[str, float] = {}  # deadline string -> hours, parsed once per distinct date
         for order in pending_orders:
-            # Get machine recipes that can produce this product
-            recipes = MachineRecipeRepository.get_recipes_by_product_id(order.product_id)
-            
+            recipes = recipes_by_product.get(order.product_id)
             if not recipes:
                 print(f"Warning: No machine recipe found for product {order.product_id} (Order {order.id})")
                 continue
             
-            # For now, assign to the first available machine
-            recipe = recipes[0]
-            machine_id = recipe.machine_id
+            # Deadline means "by the end of that day"
+            if order.deadline not in due_hours:
+                due = datetime.strptime(order.deadline, '%Y-%m-%d') + timedelta(days=1)
+                due_hours[order.deadline] = (due - origin).total_seconds() / 3600
+            weight = PRIORITY_WEIGHTS.get(order.priority, 1.0)
             
-            # Calculate production duration in hours
-            duration_hours = order.quantity / recipe.production_capacity
+            # Projected stock: orders are released in the given sequence as material allows
+            release = SchedulingService._release_order(order, material)
+            if release == float("inf"):
+                continue
             
-            # Determine when this machine is free
-            if machine_id not in machine_free_time:
-                # Machine hasn't been used yet, can start immediately
-                planned_start = datetime.now()
+            if (options.lot_split_min_quantity and order.quantity >= options.lot_split_min_quantity
+                    and len(recipes) > 1 and options.max_lots > 1):
+                lots = SchedulingService._split_into_lots(order.quantity, recipes, load, options.max_lots)
             else:
-                # Machine is busy, schedule after current task
-                planned_start = machine_free_time[machine_id]
-            
-            # Calculate planned end time
-            planned_end = planned_start + timedelta(hours=duration_hours)
+                # For now, assign to the first available machine
+                lots = [(recipes[0].machine_id, order.quantity)]
             
-            # Create ProductionPlan object
-            plan = ProductionPlan(
-                id=0,
-                order_id=order.id,
-                machine_id=machine_id,
-                planned_start_time=planned_start.strftime('%Y-%m-%d %H:%M:%S'),
-                planned_end_time=planned_end.strftime('%Y-%m-%d %H:%M:%S'),
-                duration_hours=round(duration_hours, 2),
-                actual_start_time="",
-                status="planned"
-            )
-            
-            # Save to database
-            plan = ProductionPlanRepository.add_plan(plan)
-            created_plans.append(plan)
-            
-            # Update machine's free time for next order
-            machine_free_time[machine_id] = planned_end
+            for machine_id, quantity in lots:
+                jobs.append(ScheduleJob(
+                    order_id=order.id,
+                    # Lots share the order's tardiness weight by quantity
+                    weight=weight * quantity / order.quantity,
+                    due=due_hours[order.deadline],
+                    durations={r.machine_id: quantity / r.production_capacity for r in recipes},
+                    product_id=order.product_id,
+                    release=release
+                ))
+                sequences.setdefault(machine_id, []).append(len(jobs) - 1)
+                load[machine_id] = max(load.get(machine_id, 0.0), release) + jobs[-1].durations[machine_id]
+        
+        problem = ScheduleProblem(jobs=jobs, ready=ready, makespan_weight=options.makespan_weight)
+        problem.calendars = SchedulingService._load_calendars(problem.machines(), origin, options)
+        changeovers = ChangeoverRepository.get_all_changeovers()
+        if changeovers:
+            problem.setups = ChangeoverMatrix(changeovers)
+        return problem, sequences
+    
+    @staticmethod
+    def _split_into_lots(quantity: float, recipes: List, load: Dict[int, float],
+                         max_lots: int) -> List[tuple]:
+        """
+        Divides an order over its fastest capable machines so all lots finish together
+        (water-filling: a machine that is free earlier gets a bigger lot).
+        
+        Args:
+            quantity: Order quantity
+            recipes: Machine recipes of the product
+            load: Hours at which each machine is currently booked until
+            max_lots: Maximum number of lots
+        
+        Returns:
+            List of (machine_id, lot quantity), at most one lot per machine
+        """
+        candidates = sorted(recipes, key=lambda r: -r.production_capacity)[:max_lots]
+        candidates.sort(key=lambda r: load.get(r.machine_id, 0.0))
+        
+        # Raise the common finish time T until the machines free before T can make the quantity
+        chosen = []
+        finish = 0.0
+        for k, recipe in enumerate(candidates):
+            chosen.append(recipe)
+            capacity = sum(r.production_capacity for r in chosen)
+            booked = sum(r.production_capacity * load.get(r.machine_id, 0.0) for r in chosen)
+            finish = (quantity + booked) / capacity
+            if k + 1 == len(candidates) or finish <= load.get(candidates[k + 1].machine_id, 0.0):
+                break
+        
+        lots = [(r.machine_id, r.production_capacity * (finish - load.get(r.machine_id, 0.0))) for r in chosen]
+        lots = [(m, q) for m, q in lots if q >= MIN_LOT_SHARE * quantity] or [max(lots, key=lambda lot: lot[1])]
+        scale = quantity / sum(q for _, q in lots)
+        return [(m, q * scale) for m, q in lots]
+    
+    @staticmethod
+    def _group_by_product(problem: ScheduleProblem, sequences: Dict[int, List[int]],
+                          window_hours: float) -> Dict[int, List[int]]:
+        """
+        Reorders each machine's queue so same-product orders run back to back.
+        When an order is reached, later orders of the same product whose deadline is
+        within window_hours of it are pulled forward behind it.
+        """
+        grouped: Dict[int, List[int]] = {}
+        for machine_id, sequence in sequences.items():
+            queues: Dict[int, deque] = {}
+            for j in sequence:
+                queues.setdefault(problem.jobs[j].product_id, deque()).append(j)
             
-            print(f"Scheduled Order {order.id} on Machine {machine_id}: {planned_start} -> {planned_end} ({duration_hours:.2f}h)")
+            placed = set()
+            result = []
+            for j in sequence:
+                if j in placed:
+                    continue
+                # j is the first unplaced order of its product, so it heads the queue
+                queue = queues[problem.jobs[j].product_id]
+                limit = problem.jobs[j].due + window_hours
+                while queue and problem.jobs[queue[0]].due <= limit:
+                    k = queue.popleft()
+                    result.append(k)
+                    placed.add(k)
+                if j not in placed:
+                    queue.remove(j)
+                    result.append(j)
+                    placed.add(j)
+            grouped[machine_id] = result
+        return grouped
+    
+    @staticmethod
+    def _load_calendars(machine_ids: List[int], origin: datetime,
+                        options: SchedulingOptions) -> Dict[int, WorkingTimeIndex]:
+        """Compiles working-time indexes for machines that have shifts or downtimes."""
+        shifts = CalendarRepository.get_all_shifts()
+        downtimes = CalendarRepository.get_all_downtimes()
+        if not shifts and not downtimes:
+            return {}
         
-        return created_plans
+        shifts_by_machine: Dict[int, List] = {}
+        for shift in shifts:
+            shifts_by_machine.setdefault(shift.machine_id, []).append(shift)
+        plant_downtimes = [d for d in downtimes if d.machine_id is None]
+        
+        calendars: Dict[int, WorkingTimeIndex] = {}
+        for machine_id in machine_ids:
+            machine_downtimes = plant_downtimes + [d for d in downtimes if d.machine_id == machine_id]
+            if machine_id in shifts_by_machine or machine_downtimes:
+                calendars[machine_id] = compile_calendar(
+                    shifts_by_machine.get(machine_id, []), machine_downtimes,
+                    origin, options.calendar_horizon_days
+                )
+        return calendars
     
     @staticmethod
-    def generate_plan_from_scratch():
+    def generate_plan_from_scratch(options: SchedulingOptions = None):
         """
         Generates a FRESH production plan from all pending orders.
         DELETES ALL existing plans (completed, in_progress, planned).
         Use this for starting completely new or clearing everything.
         
+        Args:
+            options: Scheduler settings (greedy only by default)
+        
         Returns:
             List of ProductionPlan objects that were created
         """
@@ -99,6 +720,11 @@ class SchedulingService:
         print("GENERATING PRODUCTION PLAN FROM SCRATCH")
         print("="*80)
         
+        options = options or SchedulingOptions()
+        cached = SchedulingService._cached_plans("scratch", options)
+        if cached is not None:
+            return cached
+        
         # Get all pending orders
         pending_orders = ProductionOrderRepository.get_pending_orders()
         
@@ -111,7 +737,8 @@ class SchedulingService:
         print(f"Cleared all existing plans.")
         
         # Create plans for all pending orders
-        created_plans = SchedulingService._create_plan_for_orders(pending_orders)
+        created_plans = SchedulingService._create_plan_for_orders(pending_orders, options)
+        SchedulingService._remember("scratch", options, created_plans)
         
         print(f"\n✅ Production plan generated from scratch: {len(created_plans)} orders scheduled")
         print("="*80 + "\n")
@@ -119,7 +746,7 @@ class SchedulingService:
         return created_plans
     
     @staticmethod
-    def update_plan_with_new_orders():
+    def update_plan_with_new_orders(options: SchedulingOptions = None):
         """
         Updates the EXISTING production plan with new orders.
         KEEPS: in_progress and completed orders (don't touch them)
@@ -129,6 +756,9 @@ class SchedulingService:
         This allows adding new orders without disrupting work that's already started.
         New high-priority orders will be scheduled first.
         
+        Args:
+            options: Scheduler settings (greedy only by default)
+        
         Returns:
             List of ProductionPlan objects that were created/rescheduled
         """
@@ -136,6 +766,11 @@ class SchedulingService:
         print("UPDATING PRODUCTION PLAN WITH NEW ORDERS")
         print("="*80)
         
+        options = options or SchedulingOptions()
+        cached = SchedulingService._cached_plans("update", options)
+        if cached is not None:
+            return cached
+        
         # Get all pending orders (old + new)
         pending_orders = ProductionOrderRepository.get_pending_orders()
         
@@ -172,8 +807,10 @@ class SchedulingService:
         # But we need to update the scheduling logic to use our machine_free_time
         created_plans = SchedulingService._create_plan_for_orders_with_constraints(
             pending_orders, 
-            machine_free_time
+            machine_free_time,
+            options
         )
+        SchedulingService._remember("update", options, created_plans)
         
         print(f"\n✅ Production plan updated: {len(created_plans)} orders scheduled")
         print(f"   ({len(in_progress_plans)} in-progress orders preserved)")
@@ -181,10 +818,292 @@ class SchedulingService:
         
         return created_plans
     
+    @staticmethod
+    def update_plan_rolling(options: SchedulingOptions = None):
+        """
+        Rolling-horizon update of the EXISTING production plan.
+        KEEPS: in_progress orders and orders whose plan starts within the frozen zone
+        REPLANS: orders due within the look-ahead window (optimized when enabled)
+        ROUGHLY PLANS: orders due later, in greedy order after the look-ahead work
+        
+        Args:
+            options: Scheduler settings; frozen_hours and lookahead_hours set the windows
+        
+        Returns:
+            List of ProductionPlan objects that were created/rescheduled
+        """
+        print("\n" + "="*80)
+        print("ROLLING-HORIZON PLAN UPDATE")
+        print("="*80)
+        
+        options = options or SchedulingOptions()
+        now = datetime.now()
+        # The frozen zone moves with the clock, so the cache only holds within the hour
+        hour = now.strftime('%Y-%m-%d %H')
+        cached = SchedulingService._cached_plans("rolling", options, hour)
+        if cached is not None:
+            return cached
+        
+        frozen_until = (now + timedelta(hours=options.frozen_hours)).isoformat(sep=' ', timespec='seconds')
+        
+        # Frozen plans stay as they are and block their machines
+        frozen_plans = ProductionPlanRepository.get_frozen_plans(frozen_until)
+        deleted = ProductionPlanRepository.delete_unfrozen_plans(frozen_until)
+        frozen_orders = {plan.order_id for plan in frozen_plans}
+        # A frozen campaign keeps all its member orders
+        frozen_campaigns = {plan.campaign_id for plan in frozen_plans if plan.campaign_id}
+        if frozen_campaigns:
+            members = CampaignRepository.get_campaign_members()
+            for campaign_id in frozen_campaigns:
+                frozen_orders.update(members.get(campaign_id, []))
+        
+        machine_free_time: Dict[int, datetime] = {}
+        for plan in frozen_plans:
+            end_datetime = datetime.strptime(plan.planned_end_time, '%Y-%m-%d %H:%M:%S')
+            machine_free_time[plan.machine_id] = max(machine_free_time.get(plan.machine_id, now), end_datetime)
+        
+        print(f"Kept {len(frozen_plans)} plans of {len(frozen_orders)} orders in the frozen zone (until {frozen_until})")
+        print(f"Cleared {deleted} planned entries (will reschedule)")
+        
+        pending_orders = [o for o in ProductionOrderRepository.get_pending_orders() if o.id not in frozen_orders]
+        if not pending_orders:
+            print("No pending orders to schedule.")
+            return []
+        
+        horizon_hours = options.frozen_hours + options.lookahead_hours
+        created_plans = SchedulingService._create_plan_for_orders_with_constraints(
+            pending_orders,
+            machine_free_time,
+            options,
+            horizon_hours
+        )
+        SchedulingService._remember("rolling", options, created_plans, hour)
+        
+        print(f"\n✅ Rolling-horizon update: {len(created_plans)} plans scheduled")
+        print("="*80 + "\n")
+        
+        return created_plans
+    
+    @staticmethod
+    def repair(machine_id: int, down_from: str, down_until: str, record_downtime: bool = True,
+               options: SchedulingOptions = None) -> List[ProductionPlan]:
+        """
+        Repairs the plan after a machine breakdown without regenerating it.
+        Every planned job on the machine that overlaps the outage goes either into the
+        earliest free gap of an alternative machine (other plans stay untouched) or right
+        after the outage on the same machine, whichever finishes first, never before the
+        routing predecessors of its operation end. Jobs pushed right only shift the next
+        jobs on their machine and their successor operations as far as they actually overlap.
+        All jobs are placed in the working time of their machine's calendar; on an alternative
+        machine the processing time follows its capacity and the setup its changeover matrix.
+        
+        Args:
+            machine_id: Machine that is down
+            down_from: Outage start 'YYYY-MM-DD HH:MM:SS'
+            down_until: Outage end 'YYYY-MM-DD HH:MM:SS'
+            record_downtime: Also store the outage as a machine downtime for later runs
+            options: Scheduler settings (calendar horizon)
+        
+        Returns:
+            List of ProductionPlan objects that were moved
+        """
+        started = time.time()
+        options = options or SchedulingOptions()
+        fmt = '%Y-%m-%d %H:%M:%S'
+        outage_end = datetime.strptime(down_until, fmt)
+        
+        machine_plans = ProductionPlanRepository.get_machine_plans_after(machine_id, down_from)
+        affected = [p for p in machine_plans if p.planned_start_time < down_until and p.status == "planned"]
+        stuck = [p for p in machine_plans if p.planned_start_time < down_until and p.status == "in_progress"]
+        if stuck:
+            print(f"Warning: {len(stuck)} in-progress plans on Machine {machine_id} are hit by the outage - not moved")
+        
+        if record_downtime:
+            CalendarRepository.add_downtime(MachineDowntime(
+                id=None, machine_id=machine_id, start_time=down_from, end_time=down_until, reason="breakdown"
+            ))
+        if not affected:
+            print(f"Repair: no planned work on Machine {machine_id} between {down_from} and {down_until}")
+            return []
+        
+        # Product of every plan's order, for changeovers and recipes
+        products: Dict[int, int] = {}
+        
+        def product_of(plan: ProductionPlan) -> int:
+            if plan.order_id not in products:
+                products[plan.order_id] = ProductionOrderRepository.get_order_by_id(plan.order_id).product_id
+            return products[plan.order_id]
+        
+        # Recipes of the affected products (or routing operations): capacity per machine, to rescale durations
+        capacity: Dict[tuple, Dict[int, float]] = {}
+        recipe_of: Dict[int, tuple] = {}
+        for plan in affected:
+            if plan.operation_id:
+                key = ("operation", plan.operation_id)
+                if key not in capacity:
+                    capacity[key] = {r.machine_id: r.production_capacity
+                                     for r in RoutingRepository.get_recipes_by_operation_id(plan.operation_id)}
+            else:
+                key = ("product", product_of(plan))
+                if key not in capacity:
+                    capacity[key] = {r.machine_id: r.production_capacity
+                                     for r in MachineRecipeRepository.get_recipes_by_product_id(key[1])}
+            recipe_of[plan.id] = key
+        changeovers = ChangeoverMatrix(ChangeoverRepository.get_all_changeovers())
+        
+        # Machine calendars (the recorded outage included), in hours from the earliest start searched
+        # (a hit plan may have started before the outage)
+        search_from = min(p.planned_start_time for p in affected)
+        origin = datetime.strptime(search_from, fmt)
+        calendars = SchedulingService._load_calendars(
+            [m.id for m in MachineRepository.get_all_machines()], origin, options
+        )
+        
+        def place(machine: int, not_before: datetime, hours: float) -> tuple:
+            """Start and end of a job of the given working hours, started as early as possible."""
+            calendar = calendars.get(machine)
+            if calendar is None:
+                return not_before, not_before + timedelta(hours=hours)
+            t = calendar.next_working_time((not_before - origin).total_seconds() / 3600)
+            end = calendar.add_working_hours(t, hours)
+            return origin + timedelta(seconds=round(t * 3600)), origin + timedelta(seconds=round(end * 3600))
+        
+        # Busy intervals (with their product) of alternative machines, loaded once per machine
+        busy: Dict[int, List[tuple]] = {}
+        
+        def earliest_gap(alt_machine: int, not_before: datetime, processing: float, product_id: int) -> tuple:
+            """Start, end and machine hours (setup after the previous job included) in the first gap that fits."""
+            if alt_machine not in busy:
+                busy[alt_machine] = [
+                    (datetime.strptime(p.planned_start_time, fmt), datetime.strptime(p.planned_end_time, fmt), product_of(p))
+                    for p in ProductionPlanRepository.get_machine_plans_after(alt_machine, search_from)
+                ]
+            t = not_before
+            previous = None
+            for start, end, other in busy[alt_machine]:
+                if end > t:
+                    hours = processing + changeovers.hours(alt_machine, previous, product_id)
+                    if start >= place(alt_machine, t, hours)[1]:
+                        break
+                    t = end
+                previous = other
+            hours = processing + changeovers.hours(alt_machine, previous, product_id)
+            return place(alt_machine, t, hours) + (hours,)
+        
+        # Routing precedences of operation plans: an operation starts after its predecessors end
+        operations = RoutingRepository.get_all_operations()
+        routings = build_routings(
+            operations, RoutingRepository.get_all_operation_recipes(), RoutingRepository.get_all_precedences()
+        ) if operations else {}
+        predecessors_of: Dict[int, List[int]] = {}
+        successors_of: Dict[int, List[int]] = {}
+        for routing in routings.values():
+            for k, operation_id in enumerate(routing.operations):
+                successors_of[operation_id] = [routing.operations[f] for f in routing.successors[k]]
+                for f in routing.successors[k]:
+                    predecessors_of.setdefault(routing.operations[f], []).append(operation_id)
+        
+        # Plans loaded so far by ID, so every machine sequence and order shares the same objects
+        known: Dict[int, ProductionPlan] = {p.id: p for p in machine_plans}
+        sequences: Dict[int, List[ProductionPlan]] = {machine_id: list(machine_plans)}
+        order_plans: Dict[int, Dict[int, ProductionPlan]] = {}
+        
+        def sequence_of(machine: int) -> List[ProductionPlan]:
+            if machine not in sequences:
+                sequences[machine] = [known.setdefault(p.id, p)
+                                      for p in ProductionPlanRepository.get_machine_plans_after(machine, search_from)]
+            return sequences[machine]
+        
+        def operations_of(order_id: int) -> Dict[int, ProductionPlan]:
+            if order_id not in order_plans:
+                order_plans[order_id] = {p.operation_id: known.setdefault(p.id, p)
+                                         for p in ProductionPlanRepository.get_plans_by_order_id(order_id)
+                                         if p.order_id == order_id and p.operation_id}
+            return order_plans[order_id]
+        
+        def predecessors_end(plan: ProductionPlan) -> datetime:
+            if not plan.operation_id:
+                return datetime.min
+            plans = operations_of(plan.order_id)
+            ends = [datetime.strptime(plans[o].planned_end_time, fmt)
+                    for o in predecessors_of.get(plan.operation_id, []) if o in plans]
+            return max(ends, default=datetime.min)
+        
+        moved: List[ProductionPlan] = []
+        cursor = outage_end  # end of the work pushed right on the broken machine
+        for plan in affected:
+            start = max(datetime.strptime(plan.planned_start_time, fmt), predecessors_end(plan))
+            rates = capacity[recipe_of[plan.id]]
+            own_rate = rates.get(machine_id)
+            
+            push_start, push_end = place(machine_id, max(cursor, start), plan.duration_hours)
+            best = (push_end, machine_id, push_start, plan.duration_hours)
+            if own_rate:
+                # Quantity the plan produces: its machine hours without the setup after the previous job
+                sequence = sequences[machine_id]
+                position = sequence.index(plan)
+                previous = product_of(sequence[position - 1]) if position > 0 else None
+                setup = changeovers.hours(machine_id, previous, product_of(plan))
+                quantity = max(plan.duration_hours - setup, 0.0) * own_rate
+            for alt_machine, rate in rates.items():
+                if alt_machine == machine_id or not own_rate:
+                    continue
+                alt_start, alt_end, hours = earliest_gap(alt_machine, start, quantity / rate, product_of(plan))
+                if alt_end <= best[0]:
+                    best = (alt_end, alt_machine, alt_start, hours)
+            
+            end, new_machine, new_start, hours = best
+            if new_machine == machine_id:
+                cursor = end
+            else:
+                insort(busy[new_machine], (new_start, end, product_of(plan)))
+                sequences[machine_id].remove(plan)
+                target = sequence_of(new_machine)
+                target.insert(sum(1 for p in target if p.planned_start_time <= new_start.strftime(fmt)), plan)
+            plan.machine_id = new_machine
+            plan.planned_start_time = new_start.strftime(fmt)
+            plan.planned_end_time = end.strftime(fmt)
+            plan.duration_hours = round(hours, 2)
+            moved.append(plan)
+            print(f"Repair: Order {plan.order_id} -> Machine {new_machine}: {plan.planned_start_time} -> {plan.planned_end_time}")
+        
+        # Push work right only as far as it overlaps moved work: the next plan on the same machine
+        # and the successor operations of the same order, and from them onwards
+        moved_ids = {p.id for p in moved}
+        queue = deque(moved)
+        while queue:
+            plan = queue.popleft()
+            sequence = sequence_of(plan.machine_id)
+            position = next(k for k, p in enumerate(sequence) if p.id == plan.id)
+            followers = sequence[position + 1:position + 2]
+            if plan.operation_id:
+                followers += [operations_of(plan.order_id)[o] for o in successors_of.get(plan.operation_id, [])
+                              if o in operations_of(plan.order_id)]
+            for follower in followers:
+                if follower.status != "planned" or follower.planned_start_time >= plan.planned_end_time:
+                    continue
+                new_start, new_end = place(follower.machine_id, datetime.strptime(plan.planned_end_time, fmt),
+                                           follower.duration_hours)
+                follower.planned_start_time = new_start.strftime(fmt)
+                follower.planned_end_time = new_end.strftime(fmt)
+                if follower.id not in moved_ids:
+                    moved_ids.add(follower.id)
+                    moved.append(follower)
+                queue.append(follower)
+        
+        ProductionPlanRepository.update_plans(moved)
+        # Plan times changed behind the cache's back
+        SchedulingService._cache.clear()
+        
+        print(f"Repair: {len(affected)} plans hit, {len(moved)} plans moved in {(time.time() - started) * 1000:.1f} ms")
+        return moved
+    
     @staticmethod
     def _create_plan_for_orders_with_constraints(
         pending_orders: List, 
-        initial_machine_free_time: Dict[int, datetime]
+        initial_machine_free_time: Dict[int, datetime],
+        options: SchedulingOptions = None,
+        horizon_hours: float = None
     ) -> List[ProductionPlan]:
         """
         Helper to schedule orders with existing machine constraints.
@@ -193,52 +1112,164 @@ class SchedulingService:
         Args:
             pending_orders: Orders to schedule
             initial_machine_free_time: Dict of when each machine is currently free
+            options: Scheduler settings (greedy only by default)
+            horizon_hours: If set, only orders due within this many hours are scheduled in detail
+                (and optimized); later orders are placed roughly behind them
         """
         if not pending_orders:
             return []
         
-        # Start with the provided constraints
-        machine_free_time: Dict[int, datetime] = initial_machine_free_time.copy()
-        created_plans: List[ProductionPlan] = []
+        options = options or SchedulingOptions()
+        origin = datetime.now()
         
-        for order in pending_orders:
-            recipes = MachineRecipeRepository.get_recipes_by_product_id(order.product_id)
-            
-            if not recipes:
-                print(f"Warning: No machine recipe for product {order.product_id} (Order {order.id})")
-                continue
-            
-            recipe = recipes[0]
-            machine_id = recipe.machine_id
-            duration_hours = order.quantity / recipe.production_capacity
-            
-            # Get when this machine is free (respecting in_progress orders)
-            if machine_id not in machine_free_time:
-                planned_start = datetime.now()
-            else:
-                planned_start = machine_free_time[machine_id]
-            
-            planned_end = planned_start + timedelta(hours=duration_hours)
+        # Plan metrics score every order against its own deadline, campaign members included
+        scheduled_orders = pending_orders
+        
+        # Campaigns: batches of same-product orders are scheduled as one combined order
+        campaign_of: Dict[int, int] = {}
+        if options.campaign_tolerance_days > 0:
+            pending_orders, campaign_of = CampaignService.build_campaigns(
+                pending_orders, options.campaign_tolerance_days, options.campaign_max_quantity
+            )
+        
+        # Rolling horizon: orders due later never enter the detailed problem, so its cost
+        # follows the horizon rather than the backlog
+        later: List = []
+        if horizon_hours is not None:
+            pending_orders, later = SchedulingService._split_at_horizon(pending_orders, origin, horizon_hours)
+            print(f"Rolling horizon: {len(pending_orders)} orders scheduled in detail, {len(later)} roughly scheduled")
+        
+        # Products with a multi-operation routing are scheduled first, operation by operation;
+        # single-step orders then fill the machines from where the routed work ends
+        # Routed and single-step orders draw on the same projected stock, routed orders first
+        material = SchedulingService._material_timeline(origin, options)
+        routed_plans, machine_free_time, pending_orders, routed_waits = SchedulingService._schedule_routed_orders(
+            pending_orders, initial_machine_free_time, origin, options, material
+        )
+        problem, sequences = SchedulingService._build_problem(
+            pending_orders, machine_free_time, origin, options, material
+        )
+        
+        baseline_setup = problem.setup_total(sequences)
+        sequences = SchedulingService._improve(problem, sequences, options)
+        
+        # Resolve start/end hours of every job from its machine sequence
+        placement: Dict[int, tuple] = {}
+        for machine_id, sequence in sequences.items():
+            previous = None
+            for j, (start, end) in zip(sequence, problem.timeline(machine_id, sequence)):
+                placement[j] = (machine_id, start, end, problem.setup_hours(machine_id, previous, j))
+                previous = j
+        
+        setup_hours = problem.setup_total(sequences)
+        SchedulingService.last_run = {
+            "orders": len(problem.jobs),
+            "setup_hours": setup_hours,
+            "setup_hours_saved": baseline_setup - setup_hours,
+            "material_waits": routed_waits + sum(1 for job in problem.jobs if job.release > 0)
+        }
+        if options.material_constrained:
+            print(f"Material-constrained: {SchedulingService.last_run['material_waits']} plans wait for material receipts")
+        if problem.setups is not None:
+            print(f"Setup time: {setup_hours:.2f}h ({baseline_setup - setup_hours:.2f}h saved vs. deadline order)")
+        
+        # Number the lots of split orders by start time
+        lots_by_order: Dict[int, List[int]] = {}
+        for j, job in enumerate(problem.jobs):
+            lots_by_order.setdefault(job.order_id, []).append(j)
+        lot_label: Dict[int, str] = {}
+        for lots in lots_by_order.values():
+            if len(lots) > 1:
+                lots.sort(key=lambda k: placement[k][1])
+                for i, k in enumerate(lots):
+                    lot_label[k] = f" (lot {i + 1}/{len(lots)})"
+        
+        created_plans: List[ProductionPlan] = list(routed_plans)
+        for j, job in enumerate(problem.jobs):
+            machine_id, start, end, setup = placement[j]
+            # Machine time includes the changeover before the order
+            duration_hours = setup + job.durations[machine_id]
+            planned_start = origin + timedelta(hours=start)
+            planned_end = origin + timedelta(hours=end)
             
-            plan = ProductionPlan(
+            created_plans.append(ProductionPlan(
                 id=0,
-                order_id=order.id,
+                order_id=job.order_id,
                 machine_id=machine_id,
-                planned_start_time=planned_start.strftime('%Y-%m-%d %H:%M:%S'),
-                planned_end_time=planned_end.strftime('%Y-%m-%d %H:%M:%S'),
+                planned_start_time=planned_start.isoformat(sep=' ', timespec='seconds'),
+                planned_end_time=planned_end.isoformat(sep=' ', timespec='seconds'),
                 duration_hours=round(duration_hours, 2),
                 actual_start_time="",
                 status="planned"
-            )
+            ))
             
-            plan = ProductionPlanRepository.add_plan(plan)
-            created_plans.append(plan)
-            machine_free_time[machine_id] = planned_end
-            
-            print(f"Scheduled Order {order.id} on Machine {machine_id}: {planned_start} -> {planned_end} ({duration_hours:.2f}h)")
+            if len(created_plans) <= LOG_LIMIT:
+                print(f"Scheduled Order {job.order_id}{lot_label.get(j, '')} on Machine {machine_id}: {planned_start} -> {planned_end} ({duration_hours:.2f}h)")
+        
+        if later:
+            # Machines are free for rough work once the detailed work ends
+            free_hours = {m: (t - origin).total_seconds() / 3600 for m, t in machine_free_time.items()}
+            for machine_id, start, end, _ in placement.values():
+                free_hours[machine_id] = max(free_hours.get(machine_id, end), end)
+            created_plans.extend(SchedulingService._rough_plans(later, free_hours, origin, options, material))
+        
+        if len(created_plans) > LOG_LIMIT:
+            print(f"... and {len(created_plans) - LOG_LIMIT} more plans")
+        if lot_label:
+            print(f"{len(lots_by_order)} orders scheduled as {len(created_plans)} plans ({len(lot_label)} lots)")
+        
+        for plan in created_plans:
+            plan.campaign_id = campaign_of.get(plan.order_id)
+        
+        # Save all plans in one transaction
+        ProductionPlanRepository.add_plans(created_plans)
+        
+        metrics = plan_metrics(created_plans, scheduled_orders)
+        SchedulingService.last_run["metrics"] = metrics
+        print(f"Plan quality: makespan {metrics.makespan_hours:.1f}h, {metrics.late_orders} late orders, "
+              f"weighted tardiness {metrics.weighted_tardiness:.1f}h, utilization {metrics.average_utilization:.0%}")
         
         return created_plans
     
+    @staticmethod
+    def _improve(problem: ScheduleProblem, sequences: Dict[int, List[int]],
+                 options: SchedulingOptions) -> Dict[int, List[int]]:
+        """Runs the improvement stages, per independent cluster if enabled."""
+        # Nothing to improve: don't spawn workers just to hand the greedy plan back
+        if not (options.optimize or options.exact or (options.group_setups and problem.setups is not None)):
+            return sequences
+        clusters = find_clusters(problem) if options.parallel_clusters else []
+        if len(clusters) > 1:
+            return SchedulingService._improve_clusters(problem, sequences, clusters, options)
+        return _improve_sequences(problem, sequences, options)
+    
+    @staticmethod
+    def _improve_clusters(problem: ScheduleProblem, sequences: Dict[int, List[int]],
+                          clusters: List[List[int]], options: SchedulingOptions) -> Dict[int, List[int]]:
+        """
+        Improves every independent cluster in its own worker process and merges the
+        results in cluster order, so the outcome does not depend on which worker finishes first.
+        """
+        workers = min(len(clusters), options.max_workers or os.cpu_count() or 1)
+        print(f"Scheduling {len(clusters)} independent machine clusters on {workers} workers...")
+        
+        # Cores are shared out by cluster, so each optimizer runs a single restart;
+        # clusters run in waves of `workers`, so split the wall-clock budget between waves
+        waves = -(-len(clusters) // workers)
+        cluster_options = replace(options, restarts=1, time_budget_seconds=options.time_budget_seconds / waves)
+        parts = [subproblem(problem, jobs, sequences) for jobs in clusters]
+        start = time.time()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_improve_sequences, [p for p, _ in parts], [s for _, s in parts],
+                                    [cluster_options] * len(parts)))
+        
+        merged: Dict[int, List[int]] = {}
+        for jobs, result in zip(clusters, results):
+            for machine_id, sequence in result.items():
+                merged[machine_id] = [jobs[i] for i in sequence]
+        print(f"Clusters scheduled in {time.time() - start:.2f}s")
+        return merged
+    
     @staticmethod
     def get_current_plan() -> List[ProductionPlan]:
         """
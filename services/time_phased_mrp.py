@@ -0,0 +1,65 @@
+"""
+Time-phased MRP: gross requirements, scheduled receipts, projected on-hand stock
+and net requirements per day or week bucket, as materials x buckets NumPy arrays.
+"""
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Bucket sizes in days
+BUCKET_DAYS = {"day": 1, "week": 7}
+
+
+@dataclass
+class TimePhasedPlan:
+    """Material flow per bucket. Row k of every array belongs to material_ids[k]."""
+    material_ids: List[int]
+    bucket_starts: List[str]  # Date strings in format 'YYYY-MM-DD'
+    gross: np.ndarray  # requirements of orders starting in the bucket
+    receipts: np.ndarray  # expected deliveries in the bucket
+    projected_on_hand: np.ndarray  # stock at the end of the bucket without new purchases (negative = missing)
+    net: np.ndarray  # quantity to receive by the bucket so stock never runs out
+
+    def __post_init__(self):
+        self.material_index: Dict[int, int] = {m: k for k, m in enumerate(self.material_ids)}
+
+    def first_shortage(self, material_id: int) -> Optional[str]:
+        """Start of the first bucket in which the material runs out, or None."""
+        k = self.material_index.get(material_id)
+        if k is None:
+            return None
+        short = np.flatnonzero(self.projected_on_hand[k] < -1e-9)
+        return self.bucket_starts[short[0]] if len(short) else None
+
+    def shortage_dates(self) -> Dict[int, str]:
+        """material_id -> start of the first bucket it runs out, for all materials that do."""
+        short = self.projected_on_hand < -1e-9
+        first = short.argmax(axis=1)
+        return {self.material_ids[k]: self.bucket_starts[first[k]] for k in np.flatnonzero(short.any(axis=1))}
+
+
+def bucket_of(day: str, start: date, bucket_days: int, buckets: int) -> int:
+    """Bucket index of a date string ('YYYY-MM-DD...'); past dates fall into bucket 0, -1 if beyond the horizon."""
+    k = max((date.fromisoformat(day[:10]) - start).days, 0) // bucket_days
+    return k if k < buckets else -1
+
+
+def project(stock: np.ndarray, gross: np.ndarray, receipts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Projected on-hand and net requirements.
+
+    Projected on-hand is stock plus cumulative receipts minus cumulative gross requirements.
+    Net requirements are what must additionally arrive by each bucket so it never drops
+    below zero: the growth of the deepest shortage so far.
+    """
+    projected = stock[:, None] + np.cumsum(receipts - gross, axis=1)
+    deepest = np.maximum(-np.minimum.accumulate(projected, axis=1), 0.0)
+    net = np.diff(deepest, axis=1, prepend=0.0)
+    return projected, net
+
+
+def bucket_starts(start: date, bucket_days: int, buckets: int) -> List[str]:
+    return [(start + timedelta(days=k * bucket_days)).isoformat() for k in range(buckets)]
@@ -0,0 +1,138 @@
+"""
+Working-time index for machine calendars.
+Compiles weekly shifts and downtime windows into sorted working intervals with
+cumulative working hours, so "add N working hours to t" is a binary search.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from models.calendar import MachineShift, MachineDowntime
+
+
+class WorkingTimeIndex:
+    """
+    Working intervals of one machine, in hours relative to a schedule origin.
+    Time outside the compiled horizon [lo, hi] counts as continuous working time.
+    """
+
+    def __init__(self, intervals: List[Tuple[float, float]], lo: float, hi: float):
+        self.lo = lo
+        self.hi = hi
+        self.starts = [s for s, _ in intervals]
+        self.ends = [e for _, e in intervals]
+        # cum[k] = working hours in [lo, starts[k]); cum_end[k] = cum[k] + length of interval k
+        self.cum: List[float] = []
+        self.cum_end: List[float] = []
+        total = 0.0
+        for s, e in intervals:
+            self.cum.append(total)
+            total += e - s
+            self.cum_end.append(total)
+        self.total = total
+
+    def working_hours_until(self, t: float) -> float:
+        """Working hours between lo and t (negative before lo)."""
+        if t <= self.lo:
+            return t - self.lo
+        if t >= self.hi:
+            return self.total + (t - self.hi)
+        k = bisect_right(self.starts, t) - 1
+        if k < 0:
+            return 0.0
+        return self.cum[k] + min(t, self.ends[k]) - self.starts[k]
+
+    def time_at_working_hours(self, w: float) -> float:
+        """Earliest time at which w working hours (counted from lo) have elapsed."""
+        if w <= 0:
+            return self.lo + w
+        if w > self.total:
+            return self.hi + (w - self.total)
+        k = bisect_left(self.cum_end, w)
+        return self.starts[k] + (w - self.cum[k])
+
+    def next_working_time(self, t: float) -> float:
+        """First working instant at or after t."""
+        if t < self.lo or t >= self.hi:
+            return t
+        k = bisect_right(self.starts, t) - 1
+        if k >= 0 and t < self.ends[k]:
+            return t
+        return self.starts[k + 1] if k + 1 < len(self.starts) else self.hi
+
+    def add_working_hours(self, t: float, hours: float) -> float:
+        """Time when a job of the given working hours, started at t, finishes."""
+        return self.time_at_working_hours(self.working_hours_until(t) + hours)
+
+
+def _merge(intervals: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """Sorts and merges overlapping intervals."""
+    merged: List[Tuple[float, float]] = []
+    for s, e in sorted(intervals):
+        if merged and s <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+        else:
+            merged.append((s, e))
+    return merged
+
+
+def _subtract(intervals: List[Tuple[float, float]], holes: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """Removes merged holes from merged intervals (both sorted)."""
+    result = []
+    h = 0
+    for s, e in intervals:
+        while h < len(holes) and holes[h][1] <= s:
+            h += 1
+        k = h
+        while k < len(holes) and holes[k][0] < e:
+            if holes[k][0] > s:
+                result.append((s, holes[k][0]))
+            s = max(s, holes[k][1])
+            k += 1
+        if s < e:
+            result.append((s, e))
+    return result
+
+
+def compile_calendar(shifts: List[MachineShift], downtimes: List[MachineDowntime],
+                     origin: datetime, horizon_days: int = 366) -> WorkingTimeIndex:
+    """
+    Compiles one machine's shifts and downtimes into a WorkingTimeIndex.
+    Without shifts the machine runs 24/7 except during downtimes.
+    """
+    hi = horizon_days * 24.0
+
+    def hours(dt: datetime) -> float:
+        return (dt - origin).total_seconds() / 3600
+
+    if shifts:
+        # Shift start/end as offsets from midnight, parsed once per shift
+        by_weekday: Dict[int, List[Tuple[timedelta, timedelta]]] = {}
+        midnight = datetime(1900, 1, 1)
+        for shift in shifts:
+            start = datetime.strptime(shift.start_time, '%H:%M')
+            end = datetime.strptime(shift.end_time, '%H:%M')
+            if end <= start:
+                end += timedelta(days=1)
+            by_weekday.setdefault(shift.weekday, []).append((start - midnight, end - midnight))
+
+        intervals = []
+        # Start one day early to catch overnight shifts running into the origin
+        first_day = datetime.combine(origin.date(), datetime.min.time()) - timedelta(days=1)
+        for d in range(horizon_days + 2):
+            day = first_day + timedelta(days=d)
+            for start, end in by_weekday.get(day.weekday(), []):
+                s, e = max(hours(day + start), 0.0), min(hours(day + end), hi)
+                if s < e:
+                    intervals.append((s, e))
+        intervals = _merge(intervals)
+    else:
+        intervals = [(0.0, hi)]
+
+    holes = _merge([
+        (hours(datetime.strptime(d.start_time, '%Y-%m-%d %H:%M:%S')),
+         hours(datetime.strptime(d.end_time, '%Y-%m-%d %H:%M:%S')))
+        for d in downtimes
+    ])
+    return WorkingTimeIndex(_subtract(intervals, holes), 0.0, hi)
@@ -16,6 +16,11 @@ from models.bom import BOM, BOMRepository
 from models.machine import Machine, MachineRecipe, MachineRepository, MachineRecipeRepository
 from models.order import ProductionOrder, ProductionOrderRepository
 from models.production_plan import ProductionPlan, ProductionPlanRepository
+from models.calendar import MachineShift, MachineDowntime, CalendarRepository
+from models.changeover import Changeover, ChangeoverRepository
+from models.material_receipt import MaterialReceipt, MaterialReceiptRepository
+from models.routing import RoutingOperation, OperationRecipe, OperationPrecedence, RoutingRepository
+from models.campaign import CampaignRepository
 
 
 @pytest.fixture
@@ -50,7 +55,12 @@ class TestTableCreation:
         tables = [row[0] for row in cursor.fetchall()]
         
         expected_tables = ['materials', 'products', 'bom', 'machines', 
-                         'machine_recipes', 'production_orders', 'production_plans']
+                         'machine_recipes', 'production_orders', 'production_plans',
+                         'machine_shifts', 'machine_downtimes', 'changeovers',
+                         'material_receipts', 'routing_operations', 'operation_recipes',
+                         'operation_precedences', 'production_campaigns', 'campaign_orders',
+                         'bom_components', 'material_pegging', 'material_policies',
+                         'material_allocations']
         
         for table in expected_tables:
             assert table in tables, f"Table {table} not created"
@@ -469,6 +479,88 @@ class TestUnitProductionOrder:
         updated = ProductionOrderRepository.get_order_by_id(order.id)
         assert updated.status == "in_progress"
 
+    def test_complete_orders_posts_stock(self, test_db):
+        """Test that completing orders issues materials and sub-assemblies and receives products, once."""
+        from models.bom import BOMComponent
+
+        steel = MaterialRepository.add_material(Material(id=None, name="Steel", unit="kg", quantity=100))
+        paint = MaterialRepository.add_material(Material(id=None, name="Paint", unit="l", quantity=10))
+        cart = ProductRepository.add_product(Product(id=None, name="Cart", unit="pcs", description="Test"))
+        wheel = ProductRepository.add_product(Product(id=None, name="Wheel", unit="pcs", description="Test"))
+        wheel.quantity = 20
+        ProductRepository.update_product(wheel)
+        BOMRepository.add_bom(BOM(id=None, product_id=cart.id, material_id=steel.id, quantity_needed=3.0))
+        BOMRepository.add_bom(BOM(id=None, product_id=cart.id, material_id=paint.id, quantity_needed=0.5))
+        BOMRepository.add_component(BOMComponent(id=None, parent_product_id=cart.id, component_product_id=wheel.id, quantity_needed=4))
+        orders = [ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=cart.id, quantity=quantity, deadline="2030-01-10", status="in_queue", priority=2
+        )) for quantity in (2, 3)]
+
+        assert ProductionOrderRepository.complete_orders([o.id for o in orders]) == 2
+        # Completing again posts nothing
+        assert ProductionOrderRepository.complete_orders([orders[0].id]) == 0
+
+        assert MaterialRepository.get_material_by_id(steel.id).quantity == 100 - 5 * 3.0
+        assert MaterialRepository.get_material_by_id(paint.id).quantity == 10 - 5 * 0.5
+        products = {p.id: p.quantity for p in ProductRepository.get_all_products()}
+        assert (products[cart.id], products[wheel.id]) == (5, 20 - 5 * 4)
+        assert {o.status for o in ProductionOrderRepository.get_all_orders()} == {"completed"}
+
+    def test_complete_orders_rejects_short_stock(self, test_db):
+        """Test that completing orders never drives material stock negative."""
+        steel = MaterialRepository.add_material(Material(id=None, name="Steel", unit="kg", quantity=10))
+        bolt = ProductRepository.add_product(Product(id=None, name="Bolt", unit="pcs", description="Test"))
+        BOMRepository.add_bom(BOM(id=None, product_id=bolt.id, material_id=steel.id, quantity_needed=2.0))
+        orders = [ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=bolt.id, quantity=quantity, deadline="2030-01-10", status="in_queue", priority=2
+        )) for quantity in (4, 3)]
+
+        # 14 kg needed, 10 on hand: nothing is posted
+        with pytest.raises(ValueError, match="Steel needs 14.00, 10.00 on hand"):
+            ProductionOrderRepository.complete_orders([o.id for o in orders])
+        assert MaterialRepository.get_material_by_id(steel.id).quantity == 10
+        assert ProductRepository.get_product_by_id(bolt.id).quantity == 0
+        assert {o.status for o in ProductionOrderRepository.get_all_orders()} == {"in_queue"}
+
+        assert ProductionOrderRepository.complete_orders([orders[0].id]) == 1
+        assert MaterialRepository.get_material_by_id(steel.id).quantity == 2
+
+    def test_complete_orders_backflushes_missing_sub_assemblies(self, test_db):
+        """Test that sub-assemblies missing from stock are built with the order and their materials issued."""
+        from models.bom import BOMComponent
+
+        steel = MaterialRepository.add_material(Material(id=None, name="Steel", unit="kg", quantity=100))
+        rubber = MaterialRepository.add_material(Material(id=None, name="Rubber", unit="kg", quantity=50))
+        cart = ProductRepository.add_product(Product(id=None, name="Cart", unit="pcs", description="Test"))
+        wheel = ProductRepository.add_product(Product(id=None, name="Wheel", unit="pcs", description="Test"))
+        hub = ProductRepository.add_product(Product(id=None, name="Hub", unit="pcs", description="Test"))
+        wheel.quantity = 6
+        ProductRepository.update_product(wheel)
+        BOMRepository.add_bom(BOM(id=None, product_id=cart.id, material_id=steel.id, quantity_needed=3.0))
+        BOMRepository.add_bom(BOM(id=None, product_id=wheel.id, material_id=rubber.id, quantity_needed=2.0))
+        BOMRepository.add_bom(BOM(id=None, product_id=hub.id, material_id=steel.id, quantity_needed=0.5))
+        BOMRepository.add_component(BOMComponent(id=None, parent_product_id=cart.id, component_product_id=wheel.id, quantity_needed=4))
+        BOMRepository.add_component(BOMComponent(id=None, parent_product_id=wheel.id, component_product_id=hub.id, quantity_needed=1))
+        order = ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=cart.id, quantity=2, deadline="2030-01-10", status="in_queue", priority=2
+        ))
+
+        ProductionOrderRepository.complete_orders([order.id])
+
+        # 8 wheels needed: 6 from stock, 2 built from rubber and hubs, the hubs built from steel
+        products = {p.id: p.quantity for p in ProductRepository.get_all_products()}
+        assert (products[cart.id], products[wheel.id], products[hub.id]) == (2, 0, 0)
+        assert MaterialRepository.get_material_by_id(rubber.id).quantity == 50 - 2 * 2.0
+        assert MaterialRepository.get_material_by_id(steel.id).quantity == 100 - 2 * 3.0 - 2 * 0.5
+
+        # Without any wheels in stock all of them are built
+        second = ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=cart.id, quantity=1, deadline="2030-01-10", status="in_queue", priority=2
+        ))
+        ProductionOrderRepository.complete_orders([second.id])
+        assert ProductRepository.get_product_by_id(wheel.id).quantity == 0
+        assert MaterialRepository.get_material_by_id(rubber.id).quantity == 46 - 4 * 2.0
+
 
 class TestUnitMRPService:
     """Unit tests for MRP service calculations."""
@@ -513,6 +605,428 @@ class TestUnitMRPService:
         assert steel_req is not None
         assert steel_req.quantity_needed == 20.0  # 10 parts * 2 kg each
 
+    def test_mrp_deadline_from_earliest_plan(self, test_db):
+        """Test that a material is needed at the earliest planned start of the orders using it."""
+        from services.mrp_service import MRPService
+
+        material = MaterialRepository.add_material(Material(id=None, name="Glue", unit="l", quantity=1))
+        product = ProductRepository.add_product(Product(id=None, name="Panel", unit="pcs", description="Test"))
+        BOMRepository.add_bom(BOM(id=None, product_id=product.id, material_id=material.id, quantity_needed=0.5))
+        machine = MachineRepository.add_machine(Machine(id=None, name="Press"))
+        orders = [ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=4, deadline="2030-01-10", status="in_queue", priority=2
+        )) for _ in range(2)]
+        for order, start in zip(orders, ("2030-01-05 08:00:00", "2030-01-03 08:00:00")):
+            for hours in (0, 2):
+                ProductionPlanRepository.add_plan(ProductionPlan(
+                    id=None, order_id=order.id, machine_id=machine.id,
+                    planned_start_time=start.replace("08:", f"{8 + hours:02d}:"), planned_end_time=start.replace("08:", f"{9 + hours:02d}:"),
+                    duration_hours=1.0, actual_start_time="", status="planned"
+                ))
+
+        requirement = MRPService.calculate_material_requirements()[0]
+        assert requirement.quantity_needed == 4.0
+        assert requirement.quantity_difference == 3.0
+        assert sorted(requirement.orders_requiring) == [o.id for o in orders]
+        assert requirement.deadline == "2030-01-03 08:00:00"
+
+    def test_bom_matrix_explosion_and_cache(self, test_db):
+        """Test sparse BOM explosion and that the cached matrix follows BOM changes."""
+        from services.bom_matrix import get_bom_matrix
+
+        steel = MaterialRepository.add_material(Material(id=None, name="Steel", unit="kg", quantity=30))
+        paint = MaterialRepository.add_material(Material(id=None, name="Paint", unit="l", quantity=1))
+        frame = ProductRepository.add_product(Product(id=None, name="Frame", unit="pcs", description="Test"))
+        door = ProductRepository.add_product(Product(id=None, name="Door", unit="pcs", description="Test"))
+        BOMRepository.add_bom(BOM(id=None, product_id=frame.id, material_id=steel.id, quantity_needed=2.0))
+        BOMRepository.add_bom(BOM(id=None, product_id=door.id, material_id=steel.id, quantity_needed=5.0))
+        paint_line = BOMRepository.add_bom(BOM(id=None, product_id=door.id, material_id=paint.id, quantity_needed=0.5))
+
+        matrix = get_bom_matrix()
+        vector = matrix.product_vector({frame.id: 10, door.id: 4})
+        assert matrix.gross(vector).tolist() == [40.0, 2.0]
+        assert matrix.shortages(vector, matrix.stock_vector([steel, paint])).tolist() == [10.0, 1.0]
+        assert matrix.used(matrix.product_vector({frame.id: 1})).tolist() == [True, False]
+        assert get_bom_matrix() is matrix
+
+        paint_line.quantity_needed = 1.0
+        BOMRepository.update_bom(paint_line)
+        matrix = get_bom_matrix()
+        assert matrix.row(door.id)[0] == [steel.id, paint.id]
+        assert matrix.row(door.id)[1].tolist() == [5.0, 1.0]
+
+    def test_multilevel_bom_nets_sub_assemblies(self, test_db):
+        """Test level-by-level netting of sub-assemblies against stock and cycle detection."""
+        from models.bom import BOMComponent
+        from services.mrp_service import MRPService
+        from services.multilevel_bom import MultiLevelBOM, BOMCycleError
+
+        steel = MaterialRepository.add_material(Material(id=None, name="Steel", unit="kg", quantity=0))
+        paint = MaterialRepository.add_material(Material(id=None, name="Paint", unit="l", quantity=0))
+        cart = ProductRepository.add_product(Product(id=None, name="Cart", unit="pcs", description="Test"))
+        axle = ProductRepository.add_product(Product(id=None, name="Axle", unit="pcs", description="Test"))
+        axle.quantity = 3
+        ProductRepository.update_product(axle)
+        wheel = ProductRepository.add_product(Product(id=None, name="Wheel", unit="pcs", description="Test"))
+        BOMRepository.add_bom(BOM(id=None, product_id=cart.id, material_id=paint.id, quantity_needed=1.0))
+        BOMRepository.add_bom(BOM(id=None, product_id=wheel.id, material_id=steel.id, quantity_needed=0.5))
+        # Cart -> 2 axles -> 2 wheels; carts also need 1 spare wheel directly
+        for parent, component, quantity in ((cart, axle, 2), (axle, wheel, 2), (cart, wheel, 1)):
+            BOMRepository.add_component(BOMComponent(id=None, parent_product_id=parent.id,
+                                                     component_product_id=component.id, quantity_needed=quantity))
+        ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=cart.id, quantity=5, deadline="2030-01-10", status="in_queue", priority=2
+        ))
+
+        structure = MultiLevelBOM(BOMRepository.get_all_components())
+        assert [structure.low_level_code(p.id) for p in (cart, axle, wheel)] == [0, 1, 2]
+        # 10 axles needed, 3 in stock; wheels: 7 axles * 2 + 5 spares
+        assert structure.production_quantities({cart.id: 5}, {axle.id: 3}) == {cart.id: 5, axle.id: 7, wheel.id: 19}
+
+        requirements = {r.material_name: r.quantity_needed for r in MRPService.calculate_material_requirements()}
+        assert requirements == {"Paint": 5.0, "Steel": 9.5}
+        assert MRPService.explode_product(cart.id, 5) == {paint.id: 5.0, steel.id: 9.5}
+
+        assert structure.would_create_cycle(wheel.id, cart.id)
+        with pytest.raises(BOMCycleError):
+            BOMRepository.add_component(BOMComponent(id=None, parent_product_id=wheel.id, component_product_id=cart.id, quantity_needed=1))
+        with pytest.raises(BOMCycleError):
+            BOMRepository.add_component(BOMComponent(id=None, parent_product_id=axle.id, component_product_id=axle.id, quantity_needed=1))
+        assert len(BOMRepository.get_all_components()) == 3
+        assert {r.material_name: r.quantity_needed for r in MRPService.calculate_material_requirements()} == requirements
+
+    def test_time_phased_mrp_projects_stock_per_week(self, test_db):
+        """Test weekly gross requirements, receipts, projected on-hand and net requirements."""
+        from datetime import date, timedelta
+        from services.mrp_service import MRPService
+
+        monday = date.today() - timedelta(days=date.today().weekday())
+        week = lambda k: (monday + timedelta(days=7 * k + 1)).isoformat()
+        material = MaterialRepository.add_material(Material(id=None, name="Resin", unit="kg", quantity=10))
+        product = ProductRepository.add_product(Product(id=None, name="Tray", unit="pcs", description="Test"))
+        BOMRepository.add_bom(BOM(id=None, product_id=product.id, material_id=material.id, quantity_needed=2.0))
+        machine = MachineRepository.add_machine(Machine(id=None, name="Mold"))
+        for k in (1, 3):
+            order = ProductionOrderRepository.add_order(ProductionOrder(
+                id=None, product_id=product.id, quantity=4, deadline="2099-01-01", status="in_queue", priority=2
+            ))
+            ProductionPlanRepository.add_plan(ProductionPlan(
+                id=None, order_id=order.id, machine_id=machine.id, planned_start_time=f"{week(k)} 08:00:00",
+                planned_end_time=f"{week(k)} 09:00:00", duration_hours=1.0, actual_start_time="", status="planned"
+            ))
+        MaterialReceiptRepository.add_receipt(MaterialReceipt(id=None, material_id=material.id, quantity=5, expected_time=f"{week(2)} 12:00:00"))
+
+        phased = MRPService.calculate_time_phased(bucket="week", horizon_days=35)
+        assert phased.bucket_starts[0] == monday.isoformat()
+        assert phased.gross[0].tolist() == [0, 8, 0, 8, 0]
+        assert phased.receipts[0].tolist() == [0, 0, 5, 0, 0]
+        assert phased.projected_on_hand[0].tolist() == [10, 2, 7, -1, -1]
+        assert phased.net[0].tolist() == [0, 0, 0, 1, 0]
+        assert phased.shortage_dates() == {material.id: phased.bucket_starts[3]}
+
+    def test_what_if_simulation_matches_real_orders(self, test_db):
+        """Test that simulated extra orders give the requirements real orders would, without writing them."""
+        from models.bom import BOMComponent
+        from services.mrp_service import MRPService
+
+        steel = MaterialRepository.add_material(Material(id=None, name="Steel", unit="kg", quantity=20))
+        paint = MaterialRepository.add_material(Material(id=None, name="Paint", unit="l", quantity=5))
+        shelf = ProductRepository.add_product(Product(id=None, name="Shelf", unit="pcs", description="Test"))
+        cart = ProductRepository.add_product(Product(id=None, name="Cart", unit="pcs", description="Test"))
+        wheel = ProductRepository.add_product(Product(id=None, name="Wheel", unit="pcs", description="Test"))
+        wheel.quantity = 6
+        ProductRepository.update_product(wheel)
+        BOMRepository.add_bom(BOM(id=None, product_id=shelf.id, material_id=steel.id, quantity_needed=2.0))
+        BOMRepository.add_bom(BOM(id=None, product_id=cart.id, material_id=paint.id, quantity_needed=1.0))
+        BOMRepository.add_bom(BOM(id=None, product_id=wheel.id, material_id=steel.id, quantity_needed=0.5))
+        BOMRepository.add_component(BOMComponent(id=None, parent_product_id=cart.id, component_product_id=wheel.id, quantity_needed=4))
+        ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=cart.id, quantity=1, deadline="2030-01-10", status="in_queue", priority=2
+        ))
+        MRPService.current_requirements()
+
+        extra = [ProductionOrder(id=None, product_id=p.id, quantity=q, deadline="2030-01-10", status="in_queue", priority=2)
+                 for p, q in ((shelf, 5), (cart, 3))]
+        deltas = {d.material_id: d for d in MRPService.simulate(extra, {paint.id: 2})}
+        assert len(ProductionOrderRepository.get_all_orders()) == 1
+        assert MaterialRepository.get_material_by_id(paint.id).quantity == 5
+        # Steel: 10 for shelves + 0.5 per wheel for 4 carts x 4 wheels less 6 in stock; paint: 3 more, stock 2
+        assert deltas[steel.id].quantity_needed_before == 0.0
+        assert deltas[steel.id].quantity_needed_after == pytest.approx(10 + (16 - 6) * 0.5)
+        assert (deltas[paint.id].quantity_needed_after, deltas[paint.id].shortage_before, deltas[paint.id].shortage_after) == (4.0, 0.0, 2.0)
+
+        for order in extra:
+            ProductionOrderRepository.add_order(order)
+        real = {r.material_id: r.quantity_needed for r in MRPService.calculate_material_requirements()}
+        assert real == {m: pytest.approx(d.quantity_needed_after) for m, d in deltas.items()}
+
+        # The simulation starts from the current data, not from the last MRP run
+        assert MRPService.simulate([], {paint.id: 2})[0].quantity_needed_before == real[paint.id]
+
+    def test_allocations_reserve_stock_by_priority_and_deadline(self, test_db):
+        """Test that stock is reserved by priority and deadline and released when orders complete or are deleted."""
+        from models.material_allocation import MaterialAllocationRepository
+        from services.mrp_service import MRPService
+
+        steel = MaterialRepository.add_material(Material(id=None, name="Steel", unit="kg", quantity=10))
+        product = ProductRepository.add_product(Product(id=None, name="Bracket", unit="pcs", description="Test"))
+        BOMRepository.add_bom(BOM(id=None, product_id=product.id, material_id=steel.id, quantity_needed=2.0))
+        low, late, urgent = [ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=3, deadline=deadline, status="in_queue", priority=priority
+        )) for deadline, priority in (("2030-01-01", 3), ("2030-02-01", 1), ("2030-01-15", 1))]
+
+        # 10 kg for three orders of 6 kg: urgent (priority 1, earlier) > late (priority 1) > low (priority 3)
+        assert {o: [a.quantity_missing for a in allocations] for o, allocations in MRPService.uncovered_orders().items()} == {
+            late.id: [2.0], low.id: [6.0]
+        }
+        assert MaterialAllocationRepository.get_allocations_by_order_id(urgent.id)[0].quantity_allocated == 6.0
+
+        # Raising the priority of the low order moves stock to it
+        low.priority = 1
+        low.deadline = "2029-12-01"
+        ProductionOrderRepository.update_order(low)
+        assert {o: [a.quantity_missing for a in allocations] for o, allocations in MRPService.uncovered_orders().items()} == {
+            urgent.id: [2.0], late.id: [6.0]
+        }
+
+        # Completing and deleting orders releases their reservations
+        urgent.status = "completed"
+        ProductionOrderRepository.update_order(urgent)
+        ProductionOrderRepository.delete_order(low)
+        assert MRPService.uncovered_orders() == {}
+        assert MaterialAllocationRepository.get_allocations_by_order_id(urgent.id) == []
+        assert [(a.order_id, a.quantity_allocated) for a in MaterialAllocationRepository.get_allocations_by_material_id(steel.id)] == [(late.id, 6.0)]
+
+    def test_reservations_move_on_completion_and_deletion(self, test_db):
+        """Test that completing or deleting an order re-allocates its stock without an MRP run."""
+        from models.material_allocation import MaterialAllocationRepository
+        from models.material_pegging import MaterialPeggingRepository
+        from services.mrp_service import MRPService
+
+        steel = MaterialRepository.add_material(Material(id=None, name="Steel", unit="kg", quantity=10))
+        product = ProductRepository.add_product(Product(id=None, name="Bracket", unit="pcs", description="Test"))
+        BOMRepository.add_bom(BOM(id=None, product_id=product.id, material_id=steel.id, quantity_needed=2.0))
+        urgent, late, low = [ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=3, deadline=deadline, status="in_queue", priority=priority
+        )) for deadline, priority in (("2030-01-15", 1), ("2030-02-01", 1), ("2030-01-01", 3))]
+        MRPService.current_requirements()
+        reserved = lambda: [(a.order_id, a.quantity_allocated) for a in MaterialAllocationRepository.get_allocations_by_material_id(steel.id)]
+        assert reserved() == [(urgent.id, 6.0), (late.id, 4.0), (low.id, 0.0)]
+
+        # Deleting the urgent order frees its 6 kg for the next orders
+        ProductionOrderRepository.delete_order(urgent)
+        assert reserved() == [(late.id, 6.0), (low.id, 4.0)]
+
+        # Completing the late order consumes 6 kg; the 4 kg left go to the low order
+        ProductionOrderRepository.complete_orders([late.id])
+        assert reserved() == [(low.id, 4.0)]
+        assert MaterialPeggingRepository.get_pegs_by_order_id(late.id) == []
+        assert {o: [a.quantity_missing for a in allocations] for o, allocations in MRPService.uncovered_orders().items()} == {low.id: [2.0]}
+
+    def test_lot_sizing_policies_plan_purchases(self, test_db):
+        """Test lot sizes per policy, safety stock, pack multiples and lead-time release dates."""
+        from datetime import date, timedelta
+        import numpy as np
+        from models.material_policy import MaterialPolicy, MaterialPolicyRepository
+        from services.lot_sizing import economic_order_quantity, plan_lots, policy_arrays
+        from services.mrp_service import MRPService
+
+        gross = np.array([[0, 8, 0, 8, 0]] * 5, dtype=float)
+        stock = np.full(5, 10.0)
+        policies = [
+            MaterialPolicy(id=None, material_id=2, policy="fixed", fixed_quantity=20, safety_stock=2),
+            MaterialPolicy(id=None, material_id=3, policy="period", periods=3),
+            MaterialPolicy(id=None, material_id=4, policy="min_max", min_quantity=5, max_quantity=30),
+            MaterialPolicy(id=None, material_id=5, policy="lot_for_lot", pack_size=5),
+        ]
+        arrays = policy_arrays([1, 2, 3, 4, 5], policies, np.zeros(5))
+        lots = plan_lots(stock, gross, np.zeros_like(gross), arrays)
+        assert lots.tolist() == [
+            [0, 0, 0, 6, 0],    # lot-for-lot (no policy): exactly the shortage
+            [0, 0, 0, 20, 0],   # fixed 20, triggered by safety stock 2
+            [0, 0, 0, 6, 0],    # period of 3 buckets: nothing more needed in buckets 4-5
+            [0, 28, 0, 0, 0],   # min/max: below 5 after bucket 1, refill to 30
+            [0, 0, 0, 10, 0],   # shortage 6 in packs of 5
+        ]
+        assert economic_order_quantity(np.array([1000.0]), np.array([50.0]), np.array([4.0]))[0] == pytest.approx(158.1, abs=0.1)
+
+        # A min/max policy with max below min refills to the reorder point instead of buying negative lots
+        inverted = policy_arrays([1], [MaterialPolicy(id=None, material_id=1, policy="min_max", min_quantity=5, max_quantity=0)], np.zeros(1))
+        assert plan_lots(stock[:1], gross[:1], np.zeros_like(gross[:1]), inverted).tolist() == [[0, 3, 0, 8, 0]]
+        with pytest.raises(ValueError):
+            MaterialPolicyRepository.set_policy(MaterialPolicy(id=None, material_id=1, policy="min_max", min_quantity=5, max_quantity=0))
+
+        # Through the service: weekly buckets, released one week ahead
+        monday = date.today() - timedelta(days=date.today().weekday())
+        week = lambda k: (monday + timedelta(days=7 * k + 1)).isoformat()
+        material = MaterialRepository.add_material(Material(id=None, name="Resin", unit="kg", quantity=10))
+        product = ProductRepository.add_product(Product(id=None, name="Tray", unit="pcs", description="Test"))
+        BOMRepository.add_bom(BOM(id=None, product_id=product.id, material_id=material.id, quantity_needed=2.0))
+        machine = MachineRepository.add_machine(Machine(id=None, name="Mold"))
+        for k in (2, 4):
+            order = ProductionOrderRepository.add_order(ProductionOrder(
+                id=None, product_id=product.id, quantity=4, deadline="2099-01-01", status="in_queue", priority=2
+            ))
+            ProductionPlanRepository.add_plan(ProductionPlan(
+                id=None, order_id=order.id, machine_id=machine.id, planned_start_time=f"{week(k)} 08:00:00",
+                planned_end_time=f"{week(k)} 09:00:00", duration_hours=1.0, actual_start_time="", status="planned"
+            ))
+        MaterialPolicyRepository.set_policy(MaterialPolicy(id=None, material_id=material.id, policy="fixed",
+                                                           fixed_quantity=20, safety_stock=2, lead_time_days=7))
+        purchases = MRPService.plan_purchases(bucket="week", horizon_days=42)
+        assert [(p.quantity, p.need_date, p.release_date, p.late) for p in purchases] == [
+            (20.0, (monday + timedelta(weeks=4)).isoformat(), (monday + timedelta(weeks=3)).isoformat(), False)
+        ]
+        assert MaterialPolicyRepository.get_policy_by_material_id(material.id).fixed_quantity == 20
+
+        # Unchanged inputs reuse the cached plan; a new receipt or policy recalculates it
+        phased = MRPService.current_time_phased(bucket="week", horizon_days=42)
+        assert MRPService.current_time_phased(bucket="week", horizon_days=42) is phased
+        assert MRPService.plan_purchases(bucket="week", horizon_days=42) == purchases
+        MaterialReceiptRepository.add_receipt(MaterialReceipt(id=None, material_id=material.id, quantity=30,
+                                                              expected_time=f"{week(1)} 08:00:00"))
+        assert MRPService.current_time_phased(bucket="week", horizon_days=42) is not phased
+        assert MRPService.plan_purchases(bucket="week", horizon_days=42) == []
+        MaterialPolicyRepository.set_policy(MaterialPolicy(id=None, material_id=material.id, policy="fixed",
+                                                           fixed_quantity=20, safety_stock=30, lead_time_days=7))
+        assert len(MRPService.plan_purchases(bucket="week", horizon_days=42)) == 1
+
+    def test_incremental_mrp_matches_full_recompute(self, test_db):
+        """Test that the incremental MRP state stays equal to a full recompute after changes."""
+        from models.bom import BOMComponent
+        from services.mrp_service import MRPService
+        from services.mrp_state import MRPState
+
+        def check(state):
+            full = {r.material_id: r for r in MRPService.calculate_material_requirements()}
+            incremental = {r.material_id: r for r in state.get_requirements()}
+            assert set(incremental) == set(full)
+            for material_id, r in full.items():
+                assert incremental[material_id].quantity_needed == pytest.approx(r.quantity_needed)
+                assert incremental[material_id].quantity_in_stock == r.quantity_in_stock
+                assert incremental[material_id].orders_requiring == sorted(r.orders_requiring)
+                assert incremental[material_id].deadline[:10] == r.deadline[:10]
+
+        steel = MaterialRepository.add_material(Material(id=None, name="Steel", unit="kg", quantity=4))
+        paint = MaterialRepository.add_material(Material(id=None, name="Paint", unit="l", quantity=1))
+        glue = MaterialRepository.add_material(Material(id=None, name="Glue", unit="l", quantity=0))
+        shelf = ProductRepository.add_product(Product(id=None, name="Shelf", unit="pcs", description="Test"))
+        cart = ProductRepository.add_product(Product(id=None, name="Cart", unit="pcs", description="Test"))
+        wheel = ProductRepository.add_product(Product(id=None, name="Wheel", unit="pcs", description="Test"))
+        BOMRepository.add_bom(BOM(id=None, product_id=shelf.id, material_id=steel.id, quantity_needed=2.0))
+        glue_line = BOMRepository.add_bom(BOM(id=None, product_id=shelf.id, material_id=glue.id, quantity_needed=0.1))
+        BOMRepository.add_bom(BOM(id=None, product_id=cart.id, material_id=paint.id, quantity_needed=1.0))
+        BOMRepository.add_bom(BOM(id=None, product_id=wheel.id, material_id=steel.id, quantity_needed=0.5))
+        BOMRepository.add_component(BOMComponent(id=None, parent_product_id=cart.id, component_product_id=wheel.id, quantity_needed=4))
+        orders = [ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=quantity, deadline="2030-01-10", status="in_queue", priority=2
+        )) for product, quantity in ((shelf, 3), (shelf, 2), (cart, 2))]
+
+        state = MRPState()
+        check(state)
+        assert state.refresh() == 0
+
+        # Order quantity change touches only the shelf materials
+        orders[0].quantity = 6
+        ProductionOrderRepository.update_order(orders[0])
+        assert state.refresh() == 2
+        check(state)
+
+        # BOM line change touches only glue
+        glue_line.quantity_needed = 0.2
+        BOMRepository.update_bom(glue_line)
+        assert state.refresh() == 1
+        check(state)
+
+        # Stock of materials and of sub-assemblies
+        paint.quantity = 10
+        MaterialRepository.update_material(paint)
+        wheel.quantity = 5
+        ProductRepository.update_product(wheel)
+        state.refresh()
+        check(state)
+        assert state.requirements[steel.id].quantity_needed == pytest.approx(6 * 2 + 2 * 2 + 3 * 0.5)
+
+        # Order leaves the pending list
+        orders[2].status = "completed"
+        ProductionOrderRepository.update_order(orders[2])
+        state.refresh()
+        check(state)
+        assert paint.id not in state.requirements
+
+        # Plans moved in place (same rows) give the materials new deadlines
+        machine = MachineRepository.add_machine(Machine(id=None, name="Press"))
+        plans = [ProductionPlan(id=0, order_id=order.id, machine_id=machine.id, planned_start_time="2030-01-05 08:00:00",
+                                planned_end_time="2030-01-05 10:00:00", duration_hours=2.0) for order in orders[:2]]
+        ProductionPlanRepository.add_plans(plans)
+        state.refresh()
+        check(state)
+        assert state.requirements[steel.id].deadline.startswith("2030-01-05")
+        moved = ProductionPlanRepository.get_plans_by_order_id(orders[1].id)[0]
+        moved.planned_start_time, moved.planned_end_time = "2030-01-03 08:00:00", "2030-01-03 10:00:00"
+        ProductionPlanRepository.update_plan(moved)
+        assert state.refresh() == 2
+        check(state)
+        assert state.requirements[steel.id].deadline.startswith("2030-01-03")
+
+    def test_pegging_answers_slip_and_blocking_queries(self, test_db):
+        """Test persisted material pegs and the slipped-delivery / blocking-material queries."""
+        from datetime import date, timedelta
+        from models.material_pegging import MaterialPeggingRepository
+        from services.mrp_service import MRPService
+
+        day = lambda k: f"{(date.today() + timedelta(days=k)).isoformat()} 08:00:00"
+        steel = MaterialRepository.add_material(Material(id=None, name="Steel", unit="kg", quantity=10))
+        product = ProductRepository.add_product(Product(id=None, name="Bracket", unit="pcs", description="Test"))
+        BOMRepository.add_bom(BOM(id=None, product_id=product.id, material_id=steel.id, quantity_needed=2.0))
+        machine = MachineRepository.add_machine(Machine(id=None, name="Press"))
+        orders = []
+        for k in (2, 5):
+            order = ProductionOrderRepository.add_order(ProductionOrder(
+                id=None, product_id=product.id, quantity=4, deadline="2099-01-01", status="in_queue", priority=2
+            ))
+            ProductionPlanRepository.add_plan(ProductionPlan(
+                id=None, order_id=order.id, machine_id=machine.id, planned_start_time=day(k),
+                planned_end_time=day(k), duration_hours=1.0, actual_start_time="", status="planned"
+            ))
+            orders.append(order)
+        receipt = MaterialReceiptRepository.add_receipt(MaterialReceipt(id=None, material_id=steel.id, quantity=10, expected_time=day(1)))
+
+        # No MRP run yet: no pegs, nothing to answer from
+        assert MaterialPeggingRepository.get_pegs_by_material_id(steel.id) == []
+
+        # 10 in stock + 10 arriving before both orders: nothing is short
+        assert MRPService.blocking_materials(orders[1].id, refresh=True) == []
+        pegs = MaterialPeggingRepository.get_pegs_by_material_id(steel.id)
+        assert [(p.order_id, p.quantity, p.need_date) for p in pegs] == [(orders[0].id, 8.0, day(2)), (orders[1].id, 8.0, day(5))]
+        assert [p.material_id for p in MaterialPeggingRepository.get_pegs_by_order_id(orders[0].id)] == [steel.id]
+
+        # Delivery slips past the second order: only that order runs short
+        assert MRPService.orders_short_if_delayed(receipt.id, day(10)) == [(orders[1].id, 6.0)]
+        assert MRPService.orders_short_if_delayed(receipt.id, day(3)) == []
+
+        # Rescheduling the first order behind the delivery moves its need date and the slip risk
+        plan = ProductionPlanRepository.get_plans_by_order_id(orders[0].id)[0]
+        plan.planned_start_time = plan.planned_end_time = day(12)
+        ProductionPlanRepository.update_plan(plan)
+        assert MRPService.orders_short_if_delayed(receipt.id, day(10)) == [(orders[1].id, 6.0)]  # stale pegs
+        assert MRPService.orders_short_if_delayed(receipt.id, day(10), refresh=True) == []
+        assert MRPService.orders_short_if_delayed(receipt.id, day(13)) == [(orders[0].id, 6.0)]
+        assert [p.need_date for p in MaterialPeggingRepository.get_pegs_by_order_id(orders[0].id)] == [day(12)]
+        plan.planned_start_time = plan.planned_end_time = day(2)
+        ProductionPlanRepository.update_plan(plan)
+        assert MRPService.orders_short_if_delayed(receipt.id, day(10), refresh=True) == [(orders[1].id, 6.0)]
+
+        MaterialReceiptRepository.delete_receipt(receipt)
+        assert MRPService.blocking_materials(orders[1].id) == [(steel.id, 6.0)]
+
+        # Completed orders lose their pegs
+        orders[0].status = "completed"
+        ProductionOrderRepository.update_order(orders[0])
+        MRPService.current_requirements()
+        assert MaterialPeggingRepository.get_pegs_by_order_id(orders[0].id) == []
+        assert MRPService.blocking_materials(orders[1].id) == []
+
 
 class TestUnitSchedulingService:
     """Unit tests for Scheduling service."""
@@ -558,3 +1072,760 @@ class TestUnitSchedulingService:
         assert len(plans) > 0
         assert plans[0].machine_id == machine.id
         assert plans[0].order_id == order.id
+    
+    def test_optimizer_improves_greedy_plan(self, test_db):
+        """Test that the optimizer spreads work over capable machines and never worsens the plan."""
+        from services.scheduling_service import SchedulingService, SchedulingOptions
+        
+        machine1 = MachineRepository.add_machine(Machine(id=None, name="Press A"))
+        machine2 = MachineRepository.add_machine(Machine(id=None, name="Press B"))
+        product = ProductRepository.add_product(Product(id=None, name="Bracket", unit="pcs", description="Test"))
+        for machine in (machine1, machine2):
+            MachineRecipeRepository.add_machine_recipe(MachineRecipe(
+                id=None, machine_id=machine.id, product_id=product.id, production_capacity=10.0
+            ))
+        for _ in range(4):
+            ProductionOrderRepository.add_order(ProductionOrder(
+                id=None, product_id=product.id, quantity=100,
+                deadline="2030-01-01", status="in_queue", priority=2
+            ))
+        
+        # Greedy puts everything on the first recipe's machine
+        greedy = SchedulingService.generate_plan_from_scratch()
+        assert {p.machine_id for p in greedy} == {machine1.id}
+        
+        options = SchedulingOptions(optimize=True, time_budget_seconds=0.3, restarts=2)
+        plans = SchedulingService.generate_plan_from_scratch(options)
+        
+        assert len(plans) == 4
+        assert {p.machine_id for p in plans} == {machine1.id, machine2.id}
+        assert len(ProductionPlanRepository.get_all_plans()) == 4
+    
+    def test_lot_splitting_spreads_large_order(self, test_db):
+        """Test that a large order is split into lots that finish together on parallel machines."""
+        from services.scheduling_service import SchedulingService, SchedulingOptions
+        
+        fast = MachineRepository.add_machine(Machine(id=None, name="Fast lathe"))
+        slow = MachineRepository.add_machine(Machine(id=None, name="Slow lathe"))
+        product = ProductRepository.add_product(Product(id=None, name="Shaft", unit="pcs", description="Test"))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=fast.id, product_id=product.id, production_capacity=30.0))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=slow.id, product_id=product.id, production_capacity=10.0))
+        big = ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=400, deadline="2030-01-01", status="in_queue", priority=1
+        ))
+        ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=50, deadline="2030-01-01", status="in_queue", priority=1
+        ))
+        
+        options = SchedulingOptions(lot_split_min_quantity=100, max_lots=4)
+        plans = SchedulingService.generate_plan_from_scratch(options)
+        
+        # 400 pcs at 40 pcs/h combined: both lots take 10h
+        lots = ProductionPlanRepository.get_plans_by_order_id(big.id)
+        assert len(lots) == 2
+        assert {p.machine_id for p in lots} == {fast.id, slow.id}
+        assert [p.duration_hours for p in lots] == [10.0, 10.0]
+        assert lots[0].planned_end_time == lots[1].planned_end_time
+        
+        # The small order stays in one piece
+        assert len(plans) == 3
+    
+    def test_clusters_scheduled_independently(self, test_db, monkeypatch):
+        """Test that products sharing no machines are split into clusters and merged back in order."""
+        from services.scheduling_service import SchedulingService, SchedulingOptions
+        from services.schedule_clusters import find_clusters
+        from services.schedule_problem import ScheduleJob, ScheduleProblem
+        
+        problem = ScheduleProblem(jobs=[
+            ScheduleJob(order_id=1, weight=1.0, due=10.0, durations={3: 1.0, 4: 2.0}),
+            ScheduleJob(order_id=2, weight=1.0, due=10.0, durations={1: 1.0}),
+            ScheduleJob(order_id=3, weight=1.0, due=10.0, durations={2: 1.0, 4: 1.0}),
+            ScheduleJob(order_id=4, weight=1.0, due=10.0, durations={1: 1.0}),
+        ])
+        assert find_clusters(problem) == [[1, 3], [0, 2]]
+        
+        # Two cells of two machines each
+        for cell in range(2):
+            product = ProductRepository.add_product(Product(id=None, name=f"Part {cell}", unit="pcs", description="Test"))
+            for name in ("A", "B"):
+                machine = MachineRepository.add_machine(Machine(id=None, name=f"Cell {cell} {name}"))
+                MachineRecipeRepository.add_machine_recipe(MachineRecipe(
+                    id=None, machine_id=machine.id, product_id=product.id, production_capacity=10.0
+                ))
+            for _ in range(3):
+                ProductionOrderRepository.add_order(ProductionOrder(
+                    id=None, product_id=product.id, quantity=50, deadline="2030-01-01", status="in_queue", priority=2
+                ))
+        
+        options = SchedulingOptions(exact=True)
+        serial = SchedulingService.generate_plan_from_scratch(options)
+        parallel = SchedulingService.generate_plan_from_scratch(SchedulingOptions(exact=True, parallel_clusters=True, max_workers=2))
+        
+        # Exact solutions per cell use both machines of the cell
+        assert len({p.machine_id for p in parallel}) == 4
+        assert sorted(p.duration_hours for p in parallel) == sorted(p.duration_hours for p in serial)
+        assert max(p.planned_end_time for p in parallel) <= max(p.planned_end_time for p in serial)
+        
+        # Without an improvement stage no worker pool is started
+        import services.scheduling_service as scheduling_module
+        monkeypatch.setattr(scheduling_module, "ProcessPoolExecutor", None)
+        greedy = SchedulingService.generate_plan_from_scratch(SchedulingOptions(parallel_clusters=True, use_cache=False))
+        assert len(greedy) == 6
+    
+    def test_rolling_horizon_keeps_frozen_zone(self, test_db):
+        """Test that plans in the frozen zone survive a rolling update and later ones are replanned."""
+        from services.scheduling_service import SchedulingService, SchedulingOptions
+        
+        machine = MachineRepository.add_machine(Machine(id=None, name="Mixer"))
+        product = ProductRepository.add_product(Product(id=None, name="Paint", unit="l", description="Test"))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=machine.id, product_id=product.id, production_capacity=10.0))
+        for deadline in ("2030-01-01", "2030-01-02", "2030-01-03"):
+            ProductionOrderRepository.add_order(ProductionOrder(
+                id=None, product_id=product.id, quantity=50, deadline=deadline, status="in_queue", priority=2
+            ))
+        first = SchedulingService.generate_plan_from_scratch()[0]
+        
+        # An urgent order arrives; only the first 5h plan is inside the 2h frozen zone
+        urgent = ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=20, deadline="2029-01-01", status="in_queue", priority=1
+        ))
+        plans = SchedulingService.update_plan_rolling(SchedulingOptions(frozen_hours=2, lookahead_hours=24))
+        
+        assert len(plans) == 3
+        assert plans[0].order_id == urgent.id
+        assert plans[0].planned_start_time == first.planned_end_time
+        kept = ProductionPlanRepository.get_plans_by_order_id(first.order_id)
+        assert [p.id for p in kept] == [first.id]
+        assert len(ProductionPlanRepository.get_all_plans()) == 4
+    
+    def test_rolling_horizon_mixes_near_and_far_orders_on_one_machine(self, test_db):
+        """Test that orders beyond the horizon are placed roughly behind the detailed work on a shared machine."""
+        from datetime import date, timedelta
+        from services.scheduling_service import SchedulingService, SchedulingOptions
+        
+        machine = MachineRepository.add_machine(Machine(id=None, name="Mixer"))
+        product = ProductRepository.add_product(Product(id=None, name="Paint", unit="l", description="Test"))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=machine.id, product_id=product.id, production_capacity=10.0))
+        tomorrow = (date.today() + timedelta(days=1)).isoformat()
+        near = [ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=20, deadline=tomorrow, status="in_queue", priority=2
+        )) for _ in range(2)]
+        far = ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=30, deadline="2030-01-01", status="in_queue", priority=2
+        ))
+        
+        plans = SchedulingService.update_plan_rolling(SchedulingOptions(frozen_hours=0, lookahead_hours=72))
+        
+        # Only the near orders enter the detailed problem; the far one follows on the same machine
+        assert SchedulingService.last_run["orders"] == 2
+        assert len(plans) == 3
+        by_order = {p.order_id: p for p in plans}
+        assert by_order[far.id].planned_start_time == max(by_order[o.id].planned_end_time for o in near)
+        assert by_order[far.id].duration_hours == 3.0
+    
+    def test_unchanged_inputs_reuse_cached_plan(self, test_db):
+        """Test that regenerating with unchanged inputs skips the rewrite, and any change invalidates it."""
+        from services.scheduling_service import SchedulingService
+        
+        machine = MachineRepository.add_machine(Machine(id=None, name="Cutter"))
+        product = ProductRepository.add_product(Product(id=None, name="Panel", unit="pcs", description="Test"))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=machine.id, product_id=product.id, production_capacity=10.0))
+        ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=10, deadline="2030-01-01", status="in_queue", priority=2
+        ))
+        
+        first = SchedulingService.generate_plan_from_scratch()
+        hits = SchedulingService.cache_stats["hits"]
+        second = SchedulingService.generate_plan_from_scratch()
+        
+        assert SchedulingService.cache_stats["hits"] == hits + 1
+        assert SchedulingService.last_run["cached"] is True
+        assert [p.id for p in second] == [p.id for p in first]
+        assert [p.id for p in ProductionPlanRepository.get_all_plans()] == [first[0].id]
+        
+        # A new order changes the fingerprint
+        ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=10, deadline="2030-01-02", status="in_queue", priority=2
+        ))
+        third = SchedulingService.generate_plan_from_scratch()
+        assert SchedulingService.last_run["cached"] is False
+        assert len(third) == 2
+        
+        # Moving a plan in place (same row count and IDs) changes it as well
+        SchedulingService.generate_plan_from_scratch()
+        assert SchedulingService.last_run["cached"] is True
+        moved = ProductionPlanRepository.get_all_plans()[0]
+        moved.planned_start_time = "2031-01-01 08:00:00"
+        moved.planned_end_time = "2031-01-01 09:00:00"
+        ProductionPlanRepository.update_plan(moved)
+        SchedulingService.generate_plan_from_scratch()
+        assert SchedulingService.last_run["cached"] is False
+    
+    def test_material_constrained_release(self, test_db):
+        """Test that orders wait for expected receipts and unsuppliable orders are skipped."""
+        from datetime import datetime, timedelta
+        from services.scheduling_service import SchedulingService, SchedulingOptions
+        
+        machine = MachineRepository.add_machine(Machine(id=None, name="Oven"))
+        product = ProductRepository.add_product(Product(id=None, name="Bread", unit="pcs", description="Test"))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=machine.id, product_id=product.id, production_capacity=10.0))
+        flour = MaterialRepository.add_material(Material(id=None, name="Flour", quantity=10, unit="kg"))
+        BOMRepository.add_bom(BOM(id=None, product_id=product.id, material_id=flour.id, quantity_needed=1.0))
+        arrival = (datetime.now() + timedelta(hours=48)).replace(microsecond=0)
+        MaterialReceiptRepository.add_receipt(MaterialReceipt(
+            id=None, material_id=flour.id, quantity=10, expected_time=arrival.isoformat(sep=' ')
+        ))
+        orders = [ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=quantity, deadline=deadline, status="in_queue", priority=2
+        )) for quantity, deadline in ((10, "2030-01-01"), (10, "2030-01-02"), (50, "2030-01-03"))]
+        
+        plans = SchedulingService.generate_plan_from_scratch(SchedulingOptions(material_constrained=True))
+        
+        # Stock covers the first order, the second waits for the delivery, the third never fits
+        assert [p.order_id for p in plans] == [orders[0].id, orders[1].id]
+        assert datetime.strptime(plans[1].planned_start_time, '%Y-%m-%d %H:%M:%S') >= arrival
+        assert SchedulingService.last_run["material_waits"] == 1
+    
+    def test_repair_moves_plans_off_broken_machine(self, test_db):
+        """Test that a breakdown moves hit plans to a free machine or pushes them right."""
+        from services.scheduling_service import SchedulingService
+        
+        press = MachineRepository.add_machine(Machine(id=None, name="Press"))
+        backup = MachineRepository.add_machine(Machine(id=None, name="Backup press"))
+        gear = ProductRepository.add_product(Product(id=None, name="Gear", unit="pcs", description="Test"))
+        cap = ProductRepository.add_product(Product(id=None, name="Cap", unit="pcs", description="Test"))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=press.id, product_id=gear.id, production_capacity=10.0))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=backup.id, product_id=gear.id, production_capacity=5.0))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=press.id, product_id=cap.id, production_capacity=10.0))
+        
+        def plan(product, machine, start, end, hours):
+            order = ProductionOrderRepository.add_order(ProductionOrder(
+                id=None, product_id=product.id, quantity=10, deadline="2030-01-01", status="in_queue", priority=2
+            ))
+            return ProductionPlan(id=0, order_id=order.id, machine_id=machine.id, planned_start_time=start,
+                                  planned_end_time=end, duration_hours=hours)
+        
+        plans = [
+            plan(gear, press, "2030-01-01 08:00:00", "2030-01-01 10:00:00", 2.0),
+            plan(cap, press, "2030-01-01 10:00:00", "2030-01-01 12:00:00", 2.0),
+            plan(cap, press, "2030-01-01 12:00:00", "2030-01-01 13:00:00", 1.0),
+            plan(cap, press, "2030-01-01 20:00:00", "2030-01-01 21:00:00", 1.0),
+        ]
+        ProductionPlanRepository.add_plans(plans)
+        
+        moved = SchedulingService.repair(press.id, "2030-01-01 07:00:00", "2030-01-01 11:00:00")
+        
+        by_id = {p.id: p for p in ProductionPlanRepository.get_all_plans()}
+        # Gear moves to the backup press at half speed, caps wait for the repair
+        assert by_id[plans[0].id].machine_id == backup.id
+        assert by_id[plans[0].id].duration_hours == 4.0
+        assert by_id[plans[1].id].planned_start_time == "2030-01-01 11:00:00"
+        assert by_id[plans[2].id].planned_start_time == "2030-01-01 13:00:00"
+        # The evening plan does not overlap and stays untouched
+        assert by_id[plans[3].id].planned_start_time == "2030-01-01 20:00:00"
+        assert len(moved) == 3
+        assert len(CalendarRepository.get_downtimes_by_machine_id(press.id)) == 1
+    
+    def test_repair_avoids_alternative_plans_before_outage(self, test_db):
+        """Test that a plan started before the outage is not moved onto earlier work of the alternative machine."""
+        from services.scheduling_service import SchedulingService
+        
+        press = MachineRepository.add_machine(Machine(id=None, name="Press"))
+        backup = MachineRepository.add_machine(Machine(id=None, name="Backup press"))
+        gear = ProductRepository.add_product(Product(id=None, name="Gear", unit="pcs", description="Test"))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=press.id, product_id=gear.id, production_capacity=10.0))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=backup.id, product_id=gear.id, production_capacity=5.0))
+        orders = [ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=gear.id, quantity=10, deadline="2030-01-01", status="in_queue", priority=2
+        )) for _ in range(2)]
+        hit = ProductionPlan(id=0, order_id=orders[0].id, machine_id=press.id, planned_start_time="2030-01-01 08:00:00",
+                             planned_end_time="2030-01-01 10:00:00", duration_hours=2.0)
+        early = ProductionPlan(id=0, order_id=orders[1].id, machine_id=backup.id, planned_start_time="2030-01-01 07:00:00",
+                               planned_end_time="2030-01-01 08:30:00", duration_hours=1.5)
+        ProductionPlanRepository.add_plans([hit, early])
+        
+        SchedulingService.repair(press.id, "2030-01-01 09:00:00", "2030-01-01 11:00:00")
+        
+        moved = ProductionPlanRepository.get_plans_by_order_id(orders[0].id)[0]
+        assert moved.machine_id == backup.id
+        assert moved.planned_start_time == "2030-01-01 08:30:00"
+        assert moved.planned_end_time == "2030-01-01 12:30:00"
+    
+    def test_repair_respects_routing_precedence(self, test_db):
+        """Test that repaired operations wait for their predecessors and push their successors."""
+        from services.scheduling_service import SchedulingService
+        
+        press = MachineRepository.add_machine(Machine(id=None, name="Press"))
+        backup = MachineRepository.add_machine(Machine(id=None, name="Backup press"))
+        booth = MachineRepository.add_machine(Machine(id=None, name="Paint booth"))
+        frame = ProductRepository.add_product(Product(id=None, name="Frame", unit="pcs", description="Test"))
+        steps = {}
+        for step, (name, machines) in enumerate([("cutting", [(press, 10.0)]), ("welding", [(press, 10.0), (backup, 5.0)]),
+                                                 ("painting", [(booth, 10.0)])], start=1):
+            steps[name] = RoutingRepository.add_operation(RoutingOperation(id=None, product_id=frame.id, sequence=step, name=name))
+            for machine, capacity in machines:
+                RoutingRepository.add_operation_recipe(OperationRecipe(
+                    id=None, operation_id=steps[name].id, machine_id=machine.id, production_capacity=capacity
+                ))
+        order = ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=frame.id, quantity=20, deadline="2030-01-01", status="in_queue", priority=2
+        ))
+        ProductionPlanRepository.add_plans([
+            ProductionPlan(id=0, order_id=order.id, machine_id=machine.id, planned_start_time=start,
+                           planned_end_time=end, duration_hours=2.0, operation_id=steps[name].id)
+            for name, machine, start, end in (("cutting", press, "2030-01-01 08:00:00", "2030-01-01 10:00:00"),
+                                              ("welding", press, "2030-01-01 10:00:00", "2030-01-01 12:00:00"),
+                                              ("painting", booth, "2030-01-01 12:00:00", "2030-01-01 14:00:00"))
+        ])
+        
+        SchedulingService.repair(press.id, "2030-01-01 07:00:00", "2030-01-01 11:00:00")
+        
+        by_operation = {p.operation_id: p for p in ProductionPlanRepository.get_plans_by_order_id(order.id)}
+        cutting, welding, painting = (by_operation[steps[n].id] for n in ("cutting", "welding", "painting"))
+        # Cutting waits for the repair; welding cannot use the idle backup press before cutting ends
+        assert (cutting.planned_start_time, cutting.planned_end_time) == ("2030-01-01 11:00:00", "2030-01-01 13:00:00")
+        assert welding.planned_start_time == "2030-01-01 13:00:00"
+        assert welding.machine_id == press.id
+        # Painting on the untouched booth is pushed behind welding
+        assert painting.planned_start_time == welding.planned_end_time == "2030-01-01 15:00:00"
+        assert painting.planned_end_time == "2030-01-01 17:00:00"
+    
+    def test_repair_uses_target_calendar_and_changeovers(self, test_db):
+        """Test that a moved plan follows the shifts of its new machine and is re-timed as processing plus setup."""
+        from services.scheduling_service import SchedulingService
+        
+        press = MachineRepository.add_machine(Machine(id=None, name="Press"))
+        backup = MachineRepository.add_machine(Machine(id=None, name="Backup press"))
+        gear, cap, bolt = (ProductRepository.add_product(Product(id=None, name=name, unit="pcs", description="Test"))
+                           for name in ("Gear", "Cap", "Bolt"))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=press.id, product_id=gear.id, production_capacity=10.0))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=backup.id, product_id=gear.id, production_capacity=5.0))
+        ChangeoverRepository.add_changeover(Changeover(id=None, machine_id=press.id, from_product_id=cap.id, to_product_id=gear.id, setup_minutes=30))
+        ChangeoverRepository.add_changeover(Changeover(id=None, machine_id=backup.id, from_product_id=bolt.id, to_product_id=gear.id, setup_minutes=30))
+        # 2030-01-01 is a Tuesday: the backup press works 10-14 and 15-19
+        for start, end in (("10:00", "14:00"), ("15:00", "19:00")):
+            CalendarRepository.add_shift(MachineShift(id=None, machine_id=backup.id, weekday=1, start_time=start, end_time=end))
+        
+        def plan(product, machine, start, end, hours, status="planned"):
+            order = ProductionOrderRepository.add_order(ProductionOrder(
+                id=None, product_id=product.id, quantity=20, deadline="2030-01-02", status="in_queue", priority=2
+            ))
+            return ProductionPlan(id=0, order_id=order.id, machine_id=machine.id, planned_start_time=start,
+                                  planned_end_time=end, duration_hours=hours, status=status)
+        
+        # Gear on the press: 0.5h changeover from cap + 2h for 20 pcs
+        hit = plan(gear, press, "2030-01-01 07:00:00", "2030-01-01 09:30:00", 2.5)
+        ProductionPlanRepository.add_plans([
+            plan(cap, press, "2030-01-01 06:00:00", "2030-01-01 07:00:00", 1.0, status="in_progress"),
+            hit,
+            plan(bolt, backup, "2030-01-01 10:00:00", "2030-01-01 11:00:00", 1.0),
+        ])
+        
+        SchedulingService.repair(press.id, "2030-01-01 06:30:00", "2030-01-01 20:00:00")
+        
+        moved = ProductionPlanRepository.get_plans_by_order_id(hit.order_id)[0]
+        # 20 pcs at 5/h plus 0.5h changeover from bolt, split by the shift break
+        assert moved.machine_id == backup.id
+        assert moved.duration_hours == 4.5
+        assert (moved.planned_start_time, moved.planned_end_time) == ("2030-01-01 11:00:00", "2030-01-01 16:30:00")
+    
+    def test_material_constrained_routed_orders(self, test_db):
+        """Test that routed orders wait for material and share the projected stock with single-step orders."""
+        from datetime import datetime, timedelta
+        from services.scheduling_service import SchedulingService, SchedulingOptions
+        
+        saw = MachineRepository.add_machine(Machine(id=None, name="Saw"))
+        welder = MachineRepository.add_machine(Machine(id=None, name="Welder"))
+        frame = ProductRepository.add_product(Product(id=None, name="Frame", unit="pcs", description="Test"))
+        bracket = ProductRepository.add_product(Product(id=None, name="Bracket", unit="pcs", description="Test"))
+        for step, (name, machine) in enumerate([("cutting", saw), ("welding", welder)], start=1):
+            operation = RoutingRepository.add_operation(RoutingOperation(id=None, product_id=frame.id, sequence=step, name=name))
+            RoutingRepository.add_operation_recipe(OperationRecipe(id=None, operation_id=operation.id, machine_id=machine.id, production_capacity=10.0))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=saw.id, product_id=bracket.id, production_capacity=10.0))
+        steel = MaterialRepository.add_material(Material(id=None, name="Steel", quantity=10, unit="kg"))
+        BOMRepository.add_bom(BOM(id=None, product_id=frame.id, material_id=steel.id, quantity_needed=1.0))
+        BOMRepository.add_bom(BOM(id=None, product_id=bracket.id, material_id=steel.id, quantity_needed=1.0))
+        arrival = (datetime.now() + timedelta(hours=48)).replace(microsecond=0)
+        MaterialReceiptRepository.add_receipt(MaterialReceipt(
+            id=None, material_id=steel.id, quantity=10, expected_time=arrival.isoformat(sep=' ')
+        ))
+        frames = [ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=frame.id, quantity=10, deadline=deadline, status="in_queue", priority=2
+        )) for deadline in ("2030-01-01", "2030-01-02")]
+        ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=bracket.id, quantity=5, deadline="2030-01-01", status="in_queue", priority=2
+        ))
+        
+        plans = SchedulingService.generate_plan_from_scratch(SchedulingOptions(material_constrained=True))
+        
+        # The first frame uses the stock, the second waits for the delivery, the bracket finds nothing left
+        assert {p.order_id for p in plans} == {frames[0].id, frames[1].id}
+        waiting = min(p.planned_start_time for p in plans if p.order_id == frames[1].id)
+        assert datetime.strptime(waiting, '%Y-%m-%d %H:%M:%S') >= arrival
+        assert SchedulingService.last_run["material_waits"] == 1
+    
+    def test_routing_operations_respect_precedence(self, test_db):
+        """Test that routed orders get one plan per operation, each after its predecessors."""
+        from services.scheduling_service import SchedulingService
+        
+        saw = MachineRepository.add_machine(Machine(id=None, name="Saw"))
+        welder = MachineRepository.add_machine(Machine(id=None, name="Welder"))
+        booth = MachineRepository.add_machine(Machine(id=None, name="Paint booth"))
+        frame = ProductRepository.add_product(Product(id=None, name="Frame", unit="pcs", description="Test"))
+        steps = {}
+        for step, (name, machine) in enumerate([("cutting", saw), ("welding", welder), ("painting", booth)], start=1):
+            steps[name] = RoutingRepository.add_operation(RoutingOperation(id=None, product_id=frame.id, sequence=step, name=name))
+            RoutingRepository.add_operation_recipe(OperationRecipe(
+                id=None, operation_id=steps[name].id, machine_id=machine.id, production_capacity=10.0
+            ))
+        for _ in range(2):
+            ProductionOrderRepository.add_order(ProductionOrder(
+                id=None, product_id=frame.id, quantity=20, deadline="2030-01-01", status="in_queue", priority=2
+            ))
+        
+        plans = SchedulingService.generate_plan_from_scratch()
+        
+        assert len(plans) == 6
+        for order_id in {p.order_id for p in plans}:
+            by_operation = {p.operation_id: p for p in ProductionPlanRepository.get_plans_by_order_id(order_id)}
+            cutting, welding, painting = (by_operation[steps[n].id] for n in ("cutting", "welding", "painting"))
+            assert cutting.planned_end_time <= welding.planned_start_time
+            assert welding.planned_end_time <= painting.planned_start_time
+        
+        # Explicit precedences turn the routing into a DAG: painting only needs cutting
+        RoutingRepository.add_precedence(OperationPrecedence(id=None, operation_id=steps["painting"].id, predecessor_id=steps["cutting"].id))
+        RoutingRepository.add_precedence(OperationPrecedence(id=None, operation_id=steps["welding"].id, predecessor_id=steps["cutting"].id))
+        plans = SchedulingService.generate_plan_from_scratch()
+        first = [p for p in plans if p.order_id == plans[0].order_id]
+        welding = next(p for p in first if p.operation_id == steps["welding"].id)
+        painting = next(p for p in first if p.operation_id == steps["painting"].id)
+        assert welding.planned_start_time == painting.planned_start_time
+        
+        # Plan metrics know the deadlines of routed orders
+        ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=frame.id, quantity=20, deadline="2020-01-01", status="in_queue", priority=2
+        ))
+        SchedulingService.generate_plan_from_scratch()
+        assert SchedulingService.last_run["metrics"].late_orders == 1
+    
+    def test_campaigns_batch_same_product_orders(self, test_db):
+        """Test that close-deadline orders of one product are scheduled as one campaign block."""
+        from services.scheduling_service import SchedulingService, SchedulingOptions
+        
+        machine = MachineRepository.add_machine(Machine(id=None, name="Molder"))
+        product = ProductRepository.add_product(Product(id=None, name="Lid", unit="pcs", description="Test"))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=machine.id, product_id=product.id, production_capacity=10.0))
+        orders = [ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=quantity, deadline=deadline, status="in_queue", priority=priority
+        )) for quantity, deadline, priority in ((10, "2030-01-01", 3), (20, "2030-01-03", 1), (30, "2030-02-01", 2))]
+        
+        plans = SchedulingService.generate_plan_from_scratch(SchedulingOptions(campaign_tolerance_days=3))
+        
+        assert len(plans) == 2
+        campaign = CampaignRepository.get_all_campaigns()[0]
+        assert CampaignRepository.get_order_ids(campaign.id) == [orders[0].id, orders[1].id]
+        assert (campaign.quantity, campaign.deadline, campaign.priority) == (30, "2030-01-01", 1)
+        
+        # Members find the campaign's plan; the far order is scheduled alone
+        member_plans = ProductionPlanRepository.get_plans_by_order_id(orders[1].id)
+        assert len(member_plans) == 1 and member_plans[0].campaign_id == campaign.id
+        assert member_plans[0].duration_hours == 3.0
+        assert ProductionPlanRepository.get_plans_by_order_id(orders[2].id)[0].campaign_id is None
+        
+        # Regenerating rebuilds the campaigns instead of piling them up
+        SchedulingService.generate_plan_from_scratch(SchedulingOptions(campaign_tolerance_days=3, use_cache=False))
+        assert len(CampaignRepository.get_all_campaigns()) == 1
+    
+    def test_rolling_update_keeps_frozen_campaign(self, test_db):
+        """Test that a campaign planned in the frozen zone survives rolling updates and its members are not replanned."""
+        from services.scheduling_service import SchedulingService, SchedulingOptions
+        
+        machine = MachineRepository.add_machine(Machine(id=None, name="Mixer"))
+        product = ProductRepository.add_product(Product(id=None, name="Paint", unit="l", description="Test"))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(id=None, machine_id=machine.id, product_id=product.id, production_capacity=10.0))
+        orders = [ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=50, deadline=deadline, status="in_queue", priority=2
+        )) for deadline in ("2030-01-01", "2030-01-02", "2030-01-03")]
+        options = SchedulingOptions(campaign_tolerance_days=3, frozen_hours=1, use_cache=False)
+        SchedulingService.generate_plan_from_scratch(options)
+        campaign = CampaignRepository.get_all_campaigns()[0]
+        
+        # A later order arrives; two rolling updates must neither dissolve nor duplicate the frozen campaign
+        late = ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=10, deadline="2030-02-01", status="in_queue", priority=2
+        ))
+        SchedulingService.update_plan_rolling(options)
+        SchedulingService.update_plan_rolling(options)
+        
+        plans = ProductionPlanRepository.get_all_plans()
+        assert sorted((p.order_id, p.campaign_id) for p in plans) == [(orders[0].id, campaign.id), (late.id, None)]
+        assert CampaignRepository.get_order_ids(campaign.id) == [o.id for o in orders]
+    
+    def test_branch_and_bound_matches_brute_force(self):
+        """Test that the exact solver finds the optimum of a small instance."""
+        import itertools
+        from services.schedule_problem import ScheduleJob, ScheduleProblem
+        from services.scheduling_service import branch_and_bound
+        
+        problem = ScheduleProblem(jobs=[
+            ScheduleJob(order_id=1, weight=1.0, due=3.0, durations={1: 4.0, 2: 6.0}),
+            ScheduleJob(order_id=2, weight=3.0, due=2.0, durations={1: 2.0}),
+            ScheduleJob(order_id=3, weight=2.0, due=5.0, durations={1: 3.0, 2: 2.0}),
+            ScheduleJob(order_id=4, weight=1.0, due=8.0, durations={2: 5.0}),
+        ], ready={2: 1.0})
+        initial = {1: [0, 1, 2], 2: [3]}
+        
+        # Brute force: every machine assignment and every order of the jobs
+        best = float("inf")
+        for assignment in itertools.product(*[list(job.durations) for job in problem.jobs]):
+            for order in itertools.permutations(range(len(problem.jobs))):
+                sequences = {}
+                for j in order:
+                    sequences.setdefault(assignment[j], []).append(j)
+                best = min(best, problem.cost(sequences))
+        
+        result = branch_and_bound(problem, initial)
+        assert result.optimal
+        assert result.cost == pytest.approx(best)
+        assert problem.cost(result.sequences) == pytest.approx(best)
+
+    def test_schedule_metrics(self):
+        """Test plan KPIs and batch scoring of candidate schedules."""
+        import numpy as np
+        from services.schedule_metrics import plan_arrays, compute_metrics, weighted_tardiness
+
+        orders = [
+            ProductionOrder(id=1, product_id=1, quantity=10, deadline="2030-01-01", status="in_queue", priority=1),
+            ProductionOrder(id=2, product_id=1, quantity=10, deadline="2030-01-01", status="in_queue", priority=3),
+        ]
+        plans = [
+            # Order 1 in two lots on machines 1 and 2, order 2 on machine 1; midnight ends the day
+            ProductionPlan(id=0, order_id=1, machine_id=1, planned_start_time="2030-01-01 20:00:00",
+                           planned_end_time="2030-01-02 02:00:00", duration_hours=6.0, actual_start_time="", status="planned"),
+            ProductionPlan(id=0, order_id=2, machine_id=1, planned_start_time="2030-01-02 02:00:00",
+                           planned_end_time="2030-01-02 04:00:00", duration_hours=2.0, actual_start_time="", status="planned"),
+            ProductionPlan(id=0, order_id=1, machine_id=2, planned_start_time="2030-01-01 22:00:00",
+                           planned_end_time="2030-01-02 01:00:00", duration_hours=3.0, actual_start_time="", status="planned"),
+        ]
+        arrays = plan_arrays(plans, orders)
+        metrics = compute_metrics(arrays)
+
+        assert metrics.makespan_hours == pytest.approx(8.0)
+        assert metrics.late_orders == 2
+        assert metrics.total_tardiness_hours == pytest.approx(2.0 + 4.0)
+        assert metrics.weighted_tardiness == pytest.approx(2.0 * 3.0 + 4.0 * 1.0)
+        assert metrics.utilization == {1: pytest.approx(1.0), 2: pytest.approx(3.0 / 8.0)}
+        assert metrics.idle_hours[2] == pytest.approx(5.0)
+        # Order 1 runs from 0h to 6h; order 2 takes over at 6h and ends at 8h
+        assert metrics.wip_times == [0.0, 6.0, 8.0]
+        assert metrics.wip_levels == [1, 1, 0]
+
+        # Candidates: the original schedule and one with everything finished on time
+        candidates = np.vstack([arrays.end, arrays.end - 8.0])
+        assert weighted_tardiness(arrays, candidates) == pytest.approx([10.0, 0.0])
+
+    def test_campaign_plans_score_member_deadlines(self, test_db):
+        """Test that metrics, robustness replay and simulator score a campaign plan against every member's deadline."""
+        from services.campaign_service import CampaignService
+        from services.plan_robustness import simulate_plan, RobustnessOptions
+        from services.schedule_metrics import plan_metrics
+        from services.shop_floor_simulator import ShopFloorSimulator
+
+        product = ProductRepository.add_product(Product(id=None, name="Lid", unit="pcs", description="Test"))
+        orders = [ProductionOrderRepository.add_order(ProductionOrder(
+            id=None, product_id=product.id, quantity=30, deadline=deadline, status="in_queue", priority=2
+        )) for deadline in ("2030-01-01", "2030-01-02")]
+        _, campaign_of = CampaignService.build_campaigns(orders, tolerance_days=3)
+        plans = [ProductionPlan(id=1, order_id=orders[0].id, machine_id=1, planned_start_time="2030-01-02 20:00:00",
+                                planned_end_time="2030-01-03 02:00:00", duration_hours=6.0, actual_start_time="",
+                                status="planned", campaign_id=campaign_of[orders[0].id])]
+
+        # The lead order is 26h late, the second member 2h
+        metrics = plan_metrics(plans, orders)
+        assert metrics.late_orders == 2
+        assert metrics.total_tardiness_hours == pytest.approx(28.0)
+
+        risks = simulate_plan(plans, orders, RobustnessOptions(runs=50, chunk_runs=50, workers=1, seed=1))
+        assert sorted(r.order_id for r in risks) == [o.id for o in orders]
+        assert {r.order_id: r.deadline for r in risks}[orders[1].id] == "2030-01-02"
+
+        recipes = [MachineRecipe(id=None, machine_id=1, product_id=product.id, production_capacity=10.0)]
+        assert ShopFloorSimulator.simulate(plans, orders, recipes).metrics.late_orders == 2
+
+    def test_robustness_simulation_flags_tight_deadlines(self):
+        """Test that the Monte Carlo replay finds the order whose deadline has no slack."""
+        from services.plan_robustness import simulate_plan, RobustnessOptions
+
+        orders = [
+            ProductionOrder(id=1, product_id=1, quantity=10, deadline="2030-01-01", status="in_queue", priority=1),
+            ProductionOrder(id=2, product_id=1, quantity=10, deadline="2030-01-05", status="in_queue", priority=1),
+        ]
+        plans = [
+            # Order 1 ends exactly at its deadline, order 2 has days of slack
+            ProductionPlan(id=0, order_id=1, machine_id=1, planned_start_time="2030-01-01 14:00:00",
+                           planned_end_time="2030-01-02 00:00:00", duration_hours=10.0, actual_start_time="", status="planned"),
+            ProductionPlan(id=0, order_id=2, machine_id=1, planned_start_time="2030-01-02 00:00:00",
+                           planned_end_time="2030-01-02 10:00:00", duration_hours=10.0, actual_start_time="", status="planned"),
+        ]
+        options = RobustnessOptions(runs=400, chunk_runs=100, mtbf_hours=20.0, workers=1, seed=7)
+        risks = simulate_plan(plans, orders, options)
+
+        assert [r.order_id for r in risks] == [1, 2]
+        assert 0.3 < risks[0].late_probability < 0.9
+        assert risks[1].late_probability == 0.0
+        assert risks[1].p50_completion <= risks[1].p90_completion
+        # Same seed, same result
+        assert simulate_plan(plans, orders, options) == risks
+
+    def test_shop_floor_simulation_dispatch_rules(self):
+        """Test that the discrete-event simulator applies dispatch rules, setups and breakdowns."""
+        from services.changeover_matrix import ChangeoverMatrix
+        from services.shop_floor_simulator import ShopFloorSimulator, SimulationOptions
+
+        orders = [
+            ProductionOrder(id=1, product_id=1, quantity=50, deadline="2030-01-05", status="in_queue", priority=3, created_at="2030-01-01"),
+            ProductionOrder(id=2, product_id=2, quantity=10, deadline="2030-01-01", status="in_queue", priority=1, created_at="2030-01-01"),
+        ]
+        recipes = [MachineRecipe(id=None, machine_id=1, product_id=p, production_capacity=10.0) for p in (1, 2)]
+        setups = ChangeoverMatrix([Changeover(id=None, machine_id=1, from_product_id=1, to_product_id=2, setup_minutes=30)])
+        plans = [
+            ProductionPlan(id=1, order_id=1, machine_id=1, planned_start_time="2030-01-01 00:00:00",
+                           planned_end_time="2030-01-01 05:00:00", duration_hours=5.0, actual_start_time="", status="planned"),
+            ProductionPlan(id=2, order_id=2, machine_id=1, planned_start_time="2030-01-01 05:00:00",
+                           planned_end_time="2030-01-01 06:30:00", duration_hours=1.5, actual_start_time="", status="planned"),
+        ]
+
+        # Replaying the plan reproduces it, including the changeover
+        result = ShopFloorSimulator.simulate(plans, orders, recipes, SimulationOptions(), setups)
+        assert [(t.actual_start_time, t.actual_end_time) for t in result.tasks] == [
+            ("2030-01-01 00:00:00", "2030-01-01 05:00:00"), ("2030-01-01 05:00:00", "2030-01-01 06:30:00")]
+        assert result.setup_hours == pytest.approx(0.5)
+
+        # With both orders waiting from their creation, EDD runs the urgent order first
+        result = ShopFloorSimulator.simulate(plans, orders, recipes, SimulationOptions(dispatch_rule="edd", release="order"), setups)
+        assert result.tasks[1].actual_start_time == "2030-01-01 00:00:00"
+        assert result.tasks[0].actual_end_time == "2030-01-01 06:00:00"
+        assert result.setup_hours == 0.0
+
+        # Breakdowns only delay work, reproducibly for one seed
+        options = SimulationOptions(mtbf_hours=1.0, seed=3)
+        broken = ShopFloorSimulator.simulate(plans, orders, recipes, options, setups)
+        assert broken.breakdowns > 0
+        assert broken.tasks[1].actual_end_time > "2030-01-01 06:30:00"
+        assert ShopFloorSimulator.simulate(plans, orders, recipes, options, setups).tasks == broken.tasks
+
+    def test_exact_mode_falls_back_above_size_cap(self, test_db):
+        """Test that exact mode schedules large instances with the heuristic."""
+        from services.scheduling_service import SchedulingService, SchedulingOptions
+        
+        machine = MachineRepository.add_machine(Machine(id=None, name="Lathe"))
+        product = ProductRepository.add_product(Product(id=None, name="Shaft", unit="pcs", description="Test"))
+        MachineRecipeRepository.add_machine_recipe(MachineRecipe(
+            id=None, machine_id=machine.id, product_id=product.id, production_capacity=5.0
+        ))
+        for _ in range(3):
+            ProductionOrderRepository.add_order(ProductionOrder(
+                id=None, product_id=product.id, quantity=10,
+                deadline="2030-01-01", status="in_queue", priority=1
+            ))
+        
+        plans = SchedulingService.generate_plan_from_scratch(SchedulingOptions(exact=True, exact_max_orders=2))
+        assert len(plans) == 3
+        
+        plans = SchedulingService.generate_plan_from_scratch(SchedulingOptions(exact=True))
+        assert len(plans) == 3
+
+
+class TestUnitMachineCalendar:
+    """Unit tests for machine calendars and the working-time index."""
+    
+    def test_calendar_crud(self, test_db):
+        """Test storing shifts and machine/plant-wide downtimes."""
+        machine = MachineRepository.add_machine(Machine(id=None, name="Welder"))
+        CalendarRepository.add_shift(MachineShift(id=None, machine_id=machine.id, weekday=0, start_time="06:00", end_time="14:00"))
+        CalendarRepository.add_downtime(MachineDowntime(
+            id=None, machine_id=machine.id, start_time="2026-11-02 06:00:00",
+            end_time="2026-11-02 10:00:00", reason="maintenance"
+        ))
+        CalendarRepository.add_downtime(MachineDowntime(
+            id=None, machine_id=None, start_time="2026-12-25 00:00:00",
+            end_time="2026-12-26 00:00:00", reason="holiday"
+        ))
+        
+        assert len(CalendarRepository.get_shifts_by_machine_id(machine.id)) == 1
+        assert len(CalendarRepository.get_downtimes_by_machine_id(machine.id)) == 2
+        
+        # Downtime must end after it starts
+        with pytest.raises(sqlite3.IntegrityError):
+            CalendarRepository.add_downtime(MachineDowntime(
+                id=None, machine_id=machine.id, start_time="2026-11-02 10:00:00",
+                end_time="2026-11-02 06:00:00"
+            ))
+    
+    def test_working_hours_skip_nights_and_downtime(self):
+        """Test that work only advances inside shifts and outside downtimes."""
+        from datetime import datetime
+        from services.working_calendar import compile_calendar
+        
+        origin = datetime(2026, 10, 19, 7, 0)  # Monday 07:00
+        shifts = [MachineShift(id=None, machine_id=1, weekday=d, start_time="08:00", end_time="16:00") for d in range(5)]
+        index = compile_calendar(shifts, [], origin, horizon_days=30)
+        
+        # Waits for the 08:00 shift, works 8h on Monday and 2h on Tuesday
+        assert index.next_working_time(0.0) == pytest.approx(1.0)
+        assert index.add_working_hours(1.0, 10.0) == pytest.approx(27.0)
+        
+        # Friday 15:00 + 3h continues on Monday at 10:00
+        assert index.add_working_hours(4 * 24 + 8.0, 3.0) == pytest.approx(7 * 24 + 3.0)
+        
+        downtime = MachineDowntime(id=None, machine_id=1, start_time="2026-10-20 08:00:00", end_time="2026-10-20 09:00:00")
+        index = compile_calendar(shifts, [downtime], origin, horizon_days=30)
+        assert index.add_working_hours(1.0, 10.0) == pytest.approx(28.0)
+
+
+class TestUnitChangeovers:
+    """Unit tests for sequence-dependent setup times."""
+    
+    def test_changeover_matrix_hours(self):
+        """Test setup lookups for single switches and whole sequences."""
+        from services.changeover_matrix import ChangeoverMatrix
+        
+        matrix = ChangeoverMatrix([
+            Changeover(id=None, machine_id=1, from_product_id=10, to_product_id=20, setup_minutes=90),
+            Changeover(id=None, machine_id=1, from_product_id=20, to_product_id=10, setup_minutes=30),
+        ])
+        
+        assert matrix.hours(1, 10, 20) == pytest.approx(1.5)
+        assert matrix.hours(1, 10, 10) == 0.0
+        assert matrix.hours(2, 10, 20) == 0.0  # unknown machine
+        assert matrix.sequence_hours(1, [10, 20, 10, 10, 99]) == pytest.approx(2.0)
+    
+    def test_grouping_reduces_setup_time(self, test_db):
+        """Test that grouping same-product orders cuts total setup time."""
+        from services.scheduling_service import SchedulingService, SchedulingOptions
+        
+        machine = MachineRepository.add_machine(Machine(id=None, name="Extruder"))
+        red = ProductRepository.add_product(Product(id=None, name="Red pipe", unit="m", description="Test"))
+        blue = ProductRepository.add_product(Product(id=None, name="Blue pipe", unit="m", description="Test"))
+        for product in (red, blue):
+            MachineRecipeRepository.add_machine_recipe(MachineRecipe(
+                id=None, machine_id=machine.id, product_id=product.id, production_capacity=10.0
+            ))
+        ChangeoverRepository.add_changeover(Changeover(id=None, machine_id=machine.id, from_product_id=red.id, to_product_id=blue.id, setup_minutes=120))
+        ChangeoverRepository.add_changeover(Changeover(id=None, machine_id=machine.id, from_product_id=blue.id, to_product_id=red.id, setup_minutes=120))
+        
+        # Alternating products with deadlines one day apart
+        for day, product in enumerate([red, blue, red, blue]):
+            ProductionOrderRepository.add_order(ProductionOrder(
+                id=None, product_id=product.id, quantity=10,
+                deadline=f"2030-01-0{day + 1}", status="in_queue", priority=2
+            ))
+        
+        plans = SchedulingService.generate_plan_from_scratch()
+        assert SchedulingService.last_run["setup_hours"] == pytest.approx(6.0)
+        assert sum(p.duration_hours for p in plans) == pytest.approx(4.0 + 6.0)
+        
+        plans = SchedulingService.generate_plan_from_scratch(SchedulingOptions(group_setups=True))
+        assert SchedulingService.last_run["setup_hours"] == pytest.approx(2.0)
+        assert SchedulingService.last_run["setup_hours_saved"] == pytest.approx(4.0)
+        assert len(plans) == 4
@@ -36,10 +36,16 @@ class DashboardView(QWidget):
         # Confirmation that refresh works
         self.statusMessage.emit("Dashboard refreshed!", "success")
 
-        # Update priority summary
+        # Update priority summary and the quality of the current production plan
         queued = counts['queued_orders_by_priority']
+        kpis = DashboardService.get_schedule_kpis()
         self.lbl_priority_queue.setText(
-            f"Queued orders by priority: 🔴 High: {queued[1]}, 🟡 Medium: {queued[2]}, 🟢 Low: {queued[3]}"
+            f"Queued orders by priority: 🔴 High: {queued[1]}, 🟡 Medium: {queued[2]}, 🟢 Low: {queued[3]}\n"
+            f"{kpis['makespan_label']}: {kpis['makespan_hours']}, "
+            f"{kpis['late_planned_label']}: {kpis['late_planned_orders']}, "
+            f"{kpis['tardiness_label']}: {kpis['weighted_tardiness_hours']}, "
+            f"{kpis['utilization_label']}: {kpis['average_utilization']}, "
+            f"{kpis['wip_label']}: {kpis['peak_wip']}"
         )
 
         # Fill dashboard table
@@ -2,6 +2,8 @@ from PyQt6 import uic, QtGui, QtCore
 from PyQt6.QtCore import pyqtSignal
 from PyQt6.QtWidgets import QWidget, QTableWidgetItem
 
+import numpy as np
+
 from models.material import MaterialRepository
 from services.mrp_service import MRPService
 
@@ -51,6 +53,13 @@ class MRPView(QWidget):
             result = MRPService.generate_procurement_plan()
             materials = result["all_materials"]
 
+            # Time-phased view: when stock runs out and what must arrive by when (weekly, one year)
+            phased = result["time_phased"]
+            runs_out = phased.shortage_dates()
+            purchases = {}  # material_id -> suggested purchase orders (lot-sized, by release date)
+            for purchase in result.get("planned_purchases", []):
+                purchases.setdefault(purchase.material_id, []).append(purchase)
+
             # Clear table before inserting new data
             self.tableMRP.setRowCount(0)
 
@@ -134,6 +143,18 @@ class MRPView(QWidget):
                 # Deadline column (single value from model)
                 deadline_item = QTableWidgetItem(str(material.deadline) if material.deadline else "N/A")
                 deadline_item.setTextAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
+                if material.material_id in runs_out:
+                    k = phased.material_index[material.material_id]
+                    receipts_needed = [f"{phased.bucket_starts[b]}: {phased.net[k, b]:.2f}" for b in np.flatnonzero(phased.net[k] > 1e-9)]
+                    orders_to_place = [
+                        f"{p.release_date}: {p.quantity:.2f} (needed {p.need_date}){' LATE' if p.late else ''}"
+                        for p in purchases.get(material.material_id, [])
+                    ]
+                    deadline_item.setToolTip(
+                        f"Stock runs out in week of {runs_out[material.material_id]}\n"
+                        f"Needed by week:\n" + "\n".join(receipts_needed[:MAX_VISIBLE]) +
+                        ("\nPurchase orders to place:\n" + "\n".join(orders_to_place[:MAX_VISIBLE]) if orders_to_place else "")
+                    )
                 self.tableMRP.setItem(row_position, 5, deadline_item)
 
                 # Update earliest deadline
@@ -160,6 +181,14 @@ class MRPView(QWidget):
             # --- Update summary labels ---
             self.lbl_pending_orders.setText(f"📋 Pending orders: {len(orders_to_procure)}")
 
+            # Orders the reserved stock does not cover (stock goes to higher priority / earlier deadline first)
+            uncovered = MRPService.uncovered_orders()
+            names = {m.material_id: m.material_name for m in result["all_materials"]}
+            self.lbl_pending_orders.setToolTip("\n".join(
+                f"Order {order_id}: " + ", ".join(f"{names.get(a.material_id, a.material_id)} missing {a.quantity_missing:.2f}" for a in allocations)
+                for order_id, allocations in list(uncovered.items())[:MAX_VISIBLE * 4]
+            ) if uncovered else "All pending orders are covered by stock")
+
             if materials_to_order:
                 to_order_text = ", ".join(f"{name}: {qty:.2f}" for name, qty in materials_to_order.items())
                 self.lbl_to_order.setText(f"➕ To order: {to_order_text}")
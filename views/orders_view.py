@@ -204,7 +204,16 @@ class OrdersView(QWidget):
         if dialog.exec():
             updated_order = dialog.get_order()
             updated_order.id = order.id
+            # Completing an order posts its stock movements (materials issued, products received)
+            completing = updated_order.status == "completed" and order.status != "completed"
+            if completing:
+                updated_order.status = order.status
             ProductionOrderRepository.update_order(updated_order)
+            if completing:
+                try:
+                    ProductionOrderRepository.complete_orders([order.id])
+                except ValueError as e:
+                    self.statusMessage.emit(str(e), "error")
             self.load_orders()
             
             
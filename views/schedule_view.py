@@ -46,7 +46,10 @@ class ScheduleView(QWidget):
         self.current_plan = self.scheduling_service.generate_plan_from_scratch()
         
         if self.current_plan:
-            self.statusMessage.emit(f"Plan generated successfully: {len(self.current_plan)} orders scheduled", "success")
+            setup_info = ""
+            if self.scheduling_service.last_run.get("setup_hours"):
+                setup_info = f" ({self.scheduling_service.last_run['setup_hours']:.1f}h setup)"
+            self.statusMessage.emit(f"Plan generated successfully: {len(self.current_plan)} orders scheduled{setup_info}{self.cache_info()}", "success")
         else:
             self.statusMessage.emit("No orders to schedule", "warning")
             
@@ -59,13 +62,20 @@ class ScheduleView(QWidget):
         self.statusMessage.emit("Done", "success")
         
         
+    def cache_info(self) -> str:
+        """Status bar suffix telling whether the last run reused the cached plan."""
+        stats = self.scheduling_service.cache_stats
+        state = "cache hit" if self.scheduling_service.last_run.get("cached") else "recomputed"
+        return f" - {state} (cache: {stats['hits']} hits / {stats['misses']} misses)"
+        
+        
     def update_plan(self):
         """Updates existing production plan with new orders"""
         self.statusMessage.emit("Updating plan...", "info")
         updated_plan = self.scheduling_service.update_plan_with_new_orders()
         
         if updated_plan:
-            self.statusMessage.emit(f"Plan updated successfully: {len(updated_plan)} orders scheduled", "success")
+            self.statusMessage.emit(f"Plan updated successfully: {len(updated_plan)} orders scheduled{self.cache_info()}", "success")
         else:
             self.statusMessage.emit("No new orders to schedule", "warning")
         
@@ -102,6 +112,16 @@ class ScheduleView(QWidget):
         for plan, start, end in parsed:
             machines_plans.setdefault(plan.machine_id, []).append((plan, start, end))
 
+        # Orders split into lots have several plans - number them by start time
+        order_lots = {}
+        for plan, start, _ in sorted(parsed, key=lambda item: item[1]):
+            if plan.operation_id is None:
+                order_lots.setdefault(plan.order_id, []).append(plan.id)
+
+        # Routed orders have one plan per operation
+        from models.routing import RoutingRepository
+        operation_names = {op.id: op.name for op in RoutingRepository.get_all_operations()}
+
         # Get dynamic machine list from DB
         from models.machine import MachineRepository
         all_machines = MachineRepository.get_all_machines()  # returns list of Machine objects with id and name
@@ -138,11 +158,21 @@ class ScheduleView(QWidget):
                 color = status_colors.get(plan.status, "skyblue")
                 rect = QGraphicsRectItem(x, y_offset, width, row_height)
                 rect.setBrush(QBrush(QColor(color)))
-                rect.setToolTip(f"Order {plan.order_id}\nStatus: {plan.status}")
+                if plan.operation_id is not None:
+                    operation_name = operation_names.get(plan.operation_id, f"Operation {plan.operation_id}")
+                    detail = f"\nOperation: {operation_name}"
+                    plan_label = f"{plan.order_id}/{operation_name}"
+                else:
+                    lots = order_lots[plan.order_id]
+                    detail = f"\nLot {lots.index(plan.id) + 1}/{len(lots)}" if len(lots) > 1 else ""
+                    plan_label = str(plan.order_id)
+                if plan.campaign_id is not None:
+                    detail += f"\nCampaign {plan.campaign_id}"
+                rect.setToolTip(f"Order {plan.order_id}{detail}\nStatus: {plan.status}")
                 self.scene.addItem(rect)
 
-                # Draw order ID on rectangle
-                text = self.scene.addText(str(plan.order_id))
+                # Draw order ID (and operation) on rectangle
+                text = self.scene.addText(plan_label)
                 text.setPos(x + 5, y_offset + 5)
 
             # Move down for next machine